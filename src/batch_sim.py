@@ -0,0 +1,167 @@
+"""!
+@file batch_sim.py
+This file contains a simulation of many motors, each with its own
+proportional controller, run side by side as NumPy arrays. It uses the same
+motor model as sim_pyb.MotorPlant, the same 16-bit encoder counter (read back
+through the wrap correction of encoder_reader.encoder) and the same clipping
+of the duty cycle to +/-100 percent as the PWM channels. Every motor can have
+its own gain, task period and setpoint, so sweeping thousands of settings is
+one run instead of thousands of lockstep runs.
+
+The controller of each motor acts at the start of its period: it reads the
+encoder, works out gain * (setpoint - position) as control.run() does and
+sets the duty cycle, which then holds until its next run.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import numpy as np
+
+## Number of counts in one wrap of the encoder timer
+ENCODER_RANGE = 1 << 16
+
+
+def _advance(position, velocity, drive, drag, tau, dt):
+    """!
+    Moves every motor forward in time, solving the model exactly in the same
+    way as sim_pyb.MotorPlant.advance(). The arrays are changed in place.
+    @param position array of motor positions, in encoder counts
+    @param velocity array of motor speeds, in counts per second
+    @param drive array of steady-state speeds set by the duty cycle
+    @param drag friction expressed as a change in steady-state speed
+    @param tau time constant of each motor, in seconds
+    @param dt amount of time to simulate, in seconds
+    """
+    remaining = np.full(position.shape, dt)
+
+    # At most two passes are needed: one until a motor stops and one after
+    # it starts again
+    for _ in range(2):
+        w = velocity
+        at_rest = w == 0
+        direction = np.where(at_rest, np.sign(drive), np.sign(w))
+
+        # Static friction keeps a motor at rest
+        stuck = at_rest & (np.abs(drive) <= drag)
+        w_ss = drive - drag * direction
+
+        # Motors whose steady-state speed opposes the motion stop partway
+        stops = w_ss * direction < 0
+        safe = np.where(stops, w_ss, -1.0)
+        ratio = np.where(stops, (w - w_ss) / -safe, 1.0)
+        seg = np.where(stops, np.minimum(remaining, tau * np.log(np.maximum(ratio, 1.0))),
+                       remaining)
+        seg = np.where(stuck, 0.0, seg)
+
+        decay = np.exp(-seg / tau)
+        position += w_ss * seg + (w - w_ss) * tau * (1 - decay)
+        velocity[:] = np.where(seg < remaining, 0.0, w_ss + (w - w_ss) * decay)
+        remaining -= seg
+        remaining[stuck] = 0.0
+
+
+def simulate(gains, periods_ms, setpoints, duration_ms, step_ms=1, plant=None):
+    """!
+    Runs a step response of every motor at once.
+    @param gains proportional gain of each motor, in percent per count
+    @param periods_ms task period of each motor, in whole milliseconds
+    @param setpoints position each motor moves to, in encoder counts
+    @param duration_ms length of the run, in milliseconds
+    @param step_ms time between recorded positions, in milliseconds; every
+           period must be a multiple of it
+    @param plant dictionary of sim_pyb.MotorPlant settings; each value may be
+           one number or one per motor
+    @returns a 2-D int32 array of the positions read by each encoder, one
+             row per motor and one column per step, starting at time zero
+    """
+    gains = np.asarray(gains, dtype=float)
+    count = gains.shape[0]
+    periods = np.broadcast_to(np.asarray(periods_ms, dtype=np.int64), (count,))
+    setpoints = np.broadcast_to(np.asarray(setpoints, dtype=float), (count,))
+    if np.any(periods % step_ms):
+        raise ValueError("every period must be a multiple of step_ms")
+
+    # Motor model settings, with the same defaults as sim_pyb.MotorPlant
+    settings = {'gain': 150.0, 'tau': 0.1, 'deadband': 10.0, 'friction': 1000.0}
+    settings.update(plant or {})
+    k = np.asarray(settings['gain'], dtype=float)
+    tau = np.asarray(settings['tau'], dtype=float)
+    deadband = np.asarray(settings['deadband'], dtype=float)
+    drag = np.asarray(settings['friction'], dtype=float) * tau
+
+    steps = int(duration_ms // step_ms)
+    dt = step_ms / 1000
+    ticks = periods // step_ms
+
+    # State of every motor, encoder and controller
+    position = np.zeros(count)
+    velocity = np.zeros(count)
+    drive = np.zeros(count)
+    last_count = np.zeros(count, dtype=np.int64)
+    reading = np.zeros(count, dtype=np.int64)
+    half = ENCODER_RANGE // 2
+
+    out = np.empty((count, steps), dtype=np.int32)
+    for step in range(steps):
+        # Every encoder is read at each step for the recording, which does
+        # not change the result since the correction only needs one reading
+        # per half wrap
+        counter = np.floor(position).astype(np.int64) % ENCODER_RANGE
+        change = counter - last_count
+        change -= ENCODER_RANGE * (change >= half)
+        change += ENCODER_RANGE * (change < -half)
+        last_count = counter
+        reading += change
+        out[:, step] = reading
+
+        # Controllers whose period starts now set a new duty cycle
+        due = step % ticks == 0
+        if due.any():
+            duty = np.clip(gains * (setpoints - reading), -100.0, 100.0)
+            excess = np.abs(duty) - deadband
+            new_drive = np.where(excess > 0, k * np.sign(duty) * excess, 0.0)
+            drive = np.where(due, new_drive, drive)
+
+        _advance(position, velocity, drive, drag, tau, dt)
+
+    return out
+
+
+def sweep(gains, periods_ms, setpoint=10000, duration_ms=3000, plant=None):
+    """!
+    Runs every combination of the given gains and periods.
+    @param gains list of proportional gains
+    @param periods_ms list of task periods, in whole milliseconds
+    @param setpoint position every motor moves to, in encoder counts
+    @param duration_ms length of each run, in milliseconds
+    @param plant dictionary of sim_pyb.MotorPlant settings
+    @returns a (gains, periods, positions) tuple: the gain and period of each
+             row and the 2-D array returned by simulate()
+    """
+    grid_gain, grid_period = np.meshgrid(np.asarray(gains, dtype=float),
+                                         np.asarray(periods_ms, dtype=np.int64))
+    grid_gain = grid_gain.ravel()
+    grid_period = grid_period.ravel()
+    step_ms = int(np.gcd.reduce(grid_period))
+    positions = simulate(grid_gain, grid_period, setpoint, duration_ms, step_ms, plant)
+    return grid_gain, grid_period, positions
+
+
+# This code sweeps 10,000 gain and period settings, then checks one of them
+# against the lockstep simulation of the real motor code
+if __name__ == "__main__":
+    import time
+    import tuner
+
+    gains = np.linspace(0.005, 0.2, 1000)
+    periods = [10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+    start = time.perf_counter()
+    g, p, positions = sweep(gains, periods, duration_ms=3000)
+    elapsed = time.perf_counter() - start
+    print(f'Simulated {positions.shape[0]} motors for 3 s in {elapsed:.2f} s')
+
+    batch = simulate([0.03], [50], 10000, 3000)
+    single = tuner.evaluate(tuner.Candidate(50, 0.03, 2), setpoint=10000,
+                            duration_ms=3000, cost_us=0)
+    print(f'Batch motor at {batch[0, -1]} counts, lockstep motor at {single.final} counts')
@@ -0,0 +1,279 @@
+"""!
+@file bulk_parse.py
+This file contains code that decodes step-response data from the serial port
+a large block at a time, using NumPy, instead of one sample at a time. Both
+the .CSV lines printed by the board and the binary frames of telemetry.py are
+handled, and the results come back as NumPy arrays ready to be plotted.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import io
+import re
+import struct
+import numpy as np
+import telemetry
+
+## Number of bytes asked for in each read of the serial port
+CHUNK_SIZE = 65536
+
+## Returned in place of samples at the end of each run
+END_OF_RUN = 'end'
+
+## Most text kept between binary frames while waiting for the end of a line
+TEXT_LIMIT = 1024
+
+# A line reading 'end', which ends a run
+_END_LINE = re.compile(rb'^end\r?$', re.M)
+# Any byte which cannot be part of a sample line
+_STRAY = re.compile(rb'[^0-9,.\r\n-]')
+# A line holding a timing histogram from latency.py
+_HISTOGRAM_LINE = re.compile(rb'^H,[^\r\n]*', re.M)
+# An answer from the command task in commands.py
+_REPLY_LINE = re.compile(rb'^(?:ok|err)\b[^\r\n]*', re.M)
+
+# A well formed sample line
+_SAMPLE_LINE = re.compile(rb'^-?\d+,-?\d+(?:\.\d*)?\r?$', re.M)
+
+
+def parse_csv(data):
+    """!
+    Decodes complete 'time,position' lines into arrays. Lines which are not
+    samples are skipped.
+    @param data bytes holding only complete lines
+    @returns a (times, positions) pair of float arrays
+    """
+    # Blocks which are nothing but sample lines go straight to the parser;
+    # anything else is cleaned up first
+    if (_STRAY.search(data) is not None
+            or data.count(b',') != data.count(b'\n')
+            or b'\n\n' in data or b',,' in data):
+        data = b'\n'.join(_SAMPLE_LINE.findall(data))
+    try:
+        return _load(data)
+    except ValueError:
+        # A line cut short, such as by the board being reset, got past
+        # the quick checks, so the lines are picked out one by one
+        return _load(b'\n'.join(_SAMPLE_LINE.findall(data)))
+
+
+def _load(data):
+    # Parses lines which should all be samples
+    if not data.strip():
+        return np.empty(0), np.empty(0)
+    table = np.loadtxt(io.BytesIO(data), delimiter=',', ndmin=2)
+    return table[:, 0], table[:, 1]
+
+
+def _collect_lines(data, histograms, replies):
+    # Sets aside the timing histogram lines and command answers in some
+    # complete lines
+    if b'H,' in data:
+        histograms.extend(line.decode() for line in _HISTOGRAM_LINE.findall(data))
+    if b'ok' in data or b'err' in data:
+        replies.extend(line.decode() for line in _REPLY_LINE.findall(data))
+
+
+def fletcher16(data):
+    """!
+    Computes the Fletcher-16 checksum of some bytes with NumPy. This gives
+    the same result as telemetry.fletcher16().
+    @param data bytes to check
+    @returns the checksum as an integer from 0 to 65535
+    """
+    values = np.frombuffer(data, dtype=np.uint8).astype(np.int64)
+    weights = np.arange(len(values), 0, -1, dtype=np.int64)
+    sum1 = int(values.sum()) % 255
+    sum2 = int((values * weights).sum()) % 255
+    return (sum2 << 8) | sum1
+
+
+class CsvChunker:
+    """!
+    This class decodes .CSV lines fed in blocks of any size. A line split
+    across two blocks is kept until the rest of it arrives. Timing histogram
+    lines are set aside in the histograms list, and answers to commands in
+    the replies list, for the caller to collect.
+    """
+
+    def __init__(self):
+        """!
+        Initializes the decoder with nothing received yet.
+        """
+        self.pending = b''
+        self.histograms = []
+        self.replies = []
+
+    def feed(self, data):
+        """!
+        Decodes a block of bytes.
+        @param data bytes read from the serial port
+        @returns a list holding a (times, positions) pair of arrays for each
+                 stretch of samples, and END_OF_RUN wherever a run ended
+        """
+        data = self.pending + data
+        cut = data.rfind(b'\n') + 1
+        self.pending = data[cut:]
+        data = data[:cut]
+        _collect_lines(data, self.histograms, self.replies)
+
+        items = []
+        start = 0
+        for match in _END_LINE.finditer(data):
+            self._add(items, data[start:match.start()])
+            items.append(END_OF_RUN)
+            start = match.end()
+        self._add(items, data[start:])
+        return items
+
+    def _add(self, items, data):
+        times, positions = parse_csv(data)
+        if len(times):
+            items.append((times, positions))
+
+
+class FrameChunker:
+    """!
+    This class decodes binary telemetry frames fed in blocks of any size.
+    The samples of neighbouring frames of the same axis are joined into one
+    pair of arrays; samples of different axes are never joined. Text lines
+    printed between frames are looked through as CsvChunker does, setting
+    aside timing histograms and answers to commands.
+    """
+
+    def __init__(self, axis=None):
+        """!
+        Initializes the decoder with nothing received yet.
+        @param axis if None, every item returned is tagged with its axis
+               number; otherwise only frames of this axis are kept, and the
+               items are not tagged
+        """
+        self.buffer = bytearray()
+        self.bad_frames = 0
+        self.only_axis = axis
+        self.other_frames = 0
+        self.axis = None
+        self.text = bytearray()
+        self.histograms = []
+        self.replies = []
+
+    def feed(self, data):
+        """!
+        Decodes a block of bytes.
+        @param data bytes read from the serial port
+        @returns a list holding an (axis, times, positions) tuple for each
+                 stretch of samples of one axis, and (axis, END_OF_RUN)
+                 wherever a run of that axis ended; when the decoder keeps
+                 only one axis these are (times, positions) and END_OF_RUN
+        """
+        buf = self.buffer
+        buf += data
+        items = []
+        times = []
+        positions = []
+        start = 0
+
+        text = self.text
+        while True:
+            found = buf.find(telemetry.SYNC, start)
+            if found < 0:
+                # A last byte which may be the first half of the next SYNC
+                # is kept for the next block
+                found = len(buf)
+                if found > start and buf[-1] == telemetry.SYNC[0]:
+                    found -= 1
+                text += buf[start:found]
+                start = found
+                break
+            text += buf[start:found]
+            start = found
+            head = start + telemetry.PREFIX_SIZE
+            if head > len(buf):
+                break
+            body = struct.unpack_from(telemetry.LENGTH_FORMAT, buf,
+                                      start + len(telemetry.SYNC))[0]
+            if body < telemetry.HEADER_SIZE or (body - telemetry.HEADER_SIZE) % 4:
+                start += 1
+                continue
+            end = head + body + telemetry.CHECK_SIZE
+            if end > len(buf):
+                break
+
+            check = struct.unpack_from('<H', buf, head + body)[0]
+            if check != fletcher16(buf[head:head + body]):
+                self.bad_frames += 1
+                start += 1
+                continue
+
+            kind, axis, seq, t0_ms, dt_us, count = struct.unpack_from(
+                telemetry.HEADER_FORMAT, buf, head)
+            samples = np.frombuffer(buf[head + telemetry.HEADER_SIZE:head + body],
+                                    dtype='<i4')
+            start = end
+
+            # Frames of other axes are skipped if only one is kept
+            if self.only_axis is not None and axis != self.only_axis:
+                self.other_frames += 1
+                continue
+
+            # Samples of another axis start a new stretch
+            if axis != self.axis:
+                self._flush(items, times, positions)
+                self.axis = axis
+
+            if kind == telemetry.END:
+                self._flush(items, times, positions)
+                items.append(END_OF_RUN if self.only_axis is not None else (axis, END_OF_RUN))
+            elif kind == telemetry.STREAM:
+                pairs = samples.reshape(-1, 2)
+                times.append(pairs[:, 0].astype(np.float64))
+                positions.append(pairs[:, 1].astype(np.float64))
+            else:
+                times.append(t0_ms + np.arange(count) * (dt_us / 1000))
+                positions.append(samples.astype(np.float64))
+
+        self._flush(items, times, positions)
+        del buf[:start]
+        self._read_text()
+        return items
+
+    def _read_text(self):
+        # Looks through the complete lines of text found between frames
+        text = self.text
+        cut = text.rfind(b'\n') + 1
+        if cut:
+            _collect_lines(bytes(text[:cut]), self.histograms, self.replies)
+            del text[:cut]
+        if len(text) > TEXT_LIMIT:
+            text[:] = b''
+
+    def _flush(self, items, times, positions):
+        if times:
+            item = (np.concatenate(times), np.concatenate(positions))
+            items.append(item if self.only_axis is not None else (self.axis,) + item)
+            times.clear()
+            positions.clear()
+
+
+def read_run(ser, binary=False, chunk=CHUNK_SIZE, axis=0):
+    """!
+    Reads one whole step response from the serial port in large blocks.
+    @param ser The serial object to read from
+    @param binary True if the board sends binary frames instead of .CSV lines
+    @param chunk number of bytes asked for in each read
+    @param axis axis (motor) whose run is read, when reading binary frames
+    @returns a (times, positions) pair of float arrays
+    """
+    decoder = FrameChunker(axis) if binary else CsvChunker()
+    times = []
+    positions = []
+    while True:
+        data = ser.read(min(max(ser.in_waiting, 1), chunk))
+        for item in decoder.feed(data):
+            if item is END_OF_RUN:
+                if not times:
+                    return np.empty(0), np.empty(0)
+                return np.concatenate(times), np.concatenate(positions)
+            times.append(item[0])
+            positions.append(item[1])
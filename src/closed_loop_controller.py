@@ -10,15 +10,20 @@ for use with step_control.py to visually plot step responses with proportional g
 import encoder_reader as enc
 import motor_driver as moe
 import utime
+import sample_buffer
 
 class control:
     """! 
     This class implements the necessary code to implement a motor controller
     for an ME405 kit. 
     """
-    def __init__(self):
+    def __init__(self, depth=1000, policy=sample_buffer.STOP):
         """! 
         Initializes the the proportional gain and setpoint values.
+        @param depth largest number of positions recorded for one step response
+        @param policy what to do once the recording is full, either
+               sample_buffer.STOP to keep the start of the response or
+               sample_buffer.OVERWRITE to keep the end of it
         """
         self.gain = 0
         self.setpoint = 0
@@ -28,7 +33,28 @@ class control:
         self.steady_counter = 0
         self.print_counter = 0
         self.init_time = 0
-        self.position = []
+        
+        # Positions recorded during the step response. The memory is set
+        # aside here so that recording never allocates in the control loop
+        self.position = sample_buffer.SampleBuffer(depth, policy)
+        
+        # Used for sending the step response as binary frames
+        self.telemetry = None
+        self.axis = 0
+        self.start_time = 0
+        self.sample_us = 0
+        self.recorded = 0
+        
+        # Used for streaming samples while the step response runs
+        self.stream = None
+        self.continuous = False
+        
+        # Used for measuring the timing of the control path
+        self.timing = None
+        
+        # Table of reference positions being followed, if any
+        self.profile = None
+        self.profile_index = 0
     
     def set_setpoint(self, user_p):
         """! 
@@ -36,6 +62,90 @@ class control:
         @param user_p gain given by whatever is calling the function
         """
         self.setpoint = user_p
+        self.profile = None
+    
+    def set_profile(self, table):
+        """! 
+        Makes the setpoint follow a planned move, one entry of the table
+        each run, instead of jumping straight to the end
+        @param table array of reference positions, such as one made by
+               motion_profile.trapezoid(); the last entry is held afterwards
+        """
+        self.profile = table
+        self.profile_index = 0
+    
+    def moving(self):
+        """! 
+        Tells whether a planned move is still being followed
+        @returns True until the last entry of the profile has been used
+        """
+        return self.profile is not None and self.profile_index < len(self.profile)
+  
+    def set_telemetry(self, writer, axis=0):
+        """! 
+        Makes the step response be sent as binary frames instead of printed
+        one line at a time
+        @param writer telemetry.FrameWriter used to send the frames, or None
+               to go back to printing
+        @param axis number sent with the frames to tell motors apart
+        """
+        self.telemetry = writer
+        self.axis = axis
+  
+    def set_stream(self, streamer, axis=0, continuous=False):
+        """! 
+        Makes the step response be streamed while it runs instead of being
+        recorded and sent afterwards. Samples go to a telemetry.Streamer,
+        which is emptied by its own low priority task
+        @param streamer telemetry.Streamer which receives the samples, or
+               None to go back to recording
+        @param axis number sent with the samples to tell motors apart
+        @param continuous if True the control loop keeps running and
+               streaming after the setpoint is reached, for monitoring
+        """
+        self.stream = streamer
+        self.axis = axis
+        self.continuous = continuous
+    
+    def set_timing(self, timing):
+        """! 
+        Makes the step response record the latency, period and jitter of
+        each pass through the control path
+        @param timing latency.AxisTiming which receives the measurements,
+               or None to stop measuring
+        """
+        self.timing = timing
+    
+    def record(self, actual):
+        """! 
+        Keeps one position sample of the step response, either in the
+        recording buffer or in the stream
+        @param actual the current position of the motor
+        """
+        # Time of the first sample, used to timestamp the samples
+        if self.recorded == 0:
+            self.start_time = utime.ticks_ms()
+        self.recorded += 1
+        
+        if self.stream is not None:
+            self.stream.record(self.axis,
+                               utime.ticks_diff(utime.ticks_ms(), self.start_time),
+                               actual)
+        else:
+            self.position.append(actual)
+  
+    def start(self):
+        """! 
+        Starts a new step response from the beginning, throwing away any
+        recording not yet sent. Meant to be called after the last one has
+        ended, when the encoder has been zeroed again
+        """
+        self.state = 0
+        self.print_counter = 0
+        self.steady_counter = 0
+        self.recorded = 0
+        self.profile_index = 0
+        self.position.clear()
   
     def set_Kp(self, user_p):
         """! 
@@ -67,6 +177,11 @@ class control:
         @returns the duty cycle to be fed into the motor driver
         """
         
+        # Moves the setpoint along the planned move, if there is one
+        if self.profile is not None and self.profile_index < len(self.profile):
+            self.setpoint = self.profile[self.profile_index]
+            self.profile_index += 1
+        
         # Equation
         pwm = self.gain*(self.setpoint - actual)
         return pwm
@@ -82,84 +197,277 @@ class control:
         @param controller controller object responsible for runnning functions within class
         @param gain gain needed for following run
         """
-        try:          
-            # State 0: Step-response
-            if self.state == 0:
-                # Continously runs the step response with a delay of 10 ms ...
-                actual = encoder.read()
+        # State 0: Step-response
+        if self.state == 0:
+            # Continously runs the step response with a delay of 10 ms ...
+            actual = encoder.read()
+            try:
                 duty_cycle = controller.run(actual)
-                motor.set_duty_cycle(duty_cycle)
-                self.position.append(actual)
-                # utime.sleep_ms(10)
             
-            # ... until the set motor position is reached
-                if abs(duty_cycle) <= 10:
-                    # Sets next state
-                    self.state += 1
-                    
-            # State 1: Step-Response Redundancy
-            # Places the ending value of the step response 10 times
-            # For cleaner plots
-            elif self.state == 1:
-                actual = encoder.read()
-                self.position.append(actual)
-                # utime.sleep_ms(10)
-                
-                # Counter for this state
-                self.steady_counter += 1
+            # This portion only runs the first time through
+            # This makes the motor run initially
+            except TypeError:
+                motor.set_duty_cycle(controller.run(0))
+                self.record(0)
+                return
+            motor.set_duty_cycle(duty_cycle)
+            if self.timing is not None:
+                self.timing.record(encoder)
+            self.record(actual)
+            # utime.sleep_ms(10)
+        
+        # ... until the set motor position is reached
+            if (abs(duty_cycle) <= 10 and not self.continuous
+                    and not controller.moving()):
+                # Sets next state
+                self.state += 1
                 
-                # Sets next state once counter reaches it's limit
-                if self.steady_counter == 10:
-                    self.state += 1
-                    
-                    # Grabs initial time
-                    self.init_time = utime.ticks_ms()
+        # State 1: Step-Response Redundancy
+        # Places the ending value of the step response 10 times
+        # For cleaner plots
+        elif self.state == 1:
+            actual = encoder.read()
+            self.record(actual)
+            # utime.sleep_ms(10)
             
-            # State 2: Printing Step Response
-            elif self.state == 2:                             
-                # Prints time and encoder position in .CSV style format
-                print(f"{utime.ticks_ms() - self.init_time},{self.position[self.print_counter]}")
-                
-                # Counter for this state
-                # Exits when printing raises an IndexError
-                self.print_counter += 1
-                
-                # utime.sleep_ms(9)
+            # Counter for this state
+            self.steady_counter += 1
             
-            # State 3:Ending
-            elif self.state == 3: 
-                # Prints end once the code is done running through 
-                # Indicates to GUI when to start plotting
-                print('end')
+            # Sets next state once counter reaches it's limit
+            if self.steady_counter == 10:
+                self.state += 1
                 
-                # Clears position list
-                self.position.clear()
+                # Streamed samples have already been sent, so only the
+                # end of the run is left to mark
+                if self.stream is not None:
+                    self.stream.end(self.axis)
+                    self.state = 3
+                    return
                 
-                # Sets Kp value
-#                 controller.set_Kp(gain)
+                # Grabs initial time
+                self.init_time = utime.ticks_ms()
                 
-                # Zeros outs necessary values and parameters for next run 
-                # through
-                encoder.zero()
-                self.state = 4
-                self.print_counter = 0
-                self.steady_counter = 0
+                # Average time between samples, over every sample taken
+                # (the recording may have kept fewer of them)
+                self.sample_us = (utime.ticks_diff(self.init_time, self.start_time)
+                                  * 1000 // max(1, self.recorded - 1))
+        
+        # State 2: Printing Step Response
+        elif self.state == 2:
+            # Sends a whole block of samples in one binary frame
+            if self.telemetry is not None:
+                sent = self.telemetry.send_block(self.axis, self.position,
+                                                 self.print_counter, self.sample_us)
+                self.print_counter += sent
                 
+                # Marks the end of the run once every sample is sent
+                if sent == 0:
+                    self.telemetry.send_end(self.axis)
+                    self.state += 1
+                return
+            
+            # Only runs when finished printing the step-response values
+            try:
+                position = self.position[self.print_counter]
+            except IndexError:
+                self.state += 1
+                return
+            
+            # Prints time and encoder position in .CSV style format
+            print(f"{utime.ticks_ms() - self.init_time},{position}")
+            
+            # Counter for this state
+            self.print_counter += 1
+            
+            # utime.sleep_ms(9)
         
-        # This portion only runs the first time through
-        # This makes the motor run initially
-        except TypeError:
-            duty_cycle = controller.run(0)
-            motor.set_duty_cycle(duty_cycle)
-            self.position.append(0)
-            # utime.sleep_ms(10)
+        # State 3:Ending
+        elif self.state == 3: 
+            # Prints end once the code is done running through 
+            # Indicates to GUI when to start plotting
+            # (binary frames already ended with an END frame)
+            if self.telemetry is None and self.stream is None:
+                print('end')
+            
+            # Clears position list
+            self.position.clear()
+            
+            # Sets Kp value
+#             controller.set_Kp(gain)
+            
+            # Zeros outs necessary values and parameters for next run 
+            # through
+            encoder.zero()
+            self.state = 4
+            self.print_counter = 0
+            self.steady_counter = 0
+            self.recorded = 0
             
-        # Only runs when finished printing the step-response values
-        except IndexError:
-            self.state += 1
+
+class fixed_pid:
+    """! 
+    This class implements a PID controller using only integer arithmetic,
+    which can be used in place of control.run(). Gains are scaled to
+    integers when they are set, so running the controller never makes a
+    float and never allocates memory on the board. Every intermediate value
+    is kept small enough to stay a MicroPython small integer.
+    
+    The integral has anti-windup (it stops growing while the output is
+    saturated in the same direction), the derivative is taken on the
+    measurement rather than the error so setpoint changes do not kick the
+    motor, and it is low-pass filtered.
+    """
+    
+    ## Fraction bits of the proportional and derivative gains
+    SHIFT = 12
+    ## Fraction bits of the integral gain and accumulator
+    ISHIFT = 20
+    ## Fraction bits of the filtered derivative
+    DSHIFT = 4
+    ## Largest error used, in encoder counts, so products cannot overflow
+    MAX_ERROR = 1 << 17
+    ## Largest change in position per run used for the derivative
+    MAX_DELTA = 1 << 12
+    ## Largest scaled gain
+    MAX_GAIN = 1 << 12
+    
+    def __init__(self, period_ms, out_max=100, filter_shift=2):
+        """! 
+        Initializes the controller with all gains set to zero.
+        @param period_ms time between runs of the controller, in ms, used to
+               scale the integral and derivative gains
+        @param out_max largest duty cycle put out, in percent, in either direction
+        @param filter_shift strength of the derivative filter; each run the
+               filtered value moves 1/2**filter_shift of the way to the new one
+        """
+        self.period_ms = period_ms
+        self.out_max = int(out_max)
+        self.filter_shift = filter_shift
+        
+        # Scaled integer gains
+        self.kp = 0
+        self.ki = 0
+        self.kd = 0
+        
+        self.setpoint = 0
+        self.profile = None
+        self.profile_index = 0
+        self.reset()
+        
+    def reset(self):
+        """! 
+        Clears the integral and derivative history, such as before a new run.
+        """
+        self.integral = 0
+        self.deriv = 0
+        self.last_actual = None
+    
+    def _scale(self, value, shift):
+        # Converts a gain to a scaled integer, clipped to the largest allowed
+        scaled = int(value * (1 << shift) + 0.5)
+        return max(0, min(scaled, self.MAX_GAIN))
+    
+    def set_setpoint(self, user_p):
+        """! 
+        Sets the position the controller moves the motor to
+        @param user_p setpoint in encoder counts
+        """
+        self.setpoint = int(user_p)
+        self.profile = None
+    
+    def set_profile(self, table):
+        """! 
+        Makes the setpoint follow a planned move, one entry of the table
+        each run, instead of jumping straight to the end
+        @param table array of reference positions, such as one made by
+               motion_profile.trapezoid(); the last entry is held afterwards
+        """
+        self.profile = table
+        self.profile_index = 0
+    
+    def moving(self):
+        """! 
+        Tells whether a planned move is still being followed
+        @returns True until the last entry of the profile has been used
+        """
+        return self.profile is not None and self.profile_index < len(self.profile)
+    
+    def set_Kp(self, user_p):
+        """! 
+        Sets the proportional gain
+        @param user_p gain in percent duty cycle per encoder count
+        """
+        self.kp = self._scale(user_p, self.SHIFT)
+    
+    def set_Ki(self, user_i):
+        """! 
+        Sets the integral gain
+        @param user_i gain in percent duty cycle per encoder count-second
+        """
+        self.ki = self._scale(user_i * self.period_ms / 1000, self.ISHIFT)
+    
+    def set_Kd(self, user_d):
+        """! 
+        Sets the derivative gain
+        @param user_d gain in percent duty cycle per encoder count per second
+        """
+        self.kd = self._scale(user_d * 1000 / self.period_ms, self.SHIFT - self.DSHIFT)
+    
+    def run(self, actual):
+        """!
+        Function that will be run repeatedly in the main loop to work out the
+        duty cycle from the current motor position
+        @param actual the current position of the motor read by the encoder
+        @returns the duty cycle to be fed into the motor driver, as an integer
+                 percentage between -out_max and out_max
+        """
+        out_max = self.out_max
+        
+        # Moves the setpoint along the planned move, if there is one
+        profile = self.profile
+        if profile is not None and self.profile_index < len(profile):
+            self.setpoint = profile[self.profile_index]
+            self.profile_index += 1
+        
+        # Error, clipped so the products below stay small integers
+        error = self.setpoint - actual
+        if error > self.MAX_ERROR:
+            error = self.MAX_ERROR
+        elif error < -self.MAX_ERROR:
+            error = -self.MAX_ERROR
+        
+        # Filtered change in position since the last run
+        if self.last_actual is None:
+            self.last_actual = actual
+        delta = actual - self.last_actual
+        self.last_actual = actual
+        if delta > self.MAX_DELTA:
+            delta = self.MAX_DELTA
+        elif delta < -self.MAX_DELTA:
+            delta = -self.MAX_DELTA
+        self.deriv += ((delta << self.DSHIFT) - self.deriv) >> self.filter_shift
+        
+        # Output before the integral is updated
+        p_d = (self.kp * error - self.kd * self.deriv) >> self.SHIFT
+        out = p_d + (self.integral >> self.ISHIFT)
+        
+        # The integral only grows when that does not push the output
+        # further into saturation
+        if not ((out >= out_max and error > 0) or (out <= -out_max and error < 0)):
+            limit = out_max << self.ISHIFT
+            integral = self.integral + self.ki * error
+            if integral > limit:
+                integral = limit
+            elif integral < -limit:
+                integral = -limit
+            self.integral = integral
+            out = p_d + (integral >> self.ISHIFT)
         
-        # except ValueError:
-        #     self.state += 1
+        if out > out_max:
+            return out_max
+        if out < -out_max:
+            return -out_max
+        return out
             
 
 if __name__ == "__main__":
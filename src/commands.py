@@ -0,0 +1,175 @@
+"""!
+@file commands.py
+This file contains a task which reads short commands from the serial port,
+so gains, setpoints and task periods can be changed and runs started
+without reflashing the board. Each run of the task only moves the bytes
+which have already arrived into a buffer set aside in advance, and only
+works on a line once it is complete, so it never waits for the PC and never
+holds up the motor tasks.
+
+Commands are one line each, ended by a carriage return or newline:
+@code
+K<axis> <gain>        set the proportional gain
+S<axis> <position>    set the setpoint, in encoder counts
+P<axis> <period>      set the task period, in ms
+R<axis>               start a new step response
+?                     print the timing histograms (see latency.py)
+<gain>                set the gain of axis 0 and start a run, as sent by
+                      step_control.plot_example()
+@endcode
+Each command is answered with a line reading @c ok, or @c err followed by
+the reason.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+## Longest command line, in bytes
+LINE_SIZE = 32
+
+## Largest number of bytes taken from the port in one run of the task
+BYTES_PER_RUN = 16
+
+
+class CommandTask:
+    """!
+    This class implements the command task. Controllers and cotask tasks are
+    registered with it by axis number.
+    """
+
+    def __init__(self, port=None, axes=2, timings=None):
+        """!
+        Initializes the task with nothing registered.
+        @param port object with any() and readinto() methods, such as
+               pyb.USB_VCP(); if None one is made when the task first runs
+        @param axes number of axes (motors) which can be registered
+        @param timings list of latency.AxisTiming objects printed by the
+               '?' command, or None
+        """
+        self.port = port
+        self.timings = timings
+        self.controllers = [None] * axes
+        self.encoders = [None] * axes
+        self.tasks = [None] * axes
+
+        # Memory set aside for the line being received and each byte read
+        self.line = bytearray(LINE_SIZE)
+        self.length = 0
+        self.overflow = False
+        self.byte = bytearray(1)
+
+    def set_controller(self, axis, controller, encoder=None):
+        """!
+        Registers the controller of an axis, so its gain and setpoint can be
+        set and runs started.
+        @param axis axis number
+        @param controller closed_loop_controller.control object
+        @param encoder encoder of the axis, zeroed when a run is started so
+               each run begins from zero, or None if the controller does that
+        """
+        self.controllers[axis] = controller
+        self.encoders[axis] = encoder
+
+    def set_task(self, axis, task):
+        """!
+        Registers the cotask task running an axis, so its period can be set.
+        @param axis axis number
+        @param task cotask.Task object
+        """
+        self.tasks[axis] = task
+
+    def run(self):
+        """!
+        Generator which takes whatever has arrived each time it runs and
+        carries out each complete command, meant to be run as a cotask task.
+        """
+        if self.port is None:
+            import pyb
+            self.port = pyb.USB_VCP()
+        port = self.port
+        line = self.line
+        byte = self.byte
+        while True:
+            for _ in range(BYTES_PER_RUN):
+                if not port.any() or not port.readinto(byte):
+                    break
+                char = byte[0]
+                if char == 0x0D or char == 0x0A:
+                    # Line ended; empty lines (such as the \n after \r) are skipped
+                    if self.overflow:
+                        print('err too long')
+                    elif self.length:
+                        self.execute(bytes(line[:self.length]))
+                    self.length = 0
+                    self.overflow = False
+                elif self.length < LINE_SIZE:
+                    line[self.length] = char
+                    self.length += 1
+                else:
+                    self.overflow = True
+            yield 0
+
+    def execute(self, text):
+        """!
+        Carries out one command and prints the answer.
+        @param text the command line, without its ending
+        """
+        try:
+            reply = self._execute(text)
+        except (ValueError, IndexError) as err:
+            reply = f'err {err}'
+        print(reply)
+
+    def _execute(self, text):
+        # Carries out one command and returns the answer
+        if text == b'?':
+            if self.timings is None:
+                return 'err no timing'
+            for timing in self.timings:
+                timing.write()
+            return 'ok'
+
+        command = text[0:1]
+        if command not in (b'K', b'S', b'P', b'R'):
+            # A bare number is the gain typed into the GUI
+            gain = float(text)
+            self._controller(0).set_Kp(gain)
+            self._start(0)
+            return 'ok'
+
+        parts = text[1:].split()
+        axis = int(parts[0]) if parts else 0
+        if command == b'R':
+            self._start(axis)
+            return 'ok'
+        if len(parts) < 2:
+            raise ValueError('missing value')
+        value = float(parts[1])
+        if command == b'K':
+            self._controller(axis).set_Kp(value)
+        elif command == b'S':
+            self._controller(axis).set_setpoint(int(value))
+        else:
+            task = self.tasks[axis]
+            if task is None:
+                raise ValueError('no task')
+            if value <= 0:
+                raise ValueError('bad period')
+            # cotask keeps task periods in microseconds
+            task.period = int(value * 1000)
+        return 'ok'
+
+    def _start(self, axis):
+        # Starts a new run from zero, as the motor tasks do at the end of each run
+        controller = self._controller(axis)
+        encoder = self.encoders[axis]
+        if encoder is not None:
+            encoder.zero()
+        controller.start()
+
+    def _controller(self, axis):
+        # Controller of an axis, which must have been registered
+        controller = self.controllers[axis]
+        if controller is None:
+            raise ValueError('no axis')
+        return controller
@@ -0,0 +1,227 @@
+"""!
+@file data_logger.py
+This file contains code that records samples to a file on the board's flash
+or SD card, so long runs can be recorded with no PC attached. It takes the
+place of telemetry.Streamer: a controller given one with
+control.set_stream() records into it the same way.
+
+Samples go into one of two buffers set aside in advance. The control task
+fills one while a low priority task writes the other to the file, one frame
+at a time so no single run of the task takes long. When the buffer being
+filled is full the two swap over; if the other one has not been written out
+yet, samples are dropped and counted instead of making the control task wait.
+The last place in each buffer is kept for the record which ends a run, so
+the end of a run is not lost along with the samples.
+
+The file holds the same binary frames as telemetry.py (STREAM frames of
+time and position pairs, and an END frame after each run), so the PC reads
+it with log_reader.py using the same decoder as for the serial port.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+from array import array
+import telemetry
+
+## Added to the axis number of a record that marks the end of a run
+END_MARK = 0x80
+
+
+class _Buffer:
+    """!
+    This class holds one of the two buffers: the axis, time and value of
+    each record, and how many records are in it and have been written.
+    """
+
+    def __init__(self, depth):
+        """!
+        Sets aside the memory for the buffer.
+        @param depth number of records the buffer holds
+        """
+        self.axes = bytearray(depth)
+        self.times = array('l', [0] * depth)
+        self.values = array('l', [0] * depth)
+        self.count = 0
+        self.written = 0
+
+
+class FlashLogger:
+    """!
+    This class implements the double buffered logger.
+    """
+
+    def __init__(self, path='/flash/log', depth=512, block=64, max_bytes=1 << 20,
+                 opener=open):
+        """!
+        Initializes the logger and sets aside the memory for its buffers.
+        The first file is opened when the task first runs.
+        @param path start of the name of each log file; a three digit
+               number and @c .bin are added, such as @c /sd/log000.bin
+        @param depth number of samples each buffer holds
+        @param block largest number of 32-bit values in one frame
+        @param max_bytes a new file is started once one has grown this big
+        @param opener function used to open files, as the built-in open()
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.opener = opener
+        self.file = None
+        self.file_number = 0
+        self.file_bytes = 0
+        self.writer = telemetry.FrameWriter(self._write, block)
+
+        self.filling = _Buffer(depth)
+        self.draining = _Buffer(depth)
+        self.full = False
+        self.ending = False
+        self.dropped = 0
+
+        # Views of the buffer being written, made once here
+        self.time_slice = _Slice()
+        self.value_slice = _Slice()
+
+    def _write(self, data):
+        # Sends one frame to the file
+        self.file_bytes += self.file.write(data)
+
+    def _swap(self):
+        # Hands the filled buffer to the writing task, if it is free
+        if self.full:
+            return False
+        self.filling, self.draining = self.draining, self.filling
+        self.filling.count = 0
+        self.draining.written = 0
+        self.full = True
+        self.ending = False
+        return True
+
+    def _add(self, axis, t_ms, value, spare=1):
+        # Adds one record to the buffer being filled, swapping if it is full.
+        # Samples leave one place spare, which only an end record may use
+        buf = self.filling
+        if buf.count >= len(buf.times) - spare and not self._swap():
+            self.dropped += 1
+            return
+        buf = self.filling
+        i = buf.count
+        buf.axes[i] = axis
+        buf.times[i] = t_ms
+        buf.values[i] = value
+        buf.count = i + 1
+
+    def record(self, axis, t_ms, value):
+        """!
+        Records one sample. This is meant to be called by the control task
+        and never waits.
+        @param axis axis (motor) number
+        @param t_ms time of the sample, in ms from the start of the run
+        @param value value of the sample
+        """
+        self._add(axis, t_ms, value)
+
+    def end(self, axis):
+        """!
+        Marks the end of a run, and hands what has been recorded so far to
+        the writing task.
+        @param axis axis (motor) number
+        """
+        self._add(axis | END_MARK, 0, 0, 0)
+        if not self._swap():
+            # The other buffer is still being written; this one is handed
+            # over as soon as it is done
+            self.ending = True
+
+    def _open_next(self):
+        # Closes the current file and opens the next one
+        if self.file is not None:
+            self.file.close()
+        name = '{}{:03d}.bin'.format(self.path, self.file_number)
+        self.file_number += 1
+        self.file = self.opener(name, 'wb')
+        self.file_bytes = 0
+
+    def service(self):
+        """!
+        Writes at most one frame from the buffer waiting to be written.
+        @returns True if anything was written
+        """
+        if not self.full:
+            return False
+        if self.file is None or self.file_bytes >= self.max_bytes:
+            self._open_next()
+
+        buf = self.draining
+        start = buf.written
+        if start == buf.count:
+            # The whole buffer is in the file, so it can be filled again. A
+            # run which ended meanwhile is written next, not once it fills
+            self.file.flush()
+            self.full = False
+            if self.ending:
+                self._swap()
+            return False
+
+        axis = buf.axes[start]
+        if axis & END_MARK:
+            self.writer.send_end(axis & ~END_MARK)
+            buf.written = start + 1
+            return True
+
+        # A frame of samples in a row for the same axis
+        limit = min(buf.count, start + self.writer.block // 2)
+        end = start + 1
+        while end < limit and buf.axes[end] == axis:
+            end += 1
+        self.time_slice.set(buf.times, start)
+        self.value_slice.set(buf.values, start)
+        self.writer.send_stream(axis, self.time_slice, self.value_slice, end - start)
+        buf.written = end
+        return True
+
+    def run(self):
+        """!
+        Generator which writes the buffers to the file, meant to be run as a
+        low priority cotask task.
+        """
+        while True:
+            self.service()
+            yield 0
+
+    def close(self):
+        """!
+        Writes out everything recorded so far and closes the file.
+        """
+        if not self.full:
+            self._swap()
+        while self.full:
+            self.service()
+        if self.filling.count:
+            self._swap()
+            while self.full:
+                self.service()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class _Slice:
+    """!
+    This class lets part of an array be indexed from zero without copying it.
+    """
+
+    def __init__(self):
+        self.data = None
+        self.start = 0
+
+    def set(self, data, start):
+        """!
+        Points the view at part of an array.
+        @param data the array
+        @param start index in the array of the first item of the view
+        """
+        self.data = data
+        self.start = start
+
+    def __getitem__(self, index):
+        return self.data[self.start + index]
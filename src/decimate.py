@@ -0,0 +1,136 @@
+"""!
+@file decimate.py
+This file contains code that cuts a long trace down to the points that can
+actually be seen before it is handed to Matplotlib. The part of the trace in
+view is split into one bucket per pixel column, and only the lowest and
+highest point of each bucket are drawn, so the plot looks the same but the
+cost of drawing it depends on the width of the window rather than on the
+number of samples. The full trace is kept, and the points drawn are picked
+again whenever the view is zoomed or panned.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import numpy as np
+
+## Number of pixel columns assumed when the width of the axes is not known
+DEFAULT_COLUMNS = 1000
+
+
+def _first_in_bucket(mask, bucket):
+    # Index of the first True of mask in each bucket which has one
+    hits = np.flatnonzero(mask)
+    _, first = np.unique(bucket[hits], return_index=True)
+    return hits[first]
+
+
+def minmax(x, y, x_min=None, x_max=None, columns=DEFAULT_COLUMNS):
+    """!
+    Picks the points of a trace to draw in a view.
+    @param x array of sample times, in increasing order
+    @param y array of sample values
+    @param x_min left edge of the view, or None for the start of the trace
+    @param x_max right edge of the view, or None for the end of the trace
+    @param columns number of pixel columns across the view
+    @returns an (x, y) pair of arrays holding the lowest and highest point of
+             each column in view, in order, plus one point either side of
+             the view so the line runs off the edges
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    lo = 0 if x_min is None else max(0, np.searchsorted(x, x_min, 'left') - 1)
+    hi = len(x) if x_max is None else min(len(x), np.searchsorted(x, x_max, 'right') + 1)
+    xs = x[lo:hi]
+    ys = y[lo:hi]
+
+    # Short stretches are drawn as they are
+    columns = max(1, int(columns))
+    if len(xs) <= 4 * columns:
+        return xs, ys
+
+    span = xs[-1] - xs[0]
+    if span <= 0:
+        return xs[[0, -1]], ys[[0, -1]]
+    bucket = ((xs - xs[0]) * (columns / span)).astype(np.int64)
+    np.minimum(bucket, columns - 1, out=bucket)
+
+    # Lowest and highest value of each bucket which holds any samples
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    counts = np.diff(np.r_[starts, len(bucket)])
+    lows = np.repeat(np.minimum.reduceat(ys, starts), counts)
+    highs = np.repeat(np.maximum.reduceat(ys, starts), counts)
+
+    keep = np.concatenate(([0, len(xs) - 1],
+                           _first_in_bucket(ys == lows, bucket),
+                           _first_in_bucket(ys == highs, bucket)))
+    keep = np.unique(keep)
+    return xs[keep], ys[keep]
+
+
+class DecimatedLine:
+    """!
+    This class draws a trace on a set of axes through minmax(), picking the
+    points again each time the horizontal limits of the axes change.
+    """
+
+    def __init__(self, axes, x=(), y=(), line=None, **line_args):
+        """!
+        Makes the line and starts following the view of the axes.
+        @param axes Matplotlib axes to draw on
+        @param x sample times, in increasing order
+        @param y sample values
+        @param line existing Line2D to use, or None to make one
+        @param line_args settings passed to axes.plot() when making the line
+        """
+        self.axes = axes
+        self.line = line if line is not None else axes.plot([], [], **line_args)[0]
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        # Matplotlib only keeps a weak reference to a bound method, so a line
+        # nobody else kept would be thrown away and stop following the view;
+        # a plain function is kept for as long as the axes are
+        self.callback = axes.callbacks.connect(
+            'xlim_changed', lambda changed: self._limits_changed(changed))
+        self.refresh()
+
+    def set_data(self, x, y):
+        """!
+        Replaces the whole trace.
+        @param x sample times, in increasing order
+        @param y sample values
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.refresh()
+
+    def columns(self):
+        """!
+        @returns the width of the axes in pixels
+        """
+        width = self.axes.bbox.width
+        return int(width) if width > 1 else DEFAULT_COLUMNS
+
+    def refresh(self, whole=False):
+        """!
+        Picks the points to draw for the current view. While the axes scale
+        themselves to fit the data, the whole trace counts as in view.
+        @param whole if True the whole trace is treated as in view, so that
+               Matplotlib can work out limits which fit all of it
+        """
+        if whole or self.axes.get_autoscalex_on():
+            x_min = x_max = None
+        else:
+            x_min, x_max = self.axes.get_xlim()
+        self.line.set_data(*minmax(self.x, self.y, x_min, x_max, self.columns()))
+
+    def _limits_changed(self, axes):
+        # The view was zoomed or panned
+        self.refresh()
+
+    def remove(self):
+        """!
+        Stops following the view and takes the line off the axes.
+        """
+        self.axes.callbacks.disconnect(self.callback)
+        self.line.remove()
@@ -8,6 +8,7 @@ even in cases of over- and underflow.
 """
 
 import time						# Needed to run a delay after each print statement
+import utime					# Needed to timestamp each reading
 import motor_driver as moe		# Needed to run the motor at a set duty cycle
 
 class encoder:
@@ -16,7 +17,7 @@ class encoder:
     for an ME405 kit. 
     """
     
-    def __init__(self, timer, ch1, ch2):
+    def __init__(self, timer, ch1, ch2, vel_shift=2):
         """! 
         Initializes the motor encoder by initializing GPIO
         pins and setting values for variables used for tracking the
@@ -24,49 +25,87 @@ class encoder:
         @param timer Timer associated with the chosen pins (8)
         @param ch1 Timer Channel associated with the chosen pin1 (C6)
         @param ch2 Timer Channel associated with the chosen pin2 (C7)
+        @param vel_shift strength of the velocity filter; each reading the
+               velocity moves 1/2**vel_shift of the way to the newly measured one
         """ 
         self.timer = timer
         self.ch1 = ch1
         self.ch2 = ch2
         
+        # Number of counts before the timer wraps around, and half of it
+        self.range = timer.period() + 1
+        self.half = self.range // 2
+        
         # Used for tracking the total positiion traveled by the motor
         self.last_count = 0 
         self.current_count = 0
         self.change =  0
         
+        # Used for tracking the speed of the motor, in counts per second,
+        # and the time of and between readings, in microseconds
+        self.vel_shift = vel_shift
+        self.vel_half = (1 << vel_shift) >> 1
+        self.velocity = 0
+        self.last_us = 0
+        self.dt_us = 0
+        self.primed = False
+        
     def read(self):
         """!
         This method records the total position moved by the motor
         by recording the difference between the current encoder value
         and the previous value, and adding it to the total position moved.
-        In cases of overflow or underflow, the total position will be added
-        or subtracted by the period, respectively.
+        In cases of overflow or underflow, the difference is corrected by
+        the number of counts in one wrap of the timer.
+        
+        The counter is read only once, together with the time, so no counts
+        are lost between readings. The time between readings is kept in
+        dt_us and a filtered speed in velocity, without reading the timer
+        again.
         
         @returns the current position read by the encoder to be used
         for a control loop
         """
+        count = self.timer.counter()
+        now = utime.ticks_us()
+        
         # Position moved between intervals
-        self.change = self.timer.counter() - self.last_count
+        change = count - self.last_count
+        # Sets the previous value as the current value, for the next iteration
+        self.last_count = count
+        
+        # A change of more than half the timer means the timer wrapped:
+        # backwards means overflow, forwards means underflow
+        if change >= self.half:
+            change -= self.range
+        elif change < -self.half:
+            change += self.range
+        self.change = change
         
         # Total position moved
-        self.current_count = (self.change) + self.current_count
-        # Sets the previous value as the current value, for the next iteration
-        self.last_count = self.timer.counter()
+        self.current_count += change
+        
+        # Speed in counts per second. The time is cut down by 64 (and a
+        # million by the same amount, to 15625) so the product stays a small
+        # integer and the board does not have to allocate memory. Both the
+        # division and the filter step round the size of the number, so
+        # speeds in reverse are not biased by rounding towards minus infinity
+        dt = utime.ticks_diff(now, self.last_us)
+        self.last_us = now
+        if self.primed and dt >= 64:
+            self.dt_us = dt
+            if change >= 0:
+                speed = change * 15625 // (dt >> 6)
+            else:
+                speed = -(-change * 15625 // (dt >> 6))
+            step = speed - self.velocity
+            if step >= 0:
+                self.velocity += (step + self.vel_half) >> self.vel_shift
+            else:
+                self.velocity -= (self.vel_half - step) >> self.vel_shift
+        self.primed = True
         
-        # Checks is the position moved between intervals is high, meaning either
-        # overflow or underflow
-        if abs(self.change) >= 32768:
-            # For overflow
-            if self.change < 0:
-                self.current_count += 65535 
-            # For underflow    
-            elif self.change >= 0:
-                self.current_count -= 65535
-                
-        # To make sure the same encoder value does not print multiple times
         return self.current_count
-
-           
             
     def zero(self):
         """!
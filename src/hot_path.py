@@ -0,0 +1,313 @@
+"""!
+@file hot_path.py
+This file contains versions of the three methods run on every pass through
+a motor's control path, encoder.read(), control.run() and
+MotorDriver.set_duty_cycle(), written to run faster on the board. Each is a
+subclass which can be used in place of the original, so main.py picks one
+set or the other with FAST_PATH. They have not been timed on the board yet;
+run this file there to do so.
+
+On the board the methods are compiled by MicroPython's native code emitter,
+and the arithmetic is done by small viper functions which work on machine
+integers instead of Python objects. The proportional gain is kept as an
+integer scaled by 2**16, so running the controller never makes a float.
+Methods of the timer and channels which are called every pass are looked up
+once, when the object is made, and kept.
+
+On a computer, where there is no micropython module, the decorators do
+nothing and the same code runs as ordinary Python, so it can be tried in the
+simulation, where it is slightly slower than the originals. benchmark()
+times a number of passes with each set.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import utime
+import encoder_reader as enc
+import motor_driver as moe
+import closed_loop_controller as closed
+import sample_buffer
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+
+def _plain(function):
+    # Used in place of the code emitters where they are not available
+    return function
+
+
+native = getattr(micropython, 'native', _plain)
+viper = getattr(micropython, 'viper', _plain)
+const = getattr(micropython, 'const', _plain)
+
+## Fraction bits of the scaled proportional gain
+_SHIFT = const(16)
+## Half of one unit of output, added so the output is rounded
+_HALF = const(1 << 15)
+## Largest duty cycle, in percent
+_OUT_MAX = const(100)
+## Error limit used while the gain is zero, which keeps to a small integer
+_NO_LIMIT = const(1 << 29)
+
+
+@viper
+def _unwrap(change: int, half: int, span: int) -> int:
+    # Corrects a change in encoder count for the timer wrapping around.
+    # Viper functions write 0 - x rather than -x, since the viper compiler
+    # of older firmware cannot negate a machine integer
+    if change >= half:
+        return change - span
+    if change < 0 - half:
+        return change + span
+    return change
+
+
+@viper
+def _filter(velocity: int, change: int, dt: int, shift: int, half: int) -> int:
+    # Moves the filtered speed towards the one just measured, rounding the
+    # same way in both directions, as in encoder.read()
+    if change >= 0:
+        speed = change * 15625 // (dt >> 6)
+    else:
+        speed = 0 - ((0 - change) * 15625 // (dt >> 6))
+    step = speed - velocity
+    if step >= 0:
+        return velocity + ((step + half) >> shift)
+    return velocity - ((half - step) >> shift)
+
+
+@viper
+def _p_output(error: int, kp: int, limit: int) -> int:
+    # Proportional output in percent. The error is clipped to where the
+    # output saturates, so the product cannot overflow a machine integer
+    if error > limit:
+        error = limit
+    elif error < 0 - limit:
+        error = 0 - limit
+    out = (error * kp + _HALF) >> _SHIFT
+    if out > _OUT_MAX:
+        return _OUT_MAX
+    if out < 0 - _OUT_MAX:
+        return 0 - _OUT_MAX
+    return out
+
+
+@viper
+def _counts(level: int, full: int, last: int, slew: int) -> int:
+    # Compare value for a duty cycle, clipped to plus or minus 100 percent,
+    # rounded towards zero and kept within slew of the last one if slew is set
+    if level > _OUT_MAX:
+        level = _OUT_MAX
+    elif level < 0 - _OUT_MAX:
+        level = 0 - _OUT_MAX
+    if level >= 0:
+        counts = level * full // 100
+    else:
+        counts = 0 - ((0 - level) * full // 100)
+    if slew:
+        if counts > last + slew:
+            return last + slew
+        if counts < last - slew:
+            return last - slew
+    return counts
+
+
+class FastEncoder(enc.encoder):
+    """!
+    This class is an encoder_reader.encoder whose read() is compiled to
+    native code. It gives the same positions and speeds.
+    """
+
+    def __init__(self, timer, ch1, ch2, vel_shift=2):
+        """!
+        Initializes the encoder as encoder_reader.encoder does, and keeps the
+        methods called by read().
+        @param timer Timer associated with the chosen pins
+        @param ch1 Timer Channel associated with the chosen pin1
+        @param ch2 Timer Channel associated with the chosen pin2
+        @param vel_shift strength of the velocity filter
+        """
+        super().__init__(timer, ch1, ch2, vel_shift)
+        self._counter = timer.counter
+        self._ticks_us = utime.ticks_us
+        self._ticks_diff = utime.ticks_diff
+
+    @native
+    def read(self):
+        """!
+        Reads the encoder, as encoder_reader.encoder.read() does.
+        @returns the current position of the motor, in encoder counts
+        """
+        count = self._counter()
+        now = self._ticks_us()
+
+        change = _unwrap(count - self.last_count, self.half, self.range)
+        self.last_count = count
+        self.change = change
+        self.current_count += change
+
+        dt = self._ticks_diff(now, self.last_us)
+        self.last_us = now
+        if self.primed and dt >= 64:
+            self.dt_us = dt
+            self.velocity = _filter(self.velocity, change, dt, self.vel_shift,
+                                    self.vel_half)
+        self.primed = True
+
+        return self.current_count
+
+
+class FastControl(closed.control):
+    """!
+    This class is a closed_loop_controller.control whose run() only uses
+    integers and is compiled to native code. The duty cycle it returns is
+    rounded to a whole percent and kept between -100 and 100.
+    """
+
+    def __init__(self, depth=1000, policy=sample_buffer.STOP):
+        """!
+        Initializes the controller as closed_loop_controller.control does.
+        @param depth largest number of positions recorded for one step response
+        @param policy what to do once the recording is full
+        """
+        super().__init__(depth, policy)
+        self.kp = 0
+        self.limit = _NO_LIMIT
+
+    def set_Kp(self, user_p):
+        """!
+        Sets the proportional gain, and works out its scaled integer form
+        @param user_p gain in percent duty cycle per encoder count
+        """
+        super().set_Kp(user_p)
+        self.kp = int(round(self.gain * (1 << _SHIFT)))
+        # Smallest error which saturates the output
+        self.limit = (_OUT_MAX << _SHIFT) // abs(self.kp) + 1 if self.kp else _NO_LIMIT
+
+    def set_setpoint(self, user_p):
+        """!
+        Sets the position the controller moves the motor to
+        @param user_p setpoint in encoder counts
+        """
+        super().set_setpoint(int(user_p))
+
+    @native
+    def run(self, actual):
+        """!
+        Works out the duty cycle, as closed_loop_controller.control.run() does.
+        @param actual the current position of the motor read by the encoder
+        @returns the duty cycle to be fed into the motor driver, in percent
+        """
+        profile = self.profile
+        if profile is not None and self.profile_index < len(profile):
+            self.setpoint = profile[self.profile_index]
+            self.profile_index += 1
+        return _p_output(self.setpoint - actual, self.kp, self.limit)
+
+
+class FastMotorDriver(moe.MotorDriver):
+    """!
+    This class is a motor_driver.MotorDriver whose set_duty_cycle() is
+    compiled to native code. It writes the channels in the same way, only
+    when the output changes, but takes a whole number percent.
+    """
+
+    @native
+    def set_duty_cycle(self, level):
+        """!
+        Sets the duty cycle sent to the motor. Positive values cause torque
+        in one direction, negative values in the other.
+        @param level duty cycle in percent, a whole number
+        """
+        last = self.last
+        counts = _counts(int(level), self.full, last, self.slew)
+        if counts == last:
+            return
+        if counts >= 0:
+            if last < 0:
+                self._width2(0)
+                self.writes += 1
+            if counts or last > 0:
+                self._width1(counts)
+                self.writes += 1
+        else:
+            if last > 0:
+                self._width1(0)
+                self.writes += 1
+            self._width2(-counts)
+            self.writes += 1
+        self.last = counts
+
+
+def select(fast):
+    """!
+    Picks the classes used for each motor.
+    @param fast True for the classes in this file, False for the originals
+    @returns a (motor driver, encoder, controller) tuple of classes
+    """
+    if fast:
+        return FastMotorDriver, FastEncoder, FastControl
+    return moe.MotorDriver, enc.encoder, closed.control
+
+
+def _clock():
+    # Time in microseconds from the best clock there is; the simulated utime
+    # is a virtual clock, so a computer uses its own
+    try:
+        import time
+        return time.perf_counter_ns() // 1000
+    except (ImportError, AttributeError):
+        return utime.ticks_us()
+
+
+def benchmark(fast, passes=5000, timer_num=3, encoder_num=8):
+    """!
+    Times the read encoder, run controller, set duty cycle path of one motor.
+    The setpoint steps back and forth a little ahead of the motor, so the
+    duty cycle changes on nearly every pass and the PWM channels are written,
+    as they are while a step response runs.
+    @param fast True to time the classes in this file, False for the originals
+    @param passes number of passes to time
+    @param timer_num number of the motor's PWM timer
+    @param encoder_num number of the encoder timer
+    @returns an (average time of one pass in microseconds, number of PWM
+             channel writes) pair
+    """
+    import pyb
+    motor_class, encoder_class, control_class = select(fast)
+    m_timer = pyb.Timer(timer_num, freq=5000)
+    motor = motor_class(None, None, None, m_timer,
+                        m_timer.channel(1, pyb.Timer.PWM),
+                        m_timer.channel(2, pyb.Timer.PWM))
+    encoder = encoder_class(pyb.Timer(encoder_num, prescaler=0, period=65535), None, None)
+    controller = control_class(depth=1)
+    controller.set_Kp(0.03)
+    base = encoder.read()
+    controller.set_setpoint(base)
+
+    read = encoder.read
+    run = controller.run
+    drive = motor.set_duty_cycle
+    start = _clock()
+    for i in range(passes):
+        # Errors of 0 to 1984 counts, or 0 to 60% duty cycle
+        controller.setpoint = base + ((i & 31) << 6)
+        drive(run(read()))
+    elapsed = _clock() - start
+    writes = motor.writes
+    motor.set_duty_cycle(0)
+    return elapsed / passes, writes
+
+
+# This code times both sets of methods on the board. On a computer,
+# lockstep.compare_hot_paths() times them in the simulation
+if __name__ == "__main__":
+    plain, plain_writes = benchmark(False)
+    fast, fast_writes = benchmark(True)
+    print('Original: {:.2f} us per pass, {} writes'.format(plain, plain_writes))
+    print('Fast:     {:.2f} us per pass, {} writes ({:.0f}% less time)'.format(
+        fast, fast_writes, 100 * (1 - fast / plain)))
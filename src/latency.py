@@ -0,0 +1,180 @@
+"""!
+@file latency.py
+This file contains code that measures the timing of the control path of
+each motor while it runs: the time from sampling the encoder to setting the
+duty cycle (latency), the actual time between samples (period), and how far
+that is from the intended period (jitter). Each is kept in a fixed-size
+histogram, so recording a run never allocates memory.
+
+The histograms can be printed over the serial port at any time, one line
+each, as
+@code
+H,<axis>,<kind>,<bin width in us>,<largest value>,<count in bin 0>,<count in bin 1>,...
+@endcode
+where kind is L (latency), P (period) or J (jitter). The last bin also
+counts every value too big for the others. step_control.py reads these lines.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import sys
+import utime
+from array import array
+
+## Histogram kinds, as printed
+LATENCY = 'L'
+PERIOD = 'P'
+JITTER = 'J'
+
+
+class Histogram:
+    """!
+    This class implements a histogram with equal width bins held in an
+    array, plus the largest value seen.
+    """
+
+    def __init__(self, bins, width_us):
+        """!
+        Initializes the histogram with every bin empty.
+        @param bins number of bins
+        @param width_us width of each bin, in microseconds
+        """
+        self.bins = bins
+        self.width_us = width_us
+        self.counts = array('l', [0] * bins)
+        self.largest = 0
+
+    def add(self, value):
+        """!
+        Counts one value.
+        @param value value to count, in microseconds
+        """
+        index = value // self.width_us
+        if index >= self.bins:
+            index = self.bins - 1
+        elif index < 0:
+            index = 0
+        self.counts[index] += 1
+        if value > self.largest:
+            self.largest = value
+
+    def clear(self):
+        """!
+        Empties every bin.
+        """
+        for i in range(self.bins):
+            self.counts[i] = 0
+        self.largest = 0
+
+    def total(self):
+        """!
+        @returns the number of values counted
+        """
+        return sum(self.counts)
+
+    def write(self, axis, kind, out=None):
+        """!
+        Prints the histogram as one line, without building the whole line
+        in memory first.
+        @param axis axis (motor) number
+        @param kind LATENCY, PERIOD or JITTER
+        @param out stream to print to, standard output if None
+        """
+        if out is None:
+            out = sys.stdout
+        out.write(f"H,{axis},{kind},{self.width_us},{self.largest}")
+        for count in self.counts:
+            out.write(f",{count}")
+        out.write("\n")
+
+
+class AxisTiming:
+    """!
+    This class holds the latency, period and jitter histograms of one motor.
+    """
+
+    def __init__(self, axis, period_ms, bins=32, latency_width_us=50,
+                 period_width_us=None, jitter_width_us=None):
+        """!
+        Initializes the histograms.
+        @param axis axis (motor) number
+        @param period_ms intended time between samples, in milliseconds
+        @param bins number of bins in each histogram
+        @param latency_width_us bin width of the latency histogram
+        @param period_width_us bin width of the period histogram; by default
+               the histogram covers twice the intended period
+        @param jitter_width_us bin width of the jitter histogram; by default
+               the histogram covers a quarter of the intended period
+        """
+        self.axis = axis
+        self.period_us = period_ms * 1000
+        if period_width_us is None:
+            period_width_us = max(1, 2 * self.period_us // bins)
+        if jitter_width_us is None:
+            jitter_width_us = max(1, self.period_us // (4 * bins))
+        self.latency = Histogram(bins, latency_width_us)
+        self.period = Histogram(bins, period_width_us)
+        self.jitter = Histogram(bins, jitter_width_us)
+
+    def record(self, encoder):
+        """!
+        Records the timing of one pass through the control path. Call this
+        just after setting the duty cycle.
+        @param encoder encoder object which was read at the start of the
+               pass; its reading time and time since the last reading are used
+        """
+        self.latency.add(utime.ticks_diff(utime.ticks_us(), encoder.last_us))
+        period = encoder.dt_us
+        if period:
+            self.period.add(period)
+            jitter = period - self.period_us
+            self.jitter.add(jitter if jitter >= 0 else -jitter)
+
+    def clear(self):
+        """!
+        Empties every histogram.
+        """
+        self.latency.clear()
+        self.period.clear()
+        self.jitter.clear()
+
+    def write(self, out=None):
+        """!
+        Prints all three histograms, one line each.
+        @param out stream to print to, standard output if None
+        """
+        self.latency.write(self.axis, LATENCY, out)
+        self.period.write(self.axis, PERIOD, out)
+        self.jitter.write(self.axis, JITTER, out)
+
+
+class StatsQuery:
+    """!
+    This class implements a low priority task which prints the histograms
+    whenever a '?' arrives over the serial port.
+    """
+
+    def __init__(self, timings, port=None):
+        """!
+        Initializes the task.
+        @param timings list of AxisTiming objects to print
+        @param port object with any() and read() methods, such as
+               pyb.USB_VCP(); if None one is made when the task first runs
+        """
+        self.timings = timings
+        self.port = port
+
+    def run(self):
+        """!
+        Generator which checks for a query each time it runs, meant to be
+        run as a cotask task.
+        """
+        if self.port is None:
+            import pyb
+            self.port = pyb.USB_VCP()
+        while True:
+            if self.port.any() and self.port.read(1) == b'?':
+                for timing in self.timings:
+                    timing.write()
+            yield 0
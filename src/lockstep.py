@@ -0,0 +1,299 @@
+"""!
+@file lockstep.py
+This file contains a scheduler which runs task generators, such as the ones
+in main.py, against the virtual clock of sim_pyb.py. It picks tasks the same
+way as the priority scheduler in cotask, but instead of waiting for a task to
+become ready it moves the clock straight to that time. A ten minute run of
+both motors therefore takes a fraction of a second and gives the same result
+every time, which makes it practical to compare many periods and priorities.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import sys
+import sim_pyb
+
+
+class _TaskOutput:
+    """!
+    This class collects whatever a task prints while it runs, one list of
+    lines per task, so that printing does not slow the simulation down.
+    """
+
+    def __init__(self):
+        """!
+        Initializes the collector with no current task.
+        """
+        self.task = None
+        self.stray = []
+
+    def write(self, text):
+        """!
+        Stores printed text with the task which is running.
+        @param text text which was printed
+        @returns the number of characters written
+        """
+        lines = self.task.output if self.task is not None else self.stray
+        lines.append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class SimTask:
+    """!
+    This class holds one task run by the lockstep scheduler.
+    """
+
+    def __init__(self, run_fun, name="NoName", priority=0, period=None,
+                 cost_us=0):
+        """!
+        Initializes the task.
+        @param run_fun generator function (or generator) run by the task, or
+               a plain function which is called once per run
+        @param name name of the task
+        @param priority priority of the task; higher numbers run first
+        @param period time between runs of the task, in milliseconds
+        @param cost_us simulated processor time used by each run, in
+               microseconds; other tasks have to wait for it
+        """
+        self.name = name
+        self.priority = priority
+        self.period_us = int(period * 1000)
+        self.cost_us = int(cost_us)
+        self.next_run = 0
+
+        if hasattr(run_fun, '__next__'):
+            self._step = run_fun.__next__
+        else:
+            result = run_fun()
+            if hasattr(result, '__next__'):
+                self._step = result.__next__
+            else:
+                self._step = run_fun
+
+        # Results collected while running
+        self.runs = 0
+        self.late_us = 0
+        self.worst_late_us = 0
+        self.output = []
+
+    @property
+    def period(self):
+        """!
+        Time between runs of the task, in microseconds, as kept by cotask.Task.
+        Setting it changes the period from the next run on.
+        """
+        return self.period_us
+
+    @period.setter
+    def period(self, value):
+        self.period_us = int(value)
+
+    def lines(self):
+        """!
+        Gets the lines printed by the task.
+        @returns a list of the lines printed by the task, without newlines
+        """
+        return ''.join(self.output).splitlines()
+
+
+class Lockstep:
+    """!
+    This class implements a priority scheduler which runs on the virtual
+    clock of the simulation.
+    """
+
+    def __init__(self, world=None):
+        """!
+        Initializes the scheduler and installs the simulated board modules.
+        @param world sim_pyb.World to run against; one with a VirtualClock
+               and the default motors is made if None
+        """
+        if world is None:
+            world = sim_pyb.World(clock=sim_pyb.VirtualClock())
+        self.world = sim_pyb.install(world)
+        self.clock = self.world.clock
+        self.tasks = []
+
+    def append(self, task):
+        """!
+        Adds a task to the scheduler.
+        @param task SimTask to add
+        @returns the task, for convenience
+        """
+        task.next_run = self.clock.now_us()
+        self.tasks.append(task)
+        return task
+
+    def add(self, run_fun, name="NoName", priority=0, period=None, cost_us=0):
+        """!
+        Makes a task and adds it to the scheduler. The arguments are the same
+        as for SimTask.
+        @returns the new SimTask
+        """
+        return self.append(SimTask(run_fun, name, priority, period, cost_us))
+
+    def run(self, duration_ms):
+        """!
+        Runs the tasks until the given amount of simulated time has passed.
+        Whenever more than one task is ready, the one with the highest
+        priority runs first, as with cotask.task_list.pri_sched().
+        @param duration_ms amount of simulated time to run for, in milliseconds
+        """
+        clock = self.clock
+        world = self.world
+        end = clock.now_us() + int(duration_ms * 1000)
+        tasks = self.tasks
+
+        out = _TaskOutput()
+        old_stdout = sys.stdout
+        sys.stdout = out
+        try:
+            while True:
+                now = clock.now_us()
+
+                # Highest priority task which is ready to run
+                ready = None
+                for task in tasks:
+                    if task.next_run <= now and (
+                            ready is None or task.priority > ready.priority):
+                        ready = task
+
+                if ready is None:
+                    # Nothing to do until the next task is due; timer
+                    # callbacks on the way are run by the world
+                    soonest = min((task.next_run for task in tasks), default=end)
+                    if soonest >= end:
+                        world.advance_to(end)
+                        break
+                    world.advance_to(soonest)
+                    continue
+
+                late = now - ready.next_run
+                ready.late_us += late
+                if late > ready.worst_late_us:
+                    ready.worst_late_us = late
+
+                out.task = ready
+                ready._step()
+                out.task = None
+                ready.runs += 1
+                ready.next_run += ready.period_us
+                world.advance_to(now + ready.cost_us)
+        finally:
+            sys.stdout = old_stdout
+
+    def __str__(self):
+        """!
+        Makes a table of the tasks, like the one printed by cotask.
+        @returns the table as a string
+        """
+        rows = ['Task        Pri  Period    Runs  Avg late  Max late']
+        for task in self.tasks:
+            avg = task.late_us / task.runs if task.runs else 0
+            rows.append(f'{task.name:<11} {task.priority:>3} {task.period_us / 1000:>7.1f} '
+                        f'{task.runs:>7} {avg / 1000:>9.3f} {task.worst_late_us / 1000:>9.3f}')
+        return '\n'.join(rows)
+
+
+def run_main(duration_ms, period1=100, period2=50, priority1=2, priority2=1,
+             cost_us=0, world=None):
+    """!
+    Runs the two motor tasks from main.py in lockstep with the virtual clock.
+    @param duration_ms amount of simulated time to run for, in milliseconds
+    @param period1 period of the first motor's task, in milliseconds
+    @param period2 period of the second motor's task, in milliseconds
+    @param priority1 priority of the first motor's task
+    @param priority2 priority of the second motor's task
+    @param cost_us simulated processor time used by each task run
+    @param world sim_pyb.World to run against, a new virtual one if None
+    @returns the Lockstep scheduler after the run
+    """
+    sched = Lockstep(world)
+    import main
+    sched.add(main.task1_fun, "Task_1", priority1, period1, cost_us)
+    sched.add(main.task2_fun, "Task_2", priority2, period2, cost_us)
+    sched.run(duration_ms)
+    return sched
+
+
+def compare_loop_modes(duration_ms=5000, period_ms=10, busy_ms=35, busy_cost_us=4000):
+    """!
+    Runs one motor's control loop from a timer interrupt and the other's as
+    a task, with timer_control.AxisLoop, while a busy higher priority task
+    takes up processor time. Both loops use closed_loop_controller.fixed_pid.
+    @param duration_ms amount of simulated time to run for, in milliseconds
+    @param period_ms period of both control loops, in milliseconds
+    @param busy_ms period of the busy task, in milliseconds
+    @param busy_cost_us processor time used by each run of the busy task
+    @returns a (timer, task) pair of timer_control.JitterStats
+    """
+    sched = Lockstep()
+    import pyb
+    import encoder_reader as enc
+    import motor_driver as moe
+    import closed_loop_controller as closed
+    import timer_control
+
+    def make_axis(pwm_num, en_name, enc_num):
+        en_pin = pyb.Pin(en_name, mode=pyb.Pin.OPEN_DRAIN, pull=pyb.Pin.PULL_UP, value=1)
+        m_timer = pyb.Timer(pwm_num, freq=5000)
+        chm1 = m_timer.channel(1, pyb.Timer.PWM)
+        chm2 = m_timer.channel(2, pyb.Timer.PWM)
+        motor = moe.MotorDriver(en_pin, None, None, m_timer, chm1, chm2)
+        encoder = enc.encoder(pyb.Timer(enc_num, prescaler=0, period=65535), None, None)
+        controller = closed.fixed_pid(period_ms)
+        controller.set_Kp(0.05)
+        controller.set_Ki(0.05)
+        controller.set_setpoint(10000)
+        return timer_control.AxisLoop(motor, encoder, controller, period_ms)
+
+    timed = make_axis(3, 'PA10', 8)
+    tasked = make_axis(5, 'PC1', 4)
+    timed.start_timer(6)
+    sched.add(tasked.task(), "Axis_task", priority=1, period=period_ms)
+    sched.add(lambda: None, "Busy", priority=2, period=busy_ms, cost_us=busy_cost_us)
+    sched.run(duration_ms)
+    return timed.stats, tasked.stats
+
+
+def compare_hot_paths(passes=20000):
+    """!
+    Times the control path of one motor with the original encoder,
+    controller and motor driver classes and with those in hot_path.py, in
+    the simulation. Without MicroPython's code emitters this only shows what
+    is saved by keeping methods and using integers.
+    @param passes number of passes through the control path to time
+    @returns an (original, fast) pair of average times per pass, in microseconds
+    """
+    Lockstep()
+    import hot_path
+    return hot_path.benchmark(False, passes)[0], hot_path.benchmark(True, passes)[0]
+
+
+# This code runs both motors for ten minutes of simulated time and prints
+# how long it took, a table of the tasks, and the final motor positions. It
+# then compares the jitter of a timer interrupt loop and a task loop
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    sched = run_main(10 * 60 * 1000)
+    elapsed = time.perf_counter() - start
+
+    print(f'Simulated 600 s in {elapsed * 1000:.1f} ms')
+    print(sched)
+    for rig in sched.world.rigs:
+        print(f'Timer {rig.pwm_timer} motor at {rig.plant.position:.1f} counts')
+    for task in sched.tasks:
+        print(f'{task.name} printed {len(task.lines())} lines')
+
+    timed, tasked = compare_loop_modes()
+    print(f'Timer interrupt loop: {timed}')
+    print(f'Cooperative task loop: {tasked}')
+
+    plain, fast = compare_hot_paths()
+    print(f'Control path: {plain:.2f} us per pass, {fast:.2f} us with hot_path.py')
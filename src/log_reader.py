@@ -0,0 +1,110 @@
+"""!
+@file log_reader.py
+This file contains code that reads the log files written on the board by
+data_logger.FlashLogger, once they have been copied to the PC. Each file is
+read in one go and decoded with bulk_parse.FrameChunker, the same decoder
+used for binary frames from the serial port, and the samples are put back
+together into one run per axis and END frame. Files are read in order of
+their names, so a run split across two files comes out whole.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import glob
+import os
+
+import numpy as np
+import bulk_parse
+
+
+def log_files(path):
+    """!
+    Finds the log files to read.
+    @param path a directory holding log files, a single file, or the start
+           of the names of the files as given to data_logger.FlashLogger,
+           such as @c logs/log
+    @returns a list of file names, in order
+    """
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '*.bin')))
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(glob.escape(path) + '[0-9][0-9][0-9].bin'))
+
+
+def read_runs(paths, keep_unfinished=True):
+    """!
+    Reads log files and splits them into runs.
+    @param paths list of log file names, in the order they were written
+    @param keep_unfinished if True, samples after the last END frame of an
+           axis (such as when power was lost) are returned as a run as well
+    @returns a list of (axis, times, positions) tuples, one per run, in the
+             order the runs ended; times in ms and positions as int32 arrays
+    """
+    decoder = bulk_parse.FrameChunker()
+    pending = {}
+    runs = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            data = file.read()
+        for item in decoder.feed(data):
+            axis = item[0]
+            if item[1] is bulk_parse.END_OF_RUN:
+                parts = pending.pop(axis, [])
+                if parts:
+                    runs.append(_join(axis, parts))
+            else:
+                pending.setdefault(axis, []).append(item[1:])
+
+    if keep_unfinished:
+        for axis, parts in sorted(pending.items()):
+            runs.append(_join(axis, parts))
+    return runs
+
+
+def _join(axis, parts):
+    # Puts the pieces of one run back together
+    times = np.concatenate([part[0] for part in parts])
+    positions = np.concatenate([part[1] for part in parts])
+    return axis, times, positions
+
+
+# This code reads the log files named on the command line, prints a line for
+# each run and, if asked, saves the runs to the run archive
+if __name__ == "__main__":
+    import argparse
+    import time
+    import step_metrics
+
+    parser = argparse.ArgumentParser(description="Read log files copied from the board")
+    parser.add_argument('path', help="directory of log files, one file, or the start "
+                                     "of their names such as logs/log")
+    parser.add_argument('--archive', action='store_true',
+                        help="save every run to the run archive")
+    parser.add_argument('--gain', type=float, default=None, help="gain of the runs")
+    parser.add_argument('--setpoint', type=int, default=None, help="setpoint of the runs")
+    parser.add_argument('--period', type=float, default=None,
+                        help="control task period of the runs, in ms")
+    args = parser.parse_args()
+
+    paths = log_files(args.path)
+    start = time.perf_counter()
+    runs = read_runs(paths)
+    elapsed = time.perf_counter() - start
+    samples = sum(len(times) for _, times, _ in runs)
+    print(f'Read {len(runs)} runs ({samples} samples) from {len(paths)} files '
+          f'in {elapsed * 1000:.1f} ms')
+
+    for number, (axis, times, positions) in enumerate(runs):
+        metrics = step_metrics.compute(times, [positions], args.setpoint)
+        print(f'  run {number}: axis {axis}, {len(times)} samples, '
+              f'{times[0]:.0f}-{times[-1]:.0f} ms, {step_metrics.summary(metrics, 0)}')
+
+    if args.archive:
+        import run_archive
+        with run_archive.RunArchive() as archive:
+            for axis, times, positions in runs:
+                archive.save(times, positions, gain=args.gain, setpoint=args.setpoint,
+                             period_ms=args.period, axis=axis, label='log')
+        print(f'Saved {len(runs)} runs to the archive')
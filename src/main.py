@@ -14,120 +14,265 @@ import encoder_reader as enc
 import motor_driver as moe
 import closed_loop_controller as closed
 
-def task1_fun():
+# The modules used by the settings below are only imported when turned on,
+# so they take no memory on the board otherwise
+
+## Set to True to send each recorded step response to the PC as binary
+## frames instead of .CSV lines; see telemetry.py. Run step_control.py with
+## --binary to read them
+TELEMETRY = False
+
+## Frame writer shared by both motors when sending binary frames, made in the
+## main code below
+writer = None
+
+## Set to True to stream samples to the PC while the motors move, instead of
+## recording each step response and printing it afterwards
+STREAMING = False
+
+## Streamer shared by both motors when streaming, made in the main code below
+streamer = None
+
+## Set to True to record samples to files on the board's flash while the
+## motors move, so runs are kept with no PC attached; see data_logger.py.
+## Streaming to the PC is used instead if STREAMING is also True
+LOGGING = False
+
+## Folder and start of the name of each log file, such as /sd/log for an SD card
+LOG_PATH = '/flash/log'
+
+## Logger shared by both motors when logging, made in the main code below
+logger = None
+
+## Set to True to measure the timing of each motor's control path. Sending
+## a '?' over the serial port prints the histograms
+TIMING = False
+
+## Timing histograms of both motors when measuring, made in the main code below
+timings = None
+
+## Set to True to take commands (gains, setpoints, periods, runs) over the
+## serial port while running; see commands.py. The GUI in step_control.py
+## sends the gain and starts each run this way, so turn this on to use it;
+## otherwise the board ignores the gain typed into the GUI
+COMMANDS = False
+
+## Command task when taking commands, made in the main code below
+commands = None
+
+## Set to True to use the native code versions of the encoder, controller and
+## motor driver from hot_path.py. They have not been timed on the board yet,
+## so it is not known whether they are faster there (on the PC they are no
+## faster); run hot_path.py on the board to time them before turning this on
+FAST_PATH = False
+
+## Set to True to run the first motor's control loop from a hardware timer
+## interrupt at a fixed rate, with closed_loop_controller.fixed_pid, instead
+## of from its task; see timer_control.py. The motor holds its setpoint
+## rather than running step responses, and its task prints the loop's timing
+## statistics once a second
+TIMER_LOOP = False
+
+## Timer which runs the loop, and the time between runs of the loop, in ms
+LOOP_TIMER = 6
+LOOP_PERIOD_MS = 10
+
+## Loop run by the timer when TIMER_LOOP is set, made by its task
+timer_loop = None
+
+## Set to True to run both motors from one multi-axis task instead of one
+## task per motor. Step responses are not printed in this mode, so turn on
+## STREAMING or LOGGING to see them; a 'P' command sets the period of both
+MULTI_AXIS = False
+
+## Shape of planned move for each motor to follow, motion_profile.TRAPEZOID
+## (0) or motion_profile.S_CURVE (1), or None to step straight to the setpoint
+PROFILE = None
+
+## Top speed and acceleration of planned moves, in encoder counts per second
+## and per second squared
+PROFILE_SPEED = 8000
+PROFILE_ACCEL = 20000
+
+## Hardware and step response of each motor, by axis number: board names of
+## the enable, IN1A and IN2A pins, PWM timer, encoder timer, setpoint in
+## encoder counts and task period in ms
+AXES = ((pyb.Pin.board.PA10, pyb.Pin.board.PB4, pyb.Pin.board.PB5, 3, 8, 10000, 100),
+        (pyb.Pin.board.PC1, pyb.Pin.board.PA0, pyb.Pin.board.PA1, 5, 4, 6900, 50))
+
+def make_motor(en_name, a_name, another_name, timer_num, motor_class=None):
     """!
-    Task which runs the first motor using a scheduler. This function is run 
-    every period interval.
+    Sets up the pins and PWM timer of one motor and makes its driver.
+    @param en_name board name of the enable pin
+    @param a_name board name of the IN1A pin
+    @param another_name board name of the IN2A pin
+    @param timer_num number of the timer driving IN1A and IN2A
+    @param motor_class class of the driver, motor_driver.MotorDriver if None
+    @returns the MotorDriver object
     """
-
-    # Stuff copied over from last lab below
-    # Code needed to initalize motor
-    en_pin = pyb.Pin(pyb.Pin.board.PA10, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value = 1)
-    a_pin = pyb.Pin(pyb.Pin.board.PB4, pyb.Pin.OUT_PP)
-    another_pin = pyb.Pin(pyb.Pin.board.PB5, pyb.Pin.OUT_PP)
-    m_timer = pyb.Timer(3, freq=5000)
+    if motor_class is None:
+        motor_class = moe.MotorDriver
+    en_pin = pyb.Pin(en_name, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value = 1)
+    a_pin = pyb.Pin(a_name, pyb.Pin.OUT_PP)
+    another_pin = pyb.Pin(another_name, pyb.Pin.OUT_PP)
+    m_timer = pyb.Timer(timer_num, freq=5000)
     chm1 = m_timer.channel(1, pyb.Timer.PWM, pin=a_pin)
     chm2 = m_timer.channel(2, pyb.Timer.PWM, pin=another_pin)
-    
-    # Motor Initialization done through imported MotorDriver class
-    motor = moe.MotorDriver(en_pin,a_pin,another_pin,m_timer,chm1,chm2)
-    
-    # Code needed to initialize encoder. Set 'tim' to the correct timer
-    # for the pins being used.
-    tim = 8
+    return motor_class(en_pin,a_pin,another_pin,m_timer,chm1,chm2)
+
+def make_encoder(tim, encoder_class=None):
+    """!
+    Sets up an encoder timer and makes its encoder object. Timer 4 uses
+    pins B6/B7 and timer 8 uses pins C6/C7.
+    @param tim number of the encoder timer, 4 or 8
+    @param encoder_class class of the encoder, encoder_reader.encoder if None
+    @returns the encoder object
+    """
+    if encoder_class is None:
+        encoder_class = enc.encoder
+    pins = {4: (pyb.Pin.board.PB6, pyb.Pin.board.PB7),
+            8: (pyb.Pin.board.PC6, pyb.Pin.board.PC7)}
     timer = pyb.Timer(tim, prescaler = 0, period = 65535)
+    ch1 = timer.channel(1,pyb.Timer.ENC_A,pin = pins[tim][0])
+    ch2 = timer.channel(2, pyb.Timer.ENC_B,pin = pins[tim][1])
+    return encoder_class(timer,ch1,ch2)
+
+def motor_classes():
+    """!
+    Picks the classes used for each motor's driver, encoder and controller.
+    @returns a (motor driver, encoder, controller) tuple of classes, those in
+             hot_path.py if FAST_PATH is set and the originals otherwise
+    """
+    if FAST_PATH:
+        import hot_path
+        return hot_path.select(True)
+    return moe.MotorDriver, enc.encoder, closed.control
+
+def axis_task(axis):
+    """!
+    Generator which runs the step response of one motor, set up from its
+    entry in AXES and the settings above. Each time it is run counts as one
+    run of the motor's task.
+    @param axis axis (motor) number, which picks the entry of AXES
+    """
+    en_name, a_name, another_name, timer_num, tim, setpoint, period_ms = AXES[axis]
     
-    # Depending on the timer used, the code will autometically
-    # initalize the correct channel and pins. For example, if the timer
-    # used is '4', then the B6/B7 pins will be initialized. In this test code,
-    # C6/C7 is used.
-    if tim == 4:
-        ch1 = timer.channel(1,pyb.Timer.ENC_A,pin = pyb.Pin.board.PB6)
-        ch2 = timer.channel(2, pyb.Timer.ENC_B,pin = pyb.Pin.board.PB7)
-    
-    elif tim == 8:
-        ch1 = timer.channel(1,pyb.Timer.ENC_A,pin = pyb.Pin.board.PC6)
-        ch2 = timer.channel(2, pyb.Timer.ENC_B,pin = pyb.Pin.board.PC7)
-    else:
-        print("invalid timer")
-    
-    # Initializes Encoder
-    encoder = enc.encoder(timer,ch1,ch2)          
-    
-    # Initializes Motor Controller
-    controller = closed.control()
+    # Motor, encoder and controller, plain or fast
+    Motor, Encoder, Controller = motor_classes()
+    motor = make_motor(en_name, a_name, another_name, timer_num, Motor)
+    encoder = make_encoder(tim, Encoder)
+    controller = Controller()
     
     # Sets gain and setpoint values and resets the encoder before running
     # the step response
     gain = 0.03
-    controller.set_setpoint(10000)
+    controller.set_setpoint(setpoint)
     controller.set_Kp(gain)
     encoder.zero()
     
+    # Follows a planned move to the setpoint, if turned on
+    if PROFILE is not None:
+        import motion_profile
+        controller.set_profile(motion_profile.make_profile(
+            0, setpoint, PROFILE_SPEED, PROFILE_ACCEL, period_ms, PROFILE))
+    
+    # Streams or logs samples instead of recording them, if turned on
+    if streamer is not None:
+        controller.set_stream(streamer, axis)
+    elif logger is not None:
+        controller.set_stream(logger, axis)
+    
+    # Sends the recorded step response as binary frames, if turned on
+    if writer is not None:
+        controller.set_telemetry(writer, axis)
+    
+    # Measures the control path timing, if turned on
+    if timings is not None:
+        controller.set_timing(timings[axis])
+    
+    # Lets the gain and setpoint be changed over the serial port
+    if commands is not None:
+        commands.set_controller(axis, controller, encoder)
+    
     # Running step response
     while True:
         controller.cl_loop_response(motor, encoder, controller, gain)
         
         yield 0
 
+def task1_fun():
+    """!
+    Task which runs the first motor using a scheduler. This function is run 
+    every period interval.
+    """
+    yield from axis_task(0)
 
 def task2_fun():
     """!
     Task which runs the second motor using a scheduler. This function is run 
     every period interval.
     """
-    # Get references to the share and queue which have been passed to this task
-    
-    # Stuff copied over from last lab below
-    # Code needed to initalize motor
-    en_pin = pyb.Pin(pyb.Pin.board.PC1, mode = pyb.Pin.OPEN_DRAIN, pull = pyb.Pin.PULL_UP, value = 1)
-    a_pin = pyb.Pin(pyb.Pin.board.PA0, pyb.Pin.OUT_PP)
-    another_pin = pyb.Pin(pyb.Pin.board.PA1, pyb.Pin.OUT_PP)
-    m_timer = pyb.Timer(5, freq=5000)
-    chm1 = m_timer.channel(1, pyb.Timer.PWM, pin=a_pin)
-    chm2 = m_timer.channel(2, pyb.Timer.PWM, pin=another_pin)
-    
-    # Motor Initialization done through imported MotorDriver class
-    motor_2 = moe.MotorDriver(en_pin,a_pin,another_pin,m_timer,chm1,chm2)
+    yield from axis_task(1)
+
+
+def timer_loop_fun():
+    """!
+    Task which starts the first motor's control loop running from a timer
+    interrupt, then prints the timing statistics of the loop each time it
+    runs, starting them over each time.
+    """
+    global timer_loop
+    import timer_control
     
-    # Code needed to initialize encoder. Set 'tim' to the correct timer
-    # for the pins being used.
-    tim = 4
-    timer = pyb.Timer(tim, prescaler = 0, period = 65535)
+    en_name, a_name, another_name, timer_num, tim, setpoint, _ = AXES[0]
+    motor = make_motor(en_name, a_name, another_name, timer_num)
+    encoder = make_encoder(tim)
+    encoder.zero()
     
-    # Depending on the timer used, the code will autometically
-    # initalize the correct channel and pins. For example, if the timer
-    # used is '4', then the B6/B7 pins will be initialized. In this test code,
-    # C6/C7 is used.
-    if tim == 4:
-        ch1 = timer.channel(1,pyb.Timer.ENC_A,pin = pyb.Pin.board.PB6)
-        ch2 = timer.channel(2, pyb.Timer.ENC_B,pin = pyb.Pin.board.PB7)
-    
-    elif tim == 8:
-        ch1 = timer.channel(1,pyb.Timer.ENC_A,pin = pyb.Pin.board.PC6)
-        ch2 = timer.channel(2, pyb.Timer.ENC_B,pin = pyb.Pin.board.PC7)
-    else:
-        print("invalid timer")
+    # Only integer arithmetic can run in the interrupt
+    controller = closed.fixed_pid(LOOP_PERIOD_MS)
+    controller.set_Kp(0.03)
+    controller.set_setpoint(setpoint)
     
-    # Initializes Encoder
-    encoder_2 = enc.encoder(timer,ch1,ch2)          
+    timer_loop = timer_control.AxisLoop(motor, encoder, controller, LOOP_PERIOD_MS)
+    timer_loop.start_timer(LOOP_TIMER)
     
-    # Initializes Motor Controller
-    controller_2 = closed.control()
+    while True:
+        yield 0
+        print('Timer loop:', timer_loop.stats.report())
+
+
+def multi_task_fun():
+    """!
+    Task which runs both motors from one multi-axis controller, so both
+    are sampled together and only one task needs to be scheduled.
+    """
+    import multi_axis
+    controller = multi_axis.MultiAxis(len(AXES))
     
-    # Sets gain and setpoint values and resets the encoder before running
-    # the step response
     gain = 0.03
-    controller_2.set_setpoint(6900)
-    controller_2.set_Kp(gain)
-    encoder_2.zero()
-    
-    # Running step response
-    while True:
-        controller_2.cl_loop_response(motor_2, encoder_2, controller_2, gain)
+    for axis in range(len(AXES)):
+        en_name, a_name, another_name, timer_num, tim, setpoint, _ = AXES[axis]
+        motor = make_motor(en_name, a_name, another_name, timer_num)
+        encoder = make_encoder(tim)
+        encoder.zero()
+        controller.add_axis(motor, encoder, gain, setpoint)
         
-        yield 0
+        # Measures the control path timing, if turned on
+        if timings is not None:
+            controller.set_timing(axis, timings[axis])
+        
+        # Lets the gain and setpoint be changed over the serial port
+        if commands is not None:
+            commands.set_controller(axis, controller.axis(axis))
+    
+    # Streams or logs samples, if turned on
+    if streamer is not None:
+        controller.set_stream(streamer)
+    elif logger is not None:
+        controller.set_stream(logger)
     
+    yield from controller.task()
 
 
 # This code creates two tasks, then starts the tasks. The
@@ -135,13 +280,74 @@ def task2_fun():
 if __name__ == "__main__":
 
     # Create the tasks for the scheduler
-    task1 = cotask.Task(task1_fun, name="Task_1", priority=2, period=100,
-                        profile=True, trace=False)
-    task2 = cotask.Task(task2_fun, name="Task_2", priority=1, period=50,
-                         profile=True, trace=False)
+    if MULTI_AXIS:
+        task1 = cotask.Task(multi_task_fun, name="Multi_Axis", priority=2, period=50,
+                            profile=True, trace=False)
+        cotask.task_list.append(task1)
+    else:
+        if TIMER_LOOP:
+            task1 = cotask.Task(timer_loop_fun, name="Timer_Loop", priority=2, period=1000,
+                                profile=True, trace=False)
+        else:
+            task1 = cotask.Task(task1_fun, name="Task_1", priority=2, period=AXES[0][6],
+                                profile=True, trace=False)
+        task2 = cotask.Task(task2_fun, name="Task_2", priority=1, period=AXES[1][6],
+                             profile=True, trace=False)
+        
+        cotask.task_list.append(task1)
+        cotask.task_list.append(task2)
     
-    cotask.task_list.append(task1)
-    cotask.task_list.append(task2)
+    # The streaming task has the lowest priority, so sending data never
+    # delays the motor tasks
+    if STREAMING:
+        import telemetry
+        streamer = telemetry.Streamer(axes=2)
+        task3 = cotask.Task(streamer.run, name="Telemetry", priority=0, period=20,
+                            profile=True, trace=False)
+        cotask.task_list.append(task3)
+
+    # Likewise the logging task, which writes one frame to the file each
+    # time it runs while the motor tasks fill the other buffer
+    elif LOGGING:
+        import data_logger
+        logger = data_logger.FlashLogger(LOG_PATH)
+        task3 = cotask.Task(logger.run, name="Logger", priority=0, period=20,
+                            profile=True, trace=False)
+        cotask.task_list.append(task3)
+
+    # Recorded step responses go out as binary frames from the motor tasks
+    if TELEMETRY:
+        import telemetry
+        writer = telemetry.FrameWriter()
+
+    if TIMING:
+        import latency
+        # In multi-axis mode every motor runs at the period of the one task
+        timings = [latency.AxisTiming(axis, 50 if MULTI_AXIS else AXES[axis][6])
+                   for axis in range(len(AXES))]
+
+    # The command task answers '?' itself, since only one task can read
+    # the serial port; otherwise the timing query task looks for a '?' now
+    # and then
+    if COMMANDS:
+        import commands as cmd
+        commands = cmd.CommandTask(timings=timings)
+        if MULTI_AXIS:
+            # One task runs both motors
+            commands.set_task(0, task1)
+            commands.set_task(1, task1)
+        else:
+            if not TIMER_LOOP:
+                commands.set_task(0, task1)
+            commands.set_task(1, task2)
+        task4 = cotask.Task(commands.run, name="Commands", priority=0, period=20,
+                            profile=True, trace=False)
+        cotask.task_list.append(task4)
+    elif TIMING:
+        query = latency.StatsQuery(timings)
+        task4 = cotask.Task(query.run, name="Timing", priority=0, period=200,
+                            profile=True, trace=False)
+        cotask.task_list.append(task4)
 
     # Run the memory garbage collector to ensure memory is as defragmented as
     # possible before the real-time scheduler is started
@@ -154,5 +360,15 @@ if __name__ == "__main__":
         except KeyboardInterrupt:
             break
 
+    # The timer keeps running the loop after the scheduler stops, so it is
+    # stopped and the motor turned off
+    if timer_loop is not None:
+        timer_loop.stop()
+
+    # Write out whatever is left to log so the last run is kept
+    if logger is not None:
+        logger.close()
+        print('Logged samples dropped:', logger.dropped)
+
     # Print a table of task data 
     print('\n' + str (cotask.task_list))
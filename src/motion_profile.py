@@ -0,0 +1,101 @@
+"""!
+@file motion_profile.py
+This file contains code that plans a smooth move from one position to
+another, for the controller to follow instead of jumping straight to the
+setpoint. The whole move is worked out once, when it is asked for, as a
+table of the reference position at each run of the control task. Following
+it is then just reading the next entry of the table, so each run costs the
+same no matter how the move was planned.
+
+Two shapes are available. A trapezoid speeds up at a constant rate, cruises,
+and slows down at the same rate. An S-curve does the same but eases into and
+out of each change in speed, so the acceleration has no sudden steps.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import math
+from array import array
+
+## Shapes of move
+TRAPEZOID = 0
+S_CURVE = 1
+
+
+def _plan(distance, v_max, a_max, shape):
+    """!
+    Works out the top speed and the speeding up and cruising times of a move.
+    @param distance length of the move, in encoder counts, at least zero
+    @param v_max largest speed, in encoder counts per second
+    @param a_max largest acceleration, in encoder counts per second squared
+    @param shape TRAPEZOID or S_CURVE
+    @returns a (speed, ramp time, cruise time) tuple, times in seconds
+    """
+    # An S-curve ramp follows half a cosine, so its peak acceleration is
+    # pi/2 times that of a straight ramp of the same length
+    stretch = math.pi / 2 if shape == S_CURVE else 1.0
+    ramp = stretch * v_max / a_max
+
+    # Moves too short to reach full speed never cruise
+    if v_max * ramp > distance:
+        v_max = math.sqrt(distance * a_max / stretch)
+        ramp = stretch * v_max / a_max
+    cruise = (distance - v_max * ramp) / v_max if v_max > 0 else 0.0
+    return v_max, ramp, cruise
+
+
+def _ramp_distance(t, v_max, ramp, shape):
+    # Distance covered t seconds into speeding up
+    if shape == S_CURVE:
+        return v_max / 2 * (t - ramp / math.pi * math.sin(math.pi * t / ramp))
+    return v_max * t * t / (2 * ramp)
+
+
+def make_profile(start, end, v_max, a_max, period_ms, shape=TRAPEZOID):
+    """!
+    Plans a move and makes its table of reference positions.
+    @param start position at the start of the move, in encoder counts
+    @param end position at the end of the move, in encoder counts
+    @param v_max largest speed, in encoder counts per second
+    @param a_max largest acceleration, in encoder counts per second squared
+    @param period_ms time between runs of the control task, in ms
+    @param shape TRAPEZOID or S_CURVE
+    @returns an array of the reference position at each run of the task,
+             the last of which is exactly @c end
+    """
+    distance = abs(end - start)
+    direction = 1 if end >= start else -1
+    v_max, ramp, cruise = _plan(distance, v_max, a_max, shape)
+    total = 2 * ramp + cruise
+    dt = period_ms / 1000
+
+    count = int(math.ceil(total / dt)) + 1
+    table = array('l', [0] * count)
+    for i in range(count - 1):
+        t = i * dt
+        if t < ramp:
+            moved = _ramp_distance(t, v_max, ramp, shape)
+        elif t < ramp + cruise:
+            moved = v_max * ramp / 2 + v_max * (t - ramp)
+        else:
+            moved = distance - _ramp_distance(max(0.0, total - t), v_max, ramp, shape)
+        table[i] = start + direction * int(moved + 0.5)
+    table[count - 1] = end
+    return table
+
+
+def trapezoid(start, end, v_max, a_max, period_ms):
+    """!
+    Makes the table of a trapezoidal move. See make_profile().
+    @returns an array of the reference position at each run of the task
+    """
+    return make_profile(start, end, v_max, a_max, period_ms, TRAPEZOID)
+
+
+def s_curve(start, end, v_max, a_max, period_ms):
+    """!
+    Makes the table of an S-curve move. See make_profile().
+    @returns an array of the reference position at each run of the task
+    """
+    return make_profile(start, end, v_max, a_max, period_ms, S_CURVE)
@@ -10,9 +10,15 @@ and run a connected motor at a desired duty cycle
 class MotorDriver:
     """! 
     This class implements a motor driver for an ME405 kit. 
+    
+    The duty cycle is turned into a compare value of the PWM timer and
+    written straight to the channel. The last value written is kept, so a
+    call which would not change the output writes nothing, and the channel
+    which is not driving is only set to zero when the direction changes.
+    The change from one call to the next can also be limited (slew rate).
     """
 
-    def __init__ (self, en_pin, a_pin, another_pin, timer, ch1, ch2):
+    def __init__ (self, en_pin, a_pin, another_pin, timer, ch1, ch2, slew=None):
         """! 
         Creates a motor driver by initializing GPIO
         pins and turning off the motor for safety. 
@@ -22,6 +28,8 @@ class MotorDriver:
         @param timer Timer associated with IN1A and IN2A
         @param ch1 Timer Channel associated with IN1A
         @param ch2 Timer Channel associated with IN2A
+        @param slew largest change in duty cycle from one call to the next,
+               in percent, or None for no limit
         """
         self.en_pin = en_pin
         self.in1pin = a_pin
@@ -29,37 +37,88 @@ class MotorDriver:
         self.timer = timer
         self.ch1 = ch1
         self.ch2 = ch2
+        
+        # Compare value of a 100% duty cycle, and the channel methods used
+        # to set compare values, kept so they are not looked up every call
+        self.full = timer.period() + 1
+        self._width1 = ch1.pulse_width
+        self._width2 = ch2.pulse_width
+        
+        # Signed compare value last written, and the number of writes made
+        self.last = 0
+        self.writes = 0
+        self.set_slew(slew)
+        
+        # Both channels start off
+        self._width1(0)
+        self._width2(0)
+    
+    def set_slew(self, slew):
+        """!
+        Sets the largest change in duty cycle from one call of
+        set_duty_cycle() to the next
+        @param slew largest change in percent, or None for no limit
+        """
+        self.slew = 0 if slew is None else max(1, int(slew * self.full / 100))
 
     def set_duty_cycle (self, level):
         """!
         This method sets the duty cycle to be sent
         to the motor to the given level. Positive values
         cause torque in one direction, negative values
-        in the opposite direction. This is accomplished via
-        an if statement that checks the sign of the level
-        parameter and passes its absolute value through
-        one channel and setting the other channel to 0.
-        @param level A signed integer holding the duty
-               cycle of the voltage sent to the motor 
+        in the opposite direction. The level is clipped to
+        plus or minus 100 and rounded towards zero to a whole
+        number of timer counts; nothing is written if that
+        is what the channels already hold.
+        @param level A signed number holding the duty
+               cycle of the voltage sent to the motor, in percent
         """
-        # creating a variable to run a while loop to run the motor
         try:
-            # check if level is negative and greater than -100
-            # this is to check the sign of level, but also that
-            # the duty cycle does not exceed its bounds
-            if level < 0 :
-                self.ch1.pulse_width_percent(0)
-                # bias signal channel 2
-                self.ch2.pulse_width_percent(abs(level))
-            # otherwise if positive, check if level exceeds 100  
-            elif level >= 0 :
-                self.ch1.pulse_width_percent(abs(level))
-                self.ch2.pulse_width_percent(0)
+            # Clips the level and turns it into a compare value
+            if level > 100:
+                level = 100
+            elif level < -100:
+                level = -100
+            if level >= 0:
+                counts = int(level * self.full) // 100
+            else:
+                counts = -(int(-level * self.full) // 100)
+            
+            # Limits how fast the output changes, if asked to
+            last = self.last
+            slew = self.slew
+            if slew:
+                if counts > last + slew:
+                    counts = last + slew
+                elif counts < last - slew:
+                    counts = last - slew
+            
+            # Nothing to write if the output would not change
+            if counts == last:
+                return
+            
+            # Drives one channel, setting the other to zero only when the
+            # direction has changed
+            if counts >= 0:
+                if last < 0:
+                    self._width2(0)
+                    self.writes += 1
+                if counts or last > 0:
+                    self._width1(counts)
+                    self.writes += 1
+            else:
+                if last > 0:
+                    self._width1(0)
+                    self.writes += 1
+                self._width2(-counts)
+                self.writes += 1
+            self.last = counts
                 
         # When ctrl+c/ program stops, keyboard interrupt handling
         except KeyboardInterrupt:
-            self.ch1.pulse_width_percent(0)
-            self.ch2.pulse_width_percent(0)
+            self._width1(0)
+            self._width2(0)
+            self.last = 0
         # When non-numeral is entered error handling
         except TypeError:
             print('Set level to signed int')
@@ -0,0 +1,265 @@
+"""!
+@file multi_axis.py
+This file contains a controller which runs the proportional control loops
+of several motors in one task. The settings and state of every motor are
+kept in parallel arrays, and each run samples every encoder first and then
+sets every duty cycle, so all motors are sampled at (nearly) the same moment.
+Adding a motor costs one more pass through the loop instead of another task
+for the scheduler to switch to.
+
+Each motor's step response can be streamed or logged with set_stream(), its
+timing measured with set_timing(), and axis() gives an object which the
+command task in commands.py can use like a controller. Step responses are
+not printed as .CSV lines, since those have no way to tell motors apart.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+from array import array
+import utime
+import sample_buffer
+
+
+class MultiAxis:
+    """!
+    This class implements proportional control of up to a fixed number of
+    motors. Gains are kept as scaled integers so running the loop does not
+    allocate memory.
+    """
+
+    ## Fraction bits of the scaled gains
+    SHIFT = 12
+    ## Largest error used, in encoder counts, so products stay small integers
+    MAX_ERROR = 1 << 17
+
+    def __init__(self, capacity, out_max=100, settle_duty=10, depth=0):
+        """!
+        Initializes the controller with no motors.
+        @param capacity largest number of motors which can be added
+        @param out_max largest duty cycle put out, in percent, in either direction
+        @param settle_duty a motor counts as settled once its duty cycle is
+               at most this many percent, as in control.cl_loop_response()
+        @param depth number of positions recorded for each motor, or zero
+               for no recording
+        """
+        self.capacity = capacity
+        self.out_max = out_max
+        self.settle_duty = settle_duty
+        self.count = 0
+
+        # Hardware of each motor
+        self.motors = []
+        self.encoders = []
+        self.reads = []
+        self.sets = []
+
+        # Settings and state of each motor, one entry per motor
+        self.gains = array('l', [0] * capacity)
+        self.setpoints = array('l', [0] * capacity)
+        self.positions = array('l', [0] * capacity)
+        self.duties = array('l', [0] * capacity)
+        self.settled = bytearray(capacity)
+
+        # Optional recording of the positions of each motor
+        self.depth = depth
+        self.records = []
+
+        # Optional streaming of each step response, and the time each one
+        # started and whether it is still being sent
+        self.stream = None
+        self.starts = array('l', [0] * capacity)
+        self.sending = bytearray(capacity)
+
+        # Optional timing measurement of each motor
+        self.timings = [None] * capacity
+
+    def add_axis(self, motor, encoder, gain=0, setpoint=0):
+        """!
+        Adds a motor to the controller.
+        @param motor motor driver object running the motor
+        @param encoder encoder object returning the position of the motor
+        @param gain proportional gain, in percent duty cycle per encoder count
+        @param setpoint position to move to, in encoder counts
+        @returns the number of the new motor, counting from zero
+        """
+        if self.count == self.capacity:
+            raise ValueError("no room for another axis")
+        axis = self.count
+        self.motors.append(motor)
+        self.encoders.append(encoder)
+
+        # Bound methods are made once here instead of on every run
+        self.reads.append(encoder.read)
+        self.sets.append(motor.set_duty_cycle)
+        if self.depth:
+            self.records.append(sample_buffer.SampleBuffer(self.depth))
+        self.count += 1
+        self.set_Kp(axis, gain)
+        self.set_setpoint(axis, setpoint)
+        return axis
+
+    def set_Kp(self, axis, gain):
+        """!
+        Sets the proportional gain of one motor.
+        @param axis number of the motor
+        @param gain gain in percent duty cycle per encoder count
+        """
+        self.gains[axis] = int(gain * (1 << self.SHIFT) + 0.5)
+
+    def set_setpoint(self, axis, setpoint):
+        """!
+        Sets the position one motor moves to, and starts a new step response.
+        @param axis number of the motor
+        @param setpoint position in encoder counts
+        """
+        self.setpoints[axis] = int(setpoint)
+        self.settled[axis] = 0
+        self.starts[axis] = utime.ticks_ms()
+        self.sending[axis] = 1
+
+    def start(self, axis):
+        """!
+        Starts a new step response of one motor from where it is now, by
+        zeroing its encoder, as the tasks in main.py do before each run.
+        @param axis number of the motor
+        """
+        self.encoders[axis].zero()
+        self.set_setpoint(axis, self.setpoints[axis])
+
+    def axis(self, axis):
+        """!
+        Makes an object which sets the gain and setpoint of one motor and
+        starts its step responses, like a closed_loop_controller.control,
+        so the motor can be registered with commands.CommandTask.
+        @param axis number of the motor
+        @returns the AxisControl object
+        """
+        return AxisControl(self, axis)
+
+    def set_stream(self, streamer):
+        """!
+        Makes every motor's step response be streamed while it runs. Each
+        motor's samples are sent with its axis number, from the time its
+        setpoint was set until it settles, followed by the end of the run.
+        @param streamer telemetry.Streamer or data_logger.FlashLogger which
+               receives the samples, or None to stop streaming
+        """
+        self.stream = streamer
+
+    def set_timing(self, axis, timing):
+        """!
+        Makes each run record the latency, period and jitter of one motor.
+        @param axis number of the motor
+        @param timing latency.AxisTiming which receives the measurements, or
+               None to stop measuring
+        """
+        self.timings[axis] = timing
+
+    def run(self):
+        """!
+        Runs the control loop of every motor once.
+        @returns True once every motor has settled
+        """
+        count = self.count
+        positions = self.positions
+        reads = self.reads
+
+        # Samples every encoder before doing anything else
+        for i in range(count):
+            positions[i] = reads[i]()
+
+        out_max = self.out_max
+        max_error = self.MAX_ERROR
+        shift = self.SHIFT
+        gains = self.gains
+        setpoints = self.setpoints
+        duties = self.duties
+        settled = self.settled
+        all_settled = True
+        for i in range(count):
+            error = setpoints[i] - positions[i]
+            if error > max_error:
+                error = max_error
+            elif error < -max_error:
+                error = -max_error
+            duty = (gains[i] * error) >> shift
+            if duty > out_max:
+                duty = out_max
+            elif duty < -out_max:
+                duty = -out_max
+            duties[i] = duty
+            if -self.settle_duty <= duty <= self.settle_duty:
+                settled[i] = 1
+            elif not settled[i]:
+                all_settled = False
+
+        # Sets every duty cycle, then records the timing and positions
+        sets = self.sets
+        for i in range(count):
+            sets[i](duties[i])
+        timings = self.timings
+        for i in range(count):
+            if timings[i] is not None:
+                timings[i].record(self.encoders[i])
+        stream = self.stream
+        if stream is not None:
+            now = utime.ticks_ms()
+            starts = self.starts
+            sending = self.sending
+            for i in range(count):
+                if sending[i]:
+                    stream.record(i, utime.ticks_diff(now, starts[i]), positions[i])
+                    if settled[i]:
+                        stream.end(i)
+                        sending[i] = 0
+        if self.depth:
+            records = self.records
+            for i in range(count):
+                records[i].append(positions[i])
+        return all_settled
+
+    def task(self):
+        """!
+        Generator which runs every motor once each time it is run, meant to
+        be the only motor task in the cotask scheduler.
+        """
+        while True:
+            self.run()
+            yield 0
+
+
+class AxisControl:
+    """!
+    This class lets one motor of a MultiAxis controller be used where a
+    closed_loop_controller.control is expected, such as by commands.py.
+    """
+
+    def __init__(self, multi, axis):
+        """!
+        Initializes the object.
+        @param multi the MultiAxis controller running the motor
+        @param axis number of the motor
+        """
+        self.multi = multi
+        self.axis = axis
+
+    def set_Kp(self, gain):
+        """!
+        Sets the proportional gain of the motor.
+        @param gain gain in percent duty cycle per encoder count
+        """
+        self.multi.set_Kp(self.axis, gain)
+
+    def set_setpoint(self, setpoint):
+        """!
+        Sets the position the motor moves to, and starts a new step response.
+        @param setpoint position in encoder counts
+        """
+        self.multi.set_setpoint(self.axis, setpoint)
+
+    def start(self):
+        """!
+        Starts a new step response from where the motor is now.
+        """
+        self.multi.start(self.axis)
@@ -0,0 +1,211 @@
+"""!
+@file multi_board.py
+This file contains code that reads several boards at once from one asyncio
+event loop, instead of one blocking loop or thread per serial port. Each
+board's data is decoded by bulk_parse, tagged with the board's name and the
+axis (motor) it came from, and handed to one shared sink, which saves finished
+runs to a run_archive.RunArchive and can also pass the data on through a
+queue to another thread.
+
+Ports are read with pyserial-asyncio when it is installed. Otherwise each
+port is opened without a timeout and polled: whatever has arrived is read
+in one go and the loop sleeps briefly when nothing has.
+
+Binary frames carry the axis of every sample. .CSV lines do not, so every
+sample from a board sending .CSV lines is counted as axis 0.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import asyncio
+import queue
+
+import numpy as np
+import bulk_parse
+
+try:
+    import serial_asyncio
+except ImportError:
+    serial_asyncio = None
+
+## Time waited between polls of a port with nothing waiting, in seconds
+POLL_INTERVAL = 0.005
+
+
+class RunSink:
+    """!
+    This class collects samples from every board and axis. The samples of
+    each run are gathered so the whole run can be archived once it ends.
+    If a queue is given, each piece of data is also put in it as
+    ((board, axis), item) for another thread to read.
+    """
+
+    def __init__(self, archive=None, queue=None, **run_settings):
+        """!
+        Initializes the sink.
+        @param archive run_archive.RunArchive which receives each finished
+               run, or None to keep nothing
+        @param queue queue.Queue which receives every piece of data, or None
+               when nothing reads it. Give it a maxsize: when it is full,
+               new data is counted in @c skipped instead of waiting
+        @param run_settings settings saved with every run, such as gain,
+               setpoint and period_ms
+        """
+        self.archive = archive
+        self.queue = queue
+        self.run_settings = run_settings
+        self.pending = {}
+        self.runs = 0
+        self.skipped = 0
+
+    def __call__(self, board, axis, item):
+        """!
+        Takes one piece of data.
+        @param board name of the board it came from
+        @param axis axis number it belongs to
+        @param item a (times, positions) pair of arrays, or
+               bulk_parse.END_OF_RUN
+        """
+        key = (board, axis)
+        if self.queue is not None:
+            try:
+                self.queue.put_nowait((key, item))
+            except queue.Full:
+                # Whatever reads the queue has fallen behind
+                self.skipped += 1
+        if item is bulk_parse.END_OF_RUN:
+            parts = self.pending.pop(key, [])
+            self.runs += 1
+            if self.archive is not None and parts:
+                times = np.concatenate([part[0] for part in parts])
+                positions = np.concatenate([part[1] for part in parts])
+                self.archive.save(times, positions, axis=axis, label=board,
+                                  **self.run_settings)
+        else:
+            self.pending.setdefault(key, []).append(item)
+
+
+class Board:
+    """!
+    This class reads and decodes one board's serial port.
+    """
+
+    def __init__(self, name, port=None, baud_rate=115200, binary=False, ser=None):
+        """!
+        Initializes the board; the port is opened when run() starts.
+        @param name name used to tell the board apart in the sink
+        @param port name of the serial port, such as 'COM3'
+        @param baud_rate speed of the serial port
+        @param binary True if the board sends binary frames instead of .CSV lines
+        @param ser serial port object which is already open, such as a
+               serial_replay.ReplaySerial, used instead of @c port
+        """
+        self.name = name
+        self.port = port
+        self.baud_rate = baud_rate
+        self.binary = binary
+        self.ser = ser
+        self.decoder = (bulk_parse.FrameChunker() if binary
+                        else bulk_parse.CsvChunker())
+        self.received = 0
+
+    async def _blocks(self):
+        """!
+        Asynchronous generator of the blocks of bytes read from the port,
+        which ends when the port does.
+        """
+        if self.ser is None and serial_asyncio is not None:
+            reader, writer = await serial_asyncio.open_serial_connection(
+                url=self.port, baudrate=self.baud_rate)
+            try:
+                while True:
+                    data = await reader.read(bulk_parse.CHUNK_SIZE)
+                    if not data:
+                        return
+                    yield data
+            finally:
+                writer.close()
+
+        ser = self.ser
+        if ser is None:
+            import serial
+            ser = self.ser = serial.Serial(self.port, self.baud_rate, timeout=0)
+        while True:
+            waiting = ser.in_waiting
+            if waiting:
+                yield ser.read(min(waiting, bulk_parse.CHUNK_SIZE))
+                # Lets the other boards have a turn
+                await asyncio.sleep(0)
+            elif getattr(ser, 'finished', False) or not getattr(ser, 'is_open', True):
+                # A replayed session has run out, or the port was closed
+                return
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def run(self, sink):
+        """!
+        Reads the board until its port ends, passing everything decoded to
+        the sink.
+        @param sink callable taking (board name, axis, item), such as a RunSink
+        """
+        async for data in self._blocks():
+            self.received += len(data)
+            for item in self.decoder.feed(data):
+                if self.binary:
+                    sink(self.name, item[0], item[1] if len(item) == 2 else item[1:])
+                else:
+                    sink(self.name, 0, item)
+
+
+async def acquire(boards, sink, duration=None):
+    """!
+    Reads every board at once.
+    @param boards list of Board
+    @param sink callable taking (board name, axis, item), such as a RunSink
+    @param duration longest time to read for, in seconds, or None to read
+           until every port ends
+    """
+    tasks = [asyncio.ensure_future(board.run(sink)) for board in boards]
+    done, pending = await asyncio.wait(tasks, timeout=duration)
+    for task in pending:
+        task.cancel()
+    for task in done:
+        task.result()
+
+
+# This code reads the boards named on the command line, saving every run to
+# the run archive, until Ctrl+C is pressed. Giving serial_replay capture files
+# (ending in .srl) instead of ports replays them as if from several boards
+if __name__ == "__main__":
+    import argparse
+    import time
+    import run_archive
+    import serial_replay
+
+    parser = argparse.ArgumentParser(description="Read several boards at once")
+    parser.add_argument('ports', nargs='+', help="serial ports or .srl capture files")
+    parser.add_argument('--binary', action='store_true', help="boards send binary frames")
+    parser.add_argument('--speed', type=float, default=None,
+                        help="replay speed for captures; as fast as possible if left out")
+    args = parser.parse_args()
+
+    boards = []
+    for port in args.ports:
+        if port.endswith('.srl'):
+            replay = serial_replay.ReplaySerial(port, speed=args.speed, timeout=0)
+            boards.append(Board(port, ser=replay, binary=args.binary))
+        else:
+            boards.append(Board(port, port, binary=args.binary))
+
+    with run_archive.RunArchive() as archive:
+        sink = RunSink(archive)
+        start = time.perf_counter()
+        try:
+            asyncio.run(acquire(boards, sink))
+        except KeyboardInterrupt:
+            pass
+        elapsed = time.perf_counter() - start
+    total = sum(board.received for board in boards)
+    print(f'Read {total} bytes and {sink.runs} runs from {len(boards)} boards '
+          f'in {elapsed:.2f} s')
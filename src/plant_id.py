@@ -0,0 +1,181 @@
+"""!
+@file plant_id.py
+This file contains code that works out the settings of the motor model in
+sim_pyb.MotorPlant (gain, time constant, deadband and friction) from step
+responses recorded with control.cl_loop_response(), so new gains and periods
+can be tried in the simulation instead of on the motors.
+
+Each sample of a run gives the position at the start of a task period, and
+the duty cycle held for that period follows from the proportional gain and
+setpoint of the run, the same way control.run() works it out. Between
+samples the model is linear in the gain and the friction once the time
+constant and deadband are known, so a grid of time constants and deadbands
+is tried, with a least squares fit for each, and the one which fits best is
+kept. Every time constant is fitted at once, on the samples of every run
+together, as NumPy arrays. Friction is the least certain of the settings,
+since it barely changes the speed while the duty cycle is large.
+
+The result can be saved to a JSON file which sim_pyb.MotorPlant.from_file(),
+batch_sim.simulate() and tuner.py (with --plant) load.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import json
+import numpy as np
+
+## Names of the model settings, as taken by sim_pyb.MotorPlant
+PARAMS = ('gain', 'tau', 'deadband', 'friction')
+
+## Time constants tried, in seconds
+TAU_GRID = np.geomspace(0.005, 2.0, 200)
+
+## Deadbands tried, in percent duty cycle
+DEADBAND_GRID = np.linspace(0.0, 40.0, 81)
+
+
+def _rows(times, positions, kp, setpoint, min_speed):
+    """!
+    Works out the speeds and duty cycles of one run, and picks the samples
+    which can be used in the fit.
+    @returns (v0, v1, u0, u1, s0, s1, period) arrays for each usable pair of
+             periods in a row, where v is the average speed over a period, u
+             the duty cycle and s the direction of motion
+    """
+    t = np.asarray(times, dtype=float) / 1000
+    p = np.asarray(positions, dtype=float)
+    dt = np.diff(t)
+    v = np.diff(p) / np.where(dt > 0, dt, np.nan)
+    u = np.clip(kp * (setpoint - p[:-1]), -100.0, 100.0)
+    s = np.sign(v)
+
+    # Two periods in a row, moving the same way and of the same length
+    keep = ((np.abs(v[:-1]) >= min_speed) & (np.abs(v[1:]) >= min_speed)
+            & (s[:-1] == s[1:]) & np.isclose(dt[:-1], dt[1:], rtol=0.05))
+    return (v[:-1][keep], v[1:][keep], u[:-1][keep], u[1:][keep],
+            s[:-1][keep], s[1:][keep], dt[:-1][keep])
+
+
+def fit(runs, taus=TAU_GRID, deadbands=DEADBAND_GRID, min_speed=50.0):
+    """!
+    Fits the motor model to a set of step responses.
+    @param runs list of (times, positions, kp, setpoint) tuples: sample
+           times in ms, positions in encoder counts, and the proportional gain
+           and setpoint of the run
+    @param taus time constants to try, in seconds
+    @param deadbands deadbands to try, in percent duty cycle
+    @param min_speed samples with a smaller speed, in counts per second, are
+           left out, since friction changes when the motor stops
+    @returns a (params, rms) pair: a dictionary of the model settings, and the
+             root mean square error of the fitted speeds in counts per second
+    """
+    parts = [_rows(*run, min_speed) for run in runs]
+    v0, v1, u0, u1, s0, s1, period = (np.concatenate(column) for column in zip(*parts))
+    if len(v0) < 3:
+        raise ValueError("not enough moving samples to fit")
+
+    # For each time constant: a is the decay over one period and c the
+    # average of the decay over one period. Averaging the exact solution over
+    # each period gives
+    #   v1 = a*v0 + (c - a)*w0 + (1 - c)*w1
+    # where w is the steady-state speed, gain*(u less the deadband) -
+    # friction*tau*sign(v), which is linear in the gain and the friction
+    taus = np.asarray(taus, dtype=float)[:, None]
+    a = np.exp(-period / taus)
+    c = taus * (1 - a) / period
+    before = c - a
+    after = 1 - c
+    target = v1 - a * v0
+    drag_column = -(before * s0 + after * s1)
+
+    best = (np.inf, None, None, None)
+    for deadband in deadbands:
+        drive0 = np.sign(u0) * np.maximum(np.abs(u0) - deadband, 0.0)
+        drive1 = np.sign(u1) * np.maximum(np.abs(u1) - deadband, 0.0)
+        design = np.stack([before * drive0 + after * drive1, drag_column], axis=-1)
+
+        # Least squares for every time constant at once
+        gram = np.einsum('tni,tnj->tij', design, design)
+        moment = np.einsum('tni,tn->ti', design, target)
+        coef = np.linalg.solve(gram + 1e-9 * np.eye(2), moment[..., None])[..., 0]
+        residual = target - np.einsum('tni,ti->tn', design, coef)
+        rms = np.sqrt(np.mean(residual * residual, axis=1))
+
+        index = int(np.argmin(rms))
+        if rms[index] < best[0]:
+            best = (rms[index], index, deadband, coef[index])
+
+    rms, index, deadband, (gain, drag) = best
+    tau = float(taus[index, 0])
+    params = {'gain': float(gain),
+              'tau': tau,
+              'deadband': float(deadband),
+              'friction': float(drag / tau)}
+    return params, float(rms)
+
+
+def fit_each(runs, taus=TAU_GRID, deadbands=DEADBAND_GRID, min_speed=50.0):
+    """!
+    Fits the motor model to each run on its own, to see how much the
+    settings change from run to run.
+    @param runs list of (times, positions, kp, setpoint) tuples, as for fit()
+    @returns a 2-D array with one row per run and one column per setting, in
+             the order of PARAMS; rows which could not be fitted are NaN
+    """
+    table = np.full((len(runs), len(PARAMS)), np.nan)
+    for row, run in enumerate(runs):
+        try:
+            params, _ = fit([run], taus, deadbands, min_speed)
+        except (ValueError, np.linalg.LinAlgError):
+            continue
+        table[row] = [params[name] for name in PARAMS]
+    return table
+
+
+def save_params(path, params):
+    """!
+    Writes model settings to a JSON file.
+    @param path name of the file
+    @param params dictionary of model settings
+    """
+    with open(path, 'w') as file:
+        json.dump({name: params[name] for name in PARAMS}, file, indent=2)
+
+
+def load_params(path):
+    """!
+    Reads model settings from a JSON file.
+    @param path name of the file
+    @returns a dictionary of model settings
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+# This code fits the model to runs from the archive (or, if it is empty, to
+# simulated runs of a known motor) and writes the settings to plant.json
+if __name__ == "__main__":
+    import sys
+    import run_archive
+    import batch_sim
+
+    output = sys.argv[1] if len(sys.argv) > 1 else 'plant.json'
+    with run_archive.RunArchive() as archive:
+        runs = [archive.load(run) + (run.gain, run.setpoint) for run in archive.find()
+                if run.gain is not None and run.setpoint is not None]
+
+    if not runs:
+        truth = {'gain': 120.0, 'tau': 0.15, 'deadband': 8.0, 'friction': 1500.0}
+        gains = np.linspace(0.01, 0.1, 10)
+        positions = batch_sim.simulate(gains, 50, 10000, 3000, step_ms=50, plant=truth)
+        times = np.arange(positions.shape[1]) * 50
+        runs = [(times, row, kp, 10000) for kp, row in zip(gains, positions)]
+        print('No archived runs; fitting simulated runs of', truth)
+
+    params, rms = fit(runs)
+    print(f'Fitted {len(runs)} runs, speed error {rms:.1f} counts/s:')
+    for name in PARAMS:
+        print(f'  {name} = {params[name]:.4g}')
+    save_params(output, params)
+    print(f'Wrote {output}')
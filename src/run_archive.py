@@ -0,0 +1,216 @@
+"""!
+@file run_archive.py
+This file contains code that keeps step response runs on disk so they are
+not lost when the plot window is cleared or closed. The settings of each run
+(gain, setpoint, task period, axis, time) and its step response numbers are
+kept in an SQLite database, so finding runs is one quick query. The samples
+of each run are kept in their own .npy file, which is memory mapped when
+loaded, so overlaying many old runs only reads the parts that are drawn.
+
+The archive is a directory holding @c index.sqlite and one @c <id>.npy file
+per run. Each .npy file holds a 2 by N array of times and positions.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import os
+import time
+import sqlite3
+from collections import namedtuple
+
+import numpy as np
+import step_metrics
+
+## One archived run, as stored in the index
+Run = namedtuple('Run', 'id created axis gain setpoint period_ms samples label '
+                        'rise overshoot settling error iae')
+
+_COLUMNS = ', '.join(Run._fields)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    axis INTEGER NOT NULL,
+    gain REAL,
+    setpoint REAL,
+    period_ms REAL,
+    samples INTEGER NOT NULL,
+    label TEXT,
+    rise REAL,
+    overshoot REAL,
+    settling REAL,
+    error REAL,
+    iae REAL
+);
+CREATE INDEX IF NOT EXISTS runs_gain ON runs (gain);
+CREATE INDEX IF NOT EXISTS runs_axis_created ON runs (axis, created);
+"""
+
+
+def _number(value):
+    # NaN is stored as NULL, and NumPy numbers as plain ones
+    if value is None:
+        return None
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+class RunArchive:
+    """!
+    This class implements an archive of step response runs in a directory.
+    """
+
+    def __init__(self, path='runs'):
+        """!
+        Opens the archive, making it if it does not exist yet.
+        @param path directory holding the archive
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(path, 'index.sqlite'))
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        """!
+        Closes the database.
+        """
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _file(self, run_id):
+        # Name of the file holding the samples of a run
+        return os.path.join(self.path, f'{run_id}.npy')
+
+    def save(self, times, positions, gain=None, setpoint=None, period_ms=None,
+             axis=0, label=None, created=None):
+        """!
+        Adds a run to the archive.
+        @param times time of each sample, in ms
+        @param positions position of each sample, in encoder counts
+        @param gain proportional gain of the run
+        @param setpoint setpoint of the run, in encoder counts; also used for
+               the step response numbers
+        @param period_ms period of the control task, in ms
+        @param axis axis (motor) number
+        @param label any note about the run
+        @param created time of the run in seconds since the epoch, now if None
+        @returns the id of the new run
+        """
+        samples = np.array([times, positions], dtype=float)
+        metrics = step_metrics.compute(samples[0], samples[1:], setpoint)
+        if created is None:
+            created = time.time()
+
+        with self.db:
+            cursor = self.db.execute(
+                'INSERT INTO runs (created, axis, gain, setpoint, period_ms, samples, label, '
+                'rise, overshoot, settling, error, iae) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)',
+                (created, axis, _number(gain), _number(setpoint), _number(period_ms),
+                 samples.shape[1], label,
+                 _number(metrics.rise[0]), _number(metrics.overshoot[0]),
+                 _number(metrics.settling[0]), _number(metrics.error[0]),
+                 _number(metrics.iae[0])))
+            run_id = cursor.lastrowid
+            np.save(self._file(run_id), samples)
+        return run_id
+
+    def find(self, gain=None, gain_range=None, axis=None, setpoint=None, period_ms=None,
+             since=None, order='created DESC', limit=None):
+        """!
+        Looks up runs in the index. Every condition given must match.
+        @param gain exact gain to match
+        @param gain_range (lowest, highest) pair of gains to match, inclusive
+        @param axis axis number to match
+        @param setpoint setpoint to match
+        @param period_ms task period to match
+        @param since only runs made at or after this time, in seconds since
+               the epoch
+        @param order column the results are sorted by, such as 'iae' to put
+               the smallest error integral first, followed by ' DESC' for
+               largest first; a ValueError is raised for anything else
+        @param limit largest number of runs returned, or None for all
+        @returns a list of Run
+        """
+        # Only a column name can go into the query, never other SQL
+        parts = order.split()
+        if (not 1 <= len(parts) <= 2 or parts[0] not in Run._fields
+                or parts[1:] not in ([], ['ASC'], ['DESC'])):
+            raise ValueError(f'cannot sort by {order!r}')
+        order = ' '.join(parts)
+
+        conditions = []
+        values = []
+        for column, value in (('gain', gain), ('axis', axis), ('setpoint', setpoint),
+                              ('period_ms', period_ms)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                values.append(value)
+        if gain_range is not None:
+            conditions.append('gain BETWEEN ? AND ?')
+            values.extend(gain_range)
+        if since is not None:
+            conditions.append('created >= ?')
+            values.append(since)
+
+        query = f'SELECT {_COLUMNS} FROM runs'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += f' ORDER BY {order}'
+        if limit is not None:
+            query += ' LIMIT ?'
+            values.append(int(limit))
+        return [Run(*row) for row in self.db.execute(query, values)]
+
+    def load(self, run):
+        """!
+        Gets the samples of a run, memory mapped from its file.
+        @param run Run, or the id of one
+        @returns a (times, positions) pair of read-only arrays
+        """
+        run_id = run.id if isinstance(run, Run) else run
+        samples = np.load(self._file(run_id), mmap_mode='r')
+        return samples[0], samples[1]
+
+    def delete(self, run):
+        """!
+        Removes a run from the archive.
+        @param run Run, or the id of one
+        """
+        run_id = run.id if isinstance(run, Run) else run
+        with self.db:
+            self.db.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+        try:
+            os.remove(self._file(run_id))
+        except FileNotFoundError:
+            pass
+
+
+# This code fills a scratch archive with simulated runs, then times finding
+# and loading fifty of them
+if __name__ == "__main__":
+    import tempfile
+    import batch_sim
+
+    gains, periods, positions = batch_sim.sweep(np.linspace(0.01, 0.1, 50), [10, 50, 100],
+                                                duration_ms=3000)
+    times = np.arange(positions.shape[1]) * 10
+    with tempfile.TemporaryDirectory() as scratch:
+        with RunArchive(scratch) as archive:
+            start = time.perf_counter()
+            for g, p, row in zip(gains, periods, positions):
+                archive.save(times, row, g, 10000, p)
+            print(f'Saved {len(gains)} runs in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+            start = time.perf_counter()
+            runs = archive.find(gain_range=(0.02, 0.06), period_ms=50, order='iae')
+            loaded = [archive.load(run) for run in runs]
+            elapsed = time.perf_counter() - start
+            print(f'Found and loaded {len(loaded)} runs in {elapsed * 1000:.1f} ms; '
+                  f'best Kp {runs[0].gain:.4f}, IAE {runs[0].iae:.0f}')
@@ -0,0 +1,120 @@
+"""!
+@file sample_buffer.py
+This file contains a fixed-size buffer for recording samples during a step
+response. All of its memory is set aside when it is created, so adding
+samples while the control loop runs never allocates memory.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+from array import array
+
+## When full, new samples replace the oldest ones
+OVERWRITE = 0
+## When full, new samples are dropped
+STOP = 1
+
+
+class SampleBuffer:
+    """!
+    This class implements a ring buffer of signed 32-bit samples backed by
+    an array. Samples are indexed from the oldest one kept, and reading past
+    the newest one raises an IndexError, just like a list.
+    """
+
+    def __init__(self, depth, policy=STOP):
+        """!
+        Initializes the buffer and sets aside memory for all of its samples.
+        @param depth largest number of samples the buffer holds
+        @param policy what to do when the buffer is full, either OVERWRITE
+               or STOP
+        """
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.depth = depth
+        self.policy = policy
+        self.data = array('l', [0]) * depth
+
+        # Index of the oldest sample, number of samples held and number of
+        # samples lost because the buffer was full
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
+
+    def append(self, value):
+        """!
+        Adds a sample to the buffer.
+        @param value integer sample to add
+        @returns True if the sample was stored without losing data, False
+                 if a sample was dropped or overwritten
+        """
+        depth = self.depth
+        if self.count < depth:
+            end = self.start + self.count
+            if end >= depth:
+                end -= depth
+            self.data[end] = value
+            self.count += 1
+            return True
+
+        self.dropped += 1
+        if self.policy == OVERWRITE:
+            # Replaces the oldest sample
+            self.data[self.start] = value
+            self.start += 1
+            if self.start == depth:
+                self.start = 0
+        return False
+
+    def __getitem__(self, index):
+        """!
+        Reads a sample, counting from the oldest one in the buffer.
+        @param index position of the sample; negative values count back
+               from the newest sample
+        @returns the sample
+        """
+        count = self.count
+        if index < 0:
+            index += count
+        if index < 0 or index >= count:
+            raise IndexError("sample index out of range")
+        index += self.start
+        if index >= self.depth:
+            index -= self.depth
+        return self.data[index]
+
+    def __len__(self):
+        """!
+        @returns the number of samples in the buffer
+        """
+        return self.count
+
+    def discard(self, count):
+        """!
+        Removes samples from the oldest end of the buffer, such as after they
+        have been sent.
+        @param count number of samples to remove
+        """
+        if count >= self.count:
+            self.start = 0
+            self.count = 0
+            return
+        self.start += count
+        if self.start >= self.depth:
+            self.start -= self.depth
+        self.count -= count
+
+    def full(self):
+        """!
+        @returns True if the buffer holds as many samples as it can
+        """
+        return self.count == self.depth
+
+    def clear(self):
+        """!
+        Empties the buffer without freeing its memory.
+        """
+        self.start = 0
+        self.count = 0
+        self.dropped = 0
@@ -0,0 +1,300 @@
+"""!
+@file serial_replay.py
+This file contains code that records everything coming in over a serial
+port to a file, with the time each block arrived, and plays such a file
+back through an object that looks like a serial.Serial. Giving the player
+to step_control.tk_matplot() runs the GUI against a recorded session with no
+board attached, either at the speed it was recorded or as fast as possible,
+which makes it easy to time and retest the PC side.
+
+A capture file starts with the four bytes @c SRL1 followed by one record per
+block, each a little-endian header of direction (@c R for bytes read, @c W
+for bytes written), time in seconds since the recording started (a double)
+and length (an unsigned 32-bit integer), then the bytes themselves.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import struct
+import threading
+import time
+
+## First bytes of every capture file
+MAGIC = b'SRL1'
+
+## Header of each block in a capture file
+RECORD_FORMAT = '<cdI'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+## Directions of a block
+READ = b'R'
+WRITE = b'W'
+
+
+def load(path):
+    """!
+    Reads a whole capture file.
+    @param path name of the file
+    @returns a list of (direction, time, data) tuples, in order
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a serial capture")
+    records = []
+    pos = len(MAGIC)
+    while pos + RECORD_SIZE <= len(data):
+        direction, stamp, length = struct.unpack_from(RECORD_FORMAT, data, pos)
+        pos += RECORD_SIZE
+        records.append((direction, stamp, data[pos:pos + length]))
+        pos += length
+    return records
+
+
+def save(path, records):
+    """!
+    Writes a whole capture file.
+    @param path name of the file
+    @param records list of (direction, time, data) tuples
+    """
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        for direction, stamp, data in records:
+            file.write(struct.pack(RECORD_FORMAT, direction, stamp, len(data)))
+            file.write(data)
+
+
+class RecordingSerial:
+    """!
+    This class wraps a serial.Serial and writes every block read from or
+    written to it to a capture file. Anything not recorded is passed
+    straight through to the port. Reads and writes may come from different
+    threads, such as the GUI's reader thread and its buttons.
+    """
+
+    def __init__(self, ser, path):
+        """!
+        Starts recording.
+        @param ser serial.Serial (or similar) object to record
+        @param path name of the capture file, which is replaced
+        """
+        self.ser = ser
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def _log(self, direction, data):
+        # Adds one block to the capture file in a single write, so blocks
+        # from different threads are never mixed and stay in time order
+        if data:
+            with self.lock:
+                stamp = time.perf_counter() - self.start
+                self.file.write(struct.pack(RECORD_FORMAT, direction, stamp, len(data)) + data)
+
+    def read(self, size=1):
+        """!
+        Reads from the port, recording what arrived.
+        @param size largest number of bytes to read
+        @returns the bytes read
+        """
+        data = self.ser.read(size)
+        self._log(READ, data)
+        return data
+
+    def write(self, data):
+        """!
+        Writes to the port, recording what was sent.
+        @param data bytes to send
+        @returns the number of bytes sent
+        """
+        self._log(WRITE, bytes(data))
+        return self.ser.write(data)
+
+    def close(self):
+        """!
+        Finishes the capture file and closes the port.
+        """
+        with self.lock:
+            self.file.close()
+        self.ser.close()
+
+    def __getattr__(self, name):
+        # Everything else, such as in_waiting, comes from the port
+        return getattr(self.ser, name)
+
+
+class ReplaySerial:
+    """!
+    This class plays a capture file back through the parts of the
+    serial.Serial interface used by step_control.py. Bytes become readable
+    at the time they were recorded, scaled by the speed, or all at once if
+    the speed is None. Bytes written are kept in the written list.
+    """
+
+    def __init__(self, path, speed=1.0, timeout=0.5, loop=False):
+        """!
+        Loads the capture file. The playback clock starts when the bytes
+        are first asked for, so time spent setting up is not skipped over.
+        @param path name of the capture file
+        @param speed how many times faster than real time to play, or None
+               to make every byte available straight away
+        @param timeout longest a read waits for bytes, in seconds, like
+               serial.Serial
+        @param loop if True the capture starts over after it ends
+        """
+        records = [(stamp, data) for direction, stamp, data in load(path)
+                   if direction == READ]
+        self.stamps = [stamp for stamp, _ in records]
+        self.blocks = [data for _, data in records]
+        self.speed = speed
+        self.timeout = timeout
+        self.loop = loop
+        self.written = []
+        self.is_open = True
+
+        # Playback position: next block, and how much of it has been read
+        self.index = 0
+        self.offset = 0
+        self.start = None
+
+    def _elapsed(self):
+        # Capture time reached by the playback, starting the clock the first
+        # time it is asked
+        if self.start is None:
+            self.start = time.perf_counter()
+        if self.speed is None:
+            return float('inf')
+        return (time.perf_counter() - self.start) * self.speed
+
+    def _available(self):
+        # Number of blocks which have arrived, and the bytes in them not yet read
+        if self.index >= len(self.blocks) and self.loop and self.blocks:
+            self.index = 0
+            self.offset = 0
+            self.start = time.perf_counter()
+        now = self._elapsed()
+        end = self.index
+        waiting = -self.offset
+        while end < len(self.blocks) and self.stamps[end] <= now:
+            waiting += len(self.blocks[end])
+            end += 1
+        return end, max(0, waiting)
+
+    @property
+    def in_waiting(self):
+        """! Number of bytes which can be read without waiting """
+        return self._available()[1]
+
+    @property
+    def finished(self):
+        """! True once every byte of the capture has been read, or if it has none """
+        return not self.blocks or (self.index >= len(self.blocks) and not self.loop)
+
+    def read(self, size=1):
+        """!
+        Reads up to the given number of bytes, waiting up to the timeout for
+        the first one, as serial.Serial does.
+        @param size largest number of bytes to read
+        @returns the bytes read, which may be empty
+        """
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while True:
+            end, waiting = self._available()
+            if waiting or self.finished or time.perf_counter() >= deadline:
+                break
+            # Sleeps until the next block is due, or the timeout
+            due = self.start + self.stamps[self.index] / self.speed
+            time.sleep(max(0.0, min(due, deadline) - time.perf_counter()))
+        if not waiting:
+            if self.finished and self.timeout:
+                time.sleep(self.timeout)
+            return b''
+
+        parts = []
+        while size > 0 and self.index < end:
+            block = self.blocks[self.index]
+            piece = block[self.offset:self.offset + size]
+            parts.append(piece)
+            size -= len(piece)
+            self.offset += len(piece)
+            if self.offset == len(block):
+                self.index += 1
+                self.offset = 0
+        return b''.join(parts)
+
+    def write(self, data):
+        """!
+        Keeps bytes sent to the board, which has nobody to receive them.
+        @param data bytes to send
+        @returns the number of bytes sent
+        """
+        self.written.append(bytes(data))
+        return len(data)
+
+    def reset_input_buffer(self):
+        """! Skips every byte which has already arrived """
+        end, _ = self._available()
+        self.index = end
+        self.offset = 0
+
+    def reset_output_buffer(self):
+        """! Does nothing, as nothing is ever waiting to be sent """
+
+    def close(self):
+        """! Stops the playback """
+        self.is_open = False
+
+
+def simulated_capture(path, duration_ms=20000, block=64, repeat=1):
+    """!
+    Makes a capture file of the printed output of the first motor task of
+    main.py, run in the lockstep simulation, for testing without a board.
+    Output is cut into blocks spread evenly over the run.
+    @param path name of the capture file
+    @param duration_ms amount of simulated time to run for, in ms
+    @param block number of bytes in each recorded block
+    @param repeat number of copies of the run to record, one after another
+    @returns the number of bytes recorded
+    """
+    import lockstep
+    sched = lockstep.run_main(duration_ms)
+    data = ''.join(sched.tasks[0].output).encode() * repeat
+    count = max(1, (len(data) + block - 1) // block)
+    step = duration_ms * repeat / 1000 / count
+    save(path, [(READ, i * step, data[i * block:(i + 1) * block]) for i in range(count)])
+    return len(data)
+
+
+# This code replays a capture (or a simulated one) through the same decoding
+# used by the GUI, as fast as possible, and prints how fast it went
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import os
+    import bulk_parse
+
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'sim.srl')
+        simulated_capture(path, repeat=5000)
+
+    ser = ReplaySerial(path, speed=None, timeout=0)
+    decoder = bulk_parse.CsvChunker()
+    samples = 0
+    runs = 0
+    total = 0
+    start = time.perf_counter()
+    while not ser.finished:
+        data = ser.read(max(1, ser.in_waiting))
+        total += len(data)
+        for item in decoder.feed(data):
+            if item is bulk_parse.END_OF_RUN:
+                runs += 1
+            else:
+                samples += len(item[0])
+    elapsed = time.perf_counter() - start
+    print(f'Replayed {total} bytes ({samples} samples, {runs} runs) '
+          f'in {elapsed * 1000:.1f} ms')
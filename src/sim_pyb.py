@@ -0,0 +1,805 @@
+"""!
+@file sim_pyb.py
+This file contains a host-side simulation of the parts of the MicroPython
+@c pyb and @c utime modules used by this project, so that the unmodified
+motor, encoder and controller code (and the task generators in main.py) can
+run on a regular computer. PWM channels drive a simulated DC motor with a
+flywheel, and the motor's position is fed back through a simulated quadrature
+encoder timer with the same 16-bit wrap as the real hardware.
+
+Calling install() places the simulated modules in @c sys.modules, after which
+@c import @c pyb and @c import @c utime pick up the simulation.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import sys
+import math
+import time
+import types
+
+
+## Period of the MicroPython ticks_ms()/ticks_us() counters
+TICKS_PERIOD = 1 << 30
+
+
+class WallClock:
+    """!
+    This class implements a clock for the simulation that follows the real
+    time of the computer, in microseconds since the clock was created.
+    """
+
+    def __init__(self):
+        """!
+        Initializes the clock, setting the current time to zero.
+        """
+        self.origin = time.perf_counter_ns()
+
+    def now_us(self):
+        """!
+        Reads the current time of the clock.
+        @returns the number of microseconds since the clock was created
+        """
+        return (time.perf_counter_ns() - self.origin) // 1000
+
+    def sleep_us(self, us):
+        """!
+        Waits for the given number of microseconds of real time.
+        @param us number of microseconds to wait
+        """
+        if us > 0:
+            time.sleep(us / 1000000)
+
+
+class VirtualClock:
+    """!
+    This class implements a clock for the simulation which only moves when
+    told to. Waiting on this clock takes no real time, and runs which use it
+    give the same results every time.
+    """
+
+    def __init__(self, start_us=0):
+        """!
+        Initializes the clock.
+        @param start_us starting time of the clock, in microseconds
+        """
+        self.now = int(start_us)
+
+    def now_us(self):
+        """!
+        Reads the current time of the clock.
+        @returns the current simulated time in microseconds
+        """
+        return self.now
+
+    def sleep_us(self, us):
+        """!
+        Moves the clock forward, as code waiting on the board would.
+        @param us number of microseconds to wait
+        """
+        if us > 0:
+            self.now += int(us)
+
+    def advance_to(self, t_us):
+        """!
+        Moves the clock forward to the given time. The clock never moves back.
+        @param t_us time to move to, in microseconds
+        """
+        if t_us > self.now:
+            self.now = int(t_us)
+
+
+class MotorPlant:
+    """!
+    This class implements a model of a DC motor driving a flywheel. The
+    speed follows the duty cycle through a first order lag, with a deadband
+    on the duty cycle and Coulomb friction (which also holds the motor at rest
+    when the drive is too weak to overcome it). Between changes to the duty
+    cycle the model is solved exactly, so the result does not depend on how
+    often it is advanced.
+    """
+
+    def __init__(self, gain=150.0, tau=0.1, deadband=10.0, friction=1000.0):
+        """!
+        Initializes the motor at rest at position zero.
+        @param gain steady-state speed per percent of duty cycle, in
+               encoder counts per second
+        @param tau mechanical time constant of the motor and flywheel, in seconds
+        @param deadband duty cycle, in percent, below which the motor does
+               not produce torque
+        @param friction Coulomb friction deceleration, in encoder counts
+               per second squared
+        """
+        self.gain = float(gain)
+        self.tau = float(tau)
+        self.deadband = float(deadband)
+        self.friction = float(friction)
+
+        # State of the motor
+        self.duty = 0.0
+        self.position = 0.0
+        self.velocity = 0.0
+
+    @classmethod
+    def from_file(cls, path):
+        """!
+        Makes a motor using settings saved in a JSON file, such as the ones
+        written by plant_id.py.
+        @param path name of the file
+        @returns the new MotorPlant
+        """
+        import json
+        with open(path) as file:
+            return cls(**json.load(file))
+
+    def set_duty(self, duty):
+        """!
+        Sets the duty cycle applied to the motor.
+        @param duty signed duty cycle in percent, positive values turn the
+               motor in the direction of increasing encoder count
+        """
+        self.duty = float(duty)
+
+    def advance(self, dt):
+        """!
+        Moves the motor forward in time with the current duty cycle.
+        @param dt amount of time to simulate, in seconds
+        """
+        tau = self.tau
+
+        # Portion of the duty cycle left after the deadband
+        duty = self.duty
+        if abs(duty) <= self.deadband:
+            drive = 0.0
+        elif duty > 0:
+            drive = self.gain * (duty - self.deadband)
+        else:
+            drive = self.gain * (duty + self.deadband)
+
+        # Friction expressed as a change in the steady-state speed
+        drag = self.friction * tau
+
+        # Each pass solves a stretch in which the direction of motion does
+        # not change. At most two passes are needed: one until the motor
+        # stops and one after it starts again.
+        while dt > 0:
+            w = self.velocity
+            if w == 0:
+                # Static friction keeps the motor at rest
+                if abs(drive) <= drag:
+                    return
+                direction = 1 if drive > 0 else -1
+            else:
+                direction = 1 if w > 0 else -1
+
+            w_ss = drive - drag * direction
+
+            # If the steady-state speed opposes the motion, the motor
+            # stops partway through the stretch
+            if w_ss * direction >= 0:
+                seg = dt
+            else:
+                seg = min(dt, tau * math.log((w - w_ss) / -w_ss))
+
+            decay = math.exp(-seg / tau)
+            self.position += w_ss * seg + (w - w_ss) * tau * (1 - decay)
+            if seg < dt:
+                self.velocity = 0.0
+            else:
+                self.velocity = w_ss + (w - w_ss) * decay
+            dt -= seg
+
+
+class Rig:
+    """!
+    This class connects a simulated motor to the PWM timer that drives it
+    and the encoder timer that measures it.
+    """
+
+    def __init__(self, pwm_timer, enc_timer, plant=None, en_pin=None):
+        """!
+        Initializes the connection between the timers and the motor.
+        @param pwm_timer number of the timer whose channels 1 and 2 drive the motor
+        @param enc_timer number of the timer used as the quadrature encoder
+        @param plant MotorPlant which is driven, a default one is made if None
+        @param en_pin name of the enable pin, or None for always enabled
+        """
+        self.pwm_timer = pwm_timer
+        self.enc_timer = enc_timer
+        self.plant = plant if plant is not None else MotorPlant()
+        self.en_pin = en_pin
+
+
+class World:
+    """!
+    This class holds the state of the whole simulation: the clock, the
+    timers and pins created by the code under test, and the motors wired
+    to them.
+    """
+
+    def __init__(self, clock=None, rigs=None):
+        """!
+        Initializes the simulation.
+        @param clock clock used for time, a WallClock is used if None
+        @param rigs list of Rig objects; if None the two motors used
+               in main.py are connected
+        """
+        self.clock = clock if clock is not None else WallClock()
+        if rigs is None:
+            rigs = [Rig(3, 8, en_pin='PA10'), Rig(5, 4, en_pin='PC1')]
+        self.rigs = rigs
+        self.timers = {}
+        self.pins = {}
+        self.last_us = self.clock.now_us()
+
+        # Bytes sent to and by the board over the USB serial port
+        self.serial_in = bytearray()
+        self.serial_out = bytearray()
+
+    def sync(self):
+        """!
+        Advances every motor up to the current time of the clock. This is
+        called before any timer is read or changed.
+        """
+        now = self.clock.now_us()
+        dt = now - self.last_us
+        if dt > 0:
+            self.last_us = now
+            for rig in self.rigs:
+                rig.plant.advance(dt / 1000000)
+
+    def next_callback_us(self):
+        """!
+        Finds when the next timer callback is due.
+        @returns the time of the next callback in microseconds, or None if
+                 no timer has a callback
+        """
+        soonest = None
+        for timer in self.timers.values():
+            if timer._callback is not None and (
+                    soonest is None or timer._next_us < soonest):
+                soonest = timer._next_us
+        return soonest
+
+    def advance_to(self, t_us):
+        """!
+        Moves a VirtualClock forward to the given time, running every timer
+        callback which falls due on the way at its own time, as the timer
+        interrupts on the board would. Timer callbacks only run when time is
+        moved forward this way.
+        @param t_us time to move to, in microseconds
+        """
+        while True:
+            due = self.next_callback_us()
+            if due is None or due > t_us:
+                break
+            self.clock.advance_to(due)
+            for timer in list(self.timers.values()):
+                if timer._callback is not None and timer._next_us <= due:
+                    timer._next_us += timer.period_us()
+                    timer._callback(timer)
+        self.clock.advance_to(t_us)
+
+    def rig_for_pwm(self, timer_id):
+        """!
+        Finds the motor driven by a PWM timer.
+        @param timer_id number of the timer
+        @returns the Rig driven by the timer, or None
+        """
+        for rig in self.rigs:
+            if rig.pwm_timer == timer_id:
+                return rig
+        return None
+
+    def rig_for_encoder(self, timer_id):
+        """!
+        Finds the motor measured by an encoder timer.
+        @param timer_id number of the timer
+        @returns the Rig measured by the timer, or None
+        """
+        for rig in self.rigs:
+            if rig.enc_timer == timer_id:
+                return rig
+        return None
+
+    def update_drive(self, timer_id):
+        """!
+        Recomputes the duty cycle applied to the motor driven by a timer
+        after one of its channels or its enable pin changed.
+        @param timer_id number of the PWM timer
+        """
+        rig = self.rig_for_pwm(timer_id)
+        timer = self.timers.get(timer_id)
+        if rig is None or timer is None:
+            return
+        self.sync()
+        duty = timer.percent(1) - timer.percent(2)
+        pin = self.pins.get(rig.en_pin)
+        if pin is not None and not pin.value():
+            duty = 0.0
+        rig.plant.set_duty(duty)
+
+
+## Simulation used by the modules made by install()
+world = None
+
+
+class _Board:
+    """!
+    This class stands in for @c pyb.Pin.board, returning the name of any
+    pin asked for.
+    """
+
+    def __getattr__(self, name):
+        return name
+
+
+class Pin:
+    """!
+    This class implements a simulated GPIO pin.
+    """
+    board = _Board()
+
+    IN = 0
+    OUT_PP = 1
+    OPEN_DRAIN = 2
+    AF_PP = 3
+    AF_OD = 4
+    ANALOG = 5
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, name, mode=IN, pull=PULL_NONE, value=None, af=-1):
+        """!
+        Initializes the pin.
+        @param name name of the pin, such as 'PA10'
+        @param mode mode of the pin
+        @param pull pull up or pull down setting
+        @param value initial output value
+        @param af alternate function, ignored by the simulation
+        """
+        self.name = name
+        self.mode = mode
+        self.pull = pull
+        self._value = 1 if value else 0
+        world.pins[name] = self
+
+    def value(self, value=None):
+        """!
+        Reads or sets the value of the pin.
+        @param value new value, or None to read the value
+        @returns the value of the pin when reading
+        """
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+        for rig in world.rigs:
+            if rig.en_pin == self.name:
+                world.update_drive(rig.pwm_timer)
+
+    def high(self):
+        """! Sets the pin high. """
+        self.value(1)
+
+    def low(self):
+        """! Sets the pin low. """
+        self.value(0)
+
+
+class TimerChannel:
+    """!
+    This class implements a simulated timer channel, used either as a PWM
+    output or as an encoder input.
+    """
+
+    def __init__(self, timer, number, mode, pin):
+        """!
+        Initializes the channel.
+        @param timer Timer which owns the channel
+        @param number channel number
+        @param mode channel mode, such as Timer.PWM
+        @param pin pin connected to the channel
+        """
+        self.timer = timer
+        self.number = number
+        self.mode = mode
+        self.pin = pin
+        self._compare = 0
+
+    def pulse_width(self, width=None):
+        """!
+        Reads or sets the compare value of the channel in timer counts.
+        @param width new compare value, or None to read it
+        @returns the compare value when reading
+        """
+        if width is None:
+            return self._compare
+        self._compare = max(0, min(int(width), self.timer.period() + 1))
+        world.update_drive(self.timer.id)
+
+    def pulse_width_percent(self, value=None):
+        """!
+        Reads or sets the compare value of the channel as a percentage of
+        the timer period. Values outside 0 to 100 are clipped, as on the board.
+        @param value new duty cycle in percent, or None to read it
+        @returns the duty cycle in percent when reading
+        """
+        if value is None:
+            return self._compare * 100 / (self.timer.period() + 1)
+        value = max(0.0, min(float(value), 100.0))
+        self._compare = int(value * (self.timer.period() + 1) / 100 + 0.5)
+        world.update_drive(self.timer.id)
+
+    def capture(self, value=None):
+        """!
+        Reads or sets the capture value of the channel.
+        @param value new capture value, or None to read it
+        @returns the capture value when reading
+        """
+        return self.pulse_width(value)
+
+    compare = capture
+
+
+class Timer:
+    """!
+    This class implements a simulated hardware timer.
+    """
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    IC = 6
+    ENC_A = 7
+    ENC_B = 8
+    ENC_AB = 9
+    UP = 0
+    DOWN = 1
+    CENTER = 2
+
+    ## Clock feeding the timers, as on the Nucleo L476RG
+    SOURCE_FREQ = 80000000
+
+    def __init__(self, id, freq=None, prescaler=0, period=0xFFFF, mode=UP,
+                 callback=None, **kwargs):
+        """!
+        Initializes the timer.
+        @param id number of the timer
+        @param freq frequency of the timer; sets the prescaler and period
+        @param prescaler prescaler of the timer
+        @param period period of the timer, in timer counts
+        @param mode counting mode of the timer
+        @param callback function called at every update of the timer
+        """
+        self.id = id
+        self._next_us = 0
+        self._channels = {}
+        self._offset = 0
+        self._counter = 0
+        self.init(freq=freq, prescaler=prescaler, period=period, mode=mode,
+                  callback=callback)
+        world.timers[id] = self
+
+    def init(self, freq=None, prescaler=0, period=0xFFFF, mode=UP,
+             callback=None, **kwargs):
+        """!
+        Sets up the timer, with the same arguments as the constructor.
+        """
+        if freq is not None:
+            # Smallest prescaler which fits the period in 16 bits
+            ticks = max(1, int(self.SOURCE_FREQ / freq))
+            prescaler = (ticks - 1) // 0x10000
+            period = ticks // (prescaler + 1) - 1
+        self._prescaler = prescaler
+        self._period = period
+        self.mode = mode
+        self.callback(callback)
+
+    def freq(self):
+        """!
+        @returns the update frequency of the timer in Hz
+        """
+        return self.SOURCE_FREQ / ((self._prescaler + 1) * (self._period + 1))
+
+    def prescaler(self, value=None):
+        """!
+        Reads or sets the prescaler of the timer.
+        """
+        if value is None:
+            return self._prescaler
+        self._prescaler = value
+
+    def period(self, value=None):
+        """!
+        Reads or sets the period of the timer.
+        """
+        if value is None:
+            return self._period
+        self._period = value
+
+    def source_freq(self):
+        """!
+        @returns the frequency of the clock feeding the timer
+        """
+        return self.SOURCE_FREQ
+
+    def callback(self, fun):
+        """!
+        Sets the function called at every update of the timer.
+        @param fun function taking the timer as its argument, or None
+        """
+        self._callback = fun
+        if fun is not None:
+            self._next_us = world.clock.now_us() + self.period_us()
+
+    def period_us(self):
+        """!
+        @returns the time between updates of the timer, in whole microseconds
+        """
+        return max(1, int(round(1000000 / self.freq())))
+
+    def deinit(self):
+        """!
+        Turns the timer off, stopping any callback.
+        """
+        self._callback = None
+
+    def channel(self, number, mode=None, pin=None, **kwargs):
+        """!
+        Sets up or returns a channel of the timer.
+        @param number channel number
+        @param mode channel mode, or None to return an existing channel
+        @param pin pin used by the channel
+        @returns the TimerChannel object
+        """
+        if mode is None:
+            return self._channels.get(number)
+        ch = TimerChannel(self, number, mode, pin)
+        if 'pulse_width_percent' in kwargs:
+            ch._compare = int(kwargs['pulse_width_percent']
+                              * (self._period + 1) / 100 + 0.5)
+        elif 'pulse_width' in kwargs:
+            ch._compare = kwargs['pulse_width']
+        self._channels[number] = ch
+        world.update_drive(self.id)
+        return ch
+
+    def percent(self, number):
+        """!
+        Gets the duty cycle of a PWM channel, as seen by the motor.
+        @param number channel number
+        @returns the duty cycle in percent, zero if the channel is not set up
+        """
+        ch = self._channels.get(number)
+        if ch is None or ch.mode != Timer.PWM:
+            return 0.0
+        return ch._compare * 100 / (self._period + 1)
+
+    def counter(self, value=None):
+        """!
+        Reads or sets the counter of the timer. The counter of a timer used
+        as an encoder follows the position of its motor, wrapping around at
+        the period.
+        @param value new counter value, or None to read it
+        @returns the counter value when reading
+        """
+        rig = world.rig_for_encoder(self.id)
+        if rig is None:
+            if value is None:
+                return self._counter
+            self._counter = value
+            return
+        world.sync()
+        position = int(math.floor(rig.plant.position))
+        if value is None:
+            return (position + self._offset) % (self._period + 1)
+        self._offset = value - position
+
+
+class USB_VCP:
+    """!
+    This class stands in for @c pyb.USB_VCP, the USB serial port. Bytes
+    put in the world's serial_in can be read by the board, and bytes
+    written by the board are kept in serial_out.
+    """
+
+    def any(self):
+        """! @returns True if there are bytes waiting to be read """
+        return len(world.serial_in) > 0
+
+    def read(self, nbytes=None):
+        """!
+        Reads waiting bytes.
+        @param nbytes largest number of bytes to read, or None for all
+        @returns the bytes read, or None if there were none
+        """
+        data = world.serial_in
+        if not data:
+            return None
+        count = len(data) if nbytes is None else min(nbytes, len(data))
+        chunk = bytes(data[:count])
+        del data[:count]
+        return chunk
+
+    def readinto(self, buf):
+        """!
+        Reads waiting bytes into a buffer.
+        @param buf buffer to fill
+        @returns the number of bytes read, or None if there were none
+        """
+        chunk = self.read(len(buf))
+        if chunk is None:
+            return None
+        buf[:len(chunk)] = chunk
+        return len(chunk)
+
+    def write(self, data):
+        """!
+        Sends bytes to the computer.
+        @param data bytes to send
+        @returns the number of bytes sent
+        """
+        world.serial_out += data
+        return len(data)
+
+
+def _ticks(now):
+    return now % TICKS_PERIOD
+
+
+def ticks_us():
+    """! @returns the simulated microsecond tick counter """
+    return _ticks(world.clock.now_us())
+
+
+def ticks_ms():
+    """! @returns the simulated millisecond tick counter """
+    return _ticks(world.clock.now_us() // 1000)
+
+
+def ticks_cpu():
+    """! @returns the simulated high resolution tick counter """
+    return ticks_us()
+
+
+def ticks_diff(end, start):
+    """!
+    Finds the signed difference between two tick values, allowing for wrap.
+    @param end later tick value
+    @param start earlier tick value
+    @returns end minus start
+    """
+    half = TICKS_PERIOD // 2
+    return ((end - start + half) % TICKS_PERIOD) - half
+
+
+def ticks_add(ticks, delta):
+    """!
+    Offsets a tick value, allowing for wrap.
+    @param ticks tick value
+    @param delta signed offset
+    @returns the new tick value
+    """
+    return (ticks + delta) % TICKS_PERIOD
+
+
+def sleep_us(us):
+    """! Waits for the given number of microseconds. """
+    world.clock.sleep_us(us)
+
+
+def sleep_ms(ms):
+    """! Waits for the given number of milliseconds. """
+    world.clock.sleep_us(ms * 1000)
+
+
+def sleep(s):
+    """! Waits for the given number of seconds. """
+    world.clock.sleep_us(int(s * 1000000))
+
+
+def disable_irq():
+    """!
+    Stands in for pyb.disable_irq(). Simulated timer callbacks only run
+    between tasks, so there is nothing to hold off.
+    @returns the interrupt state to give to enable_irq()
+    """
+    return True
+
+
+def enable_irq(state=True):
+    """! Stands in for pyb.enable_irq(). """
+
+
+def _module(name, doc, members):
+    mod = types.ModuleType(name, doc)
+    for key, value in members.items():
+        setattr(mod, key, value)
+    return mod
+
+
+def install(sim=None):
+    """!
+    Places simulated @c pyb and @c utime modules in @c sys.modules so that
+    code written for the board can be imported on a computer. If @c cotask
+    cannot be imported (it is copied to the board, not kept here) an empty
+    module is used in its place so that main.py can be imported.
+    @param sim World to use, a new one with the default motors if None
+    @returns the World in use
+    """
+    global world
+    world = sim if sim is not None else World()
+
+    sys.modules['pyb'] = _module('pyb', 'Simulated pyb module', {
+        'Pin': Pin,
+        'Timer': Timer,
+        'USB_VCP': USB_VCP,
+        'millis': ticks_ms,
+        'micros': ticks_us,
+        'delay': sleep_ms,
+        'disable_irq': disable_irq,
+        'enable_irq': enable_irq,
+        'udelay': sleep_us,
+        'elapsed_millis': lambda start: ticks_diff(ticks_ms(), start),
+        'elapsed_micros': lambda start: ticks_diff(ticks_us(), start),
+    })
+    sys.modules['utime'] = _module('utime', 'Simulated utime module', {
+        'ticks_us': ticks_us,
+        'ticks_ms': ticks_ms,
+        'ticks_cpu': ticks_cpu,
+        'ticks_diff': ticks_diff,
+        'ticks_add': ticks_add,
+        'sleep_us': sleep_us,
+        'sleep_ms': sleep_ms,
+        'sleep': sleep,
+        'time': lambda: world.clock.now_us() // 1000000,
+    })
+
+    if 'cotask' not in sys.modules:
+        try:
+            import cotask
+        except ImportError:
+            sys.modules['cotask'] = types.ModuleType('cotask',
+                                                     'Placeholder for cotask')
+    return world
+
+
+# This code runs both motor tasks from main.py back to back, as fast as the
+# computer allows, and prints how many times per second each task ran and
+# how long each run took.
+if __name__ == "__main__":
+    import io
+    import contextlib
+
+    install()
+    import main
+
+    tasks = [('Task_1', main.task1_fun()), ('Task_2', main.task2_fun())]
+    runs = [0] * len(tasks)
+    worst = [0.0] * len(tasks)
+    total = [0.0] * len(tasks)
+
+    # Output printed by the tasks is kept out of the way
+    out = io.StringIO()
+    duration = 2.0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        while time.perf_counter() - start < duration:
+            for i, (name, gen) in enumerate(tasks):
+                t0 = time.perf_counter()
+                next(gen)
+                t = time.perf_counter() - t0
+                runs[i] += 1
+                total[i] += t
+                if t > worst[i]:
+                    worst[i] = t
+
+    for i, (name, gen) in enumerate(tasks):
+        print(f"{name}: {runs[i] / duration:.0f} runs/s, "
+              f"mean {total[i] / runs[i] * 1e6:.1f} us, "
+              f"max {worst[i] * 1e6:.1f} us")
+    print(f"{out.getvalue().count(chr(10))} lines printed by the tasks")
@@ -12,85 +12,492 @@ This file uses a template for the GUI, given by Dr. John Ridgely
 """
 
 ## List of imports needed to run the program
-import time
+import queue
+import threading
 import tkinter
+from collections import namedtuple
 import serial
+import bulk_parse
+import step_metrics
+import run_archive
+import serial_replay
+import decimate
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,
                                                NavigationToolbar2Tk)
 
 
-def plot_example(plot_axes, plot_canvas, xlabel, ylabel, ser, x_values, y_values, title):
+## Time between redraws of a plot which is still coming in, in ms
+FRAME_MS = 50
+
+## Setpoint of the motor being plotted, as set in main.py, used to work out
+## the step response numbers shown in the legend
+SETPOINT = 10000
+
+## Period of the task running the motor being plotted, as set in main.py,
+## saved with each run
+PERIOD_MS = 100
+
+## Largest number of archived runs drawn at once
+OVERLAY_LIMIT = 50
+
+## Put in a SerialReader's queue at the end of each run
+END_OF_RUN = bulk_parse.END_OF_RUN
+
+## One timing histogram printed by latency.py. The counts are a list with one
+## entry per bin, the last of which also holds every larger value.
+TimingHistogram = namedtuple('TimingHistogram', 'axis kind width_us largest counts')
+
+
+def parse_histogram_line(line):
+    """!
+    Decodes one timing histogram line printed by latency.py.
+    @param line line of text starting with 'H,'
+    @returns a TimingHistogram, or None if the line is not a histogram
+    """
+    values = line.strip().split(',')
+    if len(values) < 6 or values[0] != 'H':
+        return None
+    try:
+        counts = [int(value) for value in values[5:]]
+        return TimingHistogram(int(values[1]), values[2], int(values[3]),
+                               int(values[4]), counts)
+    except ValueError:
+        return None
+
+
+def histogram_summary(hist):
+    """!
+    Works out the mean and 99th percentile of a timing histogram, using the
+    middle of each bin.
+    @param hist TimingHistogram to summarize
+    @returns a (count, mean_us, p99_us) tuple
+    """
+    total = sum(hist.counts)
+    if not total:
+        return 0, 0.0, 0.0
+    mids = [(i + 0.5) * hist.width_us for i in range(len(hist.counts))]
+    mean = sum(m * c for m, c in zip(mids, hist.counts)) / total
+    running = 0
+    p99 = mids[-1]
+    for mid, count in zip(mids, hist.counts):
+        running += count
+        if running >= 0.99 * total:
+            p99 = mid
+            break
+    return total, mean, p99
+
+
+class BoardCommands:
+    """!
+    This class sends commands to the command task on the board (see
+    commands.py), so gains, setpoints and periods can be changed and runs
+    started while the board is running. Answers show up in the replies list
+    of the SerialReader.
+    """
+
+    def __init__(self, ser):
+        """!
+        Initializes the sender.
+        @param ser The serial object to write to
+        """
+        self.ser = ser
+
+    def send(self, text):
+        """!
+        Sends one command line.
+        @param text the command, without a line ending
+        """
+        self.ser.write((text + '\r\n').encode())
+
+    def set_kp(self, axis, gain):
+        """!
+        Sets the proportional gain of an axis.
+        @param axis axis (motor) number
+        @param gain gain in percent duty cycle per encoder count
+        """
+        self.send(f'K{axis} {gain:g}')
+
+    def set_setpoint(self, axis, position):
+        """!
+        Sets the setpoint of an axis.
+        @param axis axis (motor) number
+        @param position setpoint in encoder counts
+        """
+        self.send(f'S{axis} {int(position)}')
+
+    def set_period(self, axis, period_ms):
+        """!
+        Sets the period of the task running an axis.
+        @param axis axis (motor) number
+        @param period_ms period in ms
+        """
+        self.send(f'P{axis} {period_ms:g}')
+
+    def start_run(self, axis=0):
+        """!
+        Starts a new step response on an axis.
+        @param axis axis (motor) number
+        """
+        self.send(f'R{axis}')
+
+    def query_stats(self):
+        """!
+        Asks the board to print its timing histograms.
+        """
+        self.send('?')
+
+
+class SerialReader(threading.Thread):
+    """!
+    This class reads the serial port in a background thread so the GUI never
+    waits on it. Whatever has arrived is decoded in one block by bulk_parse
+    and put in a queue as (times, positions) pairs of arrays; the end of a
+    run is marked by putting END_OF_RUN in the queue.
+    """
+
+    def __init__(self, ser, binary=False, axis=0):
+        """!
+        Initializes the reader. Call start() to begin reading.
+        @param ser The serial object to read from
+        @param binary True if the board sends binary frames instead of .CSV lines
+        @param axis axis (motor) plotted when reading binary frames; frames
+               of other axes are skipped
+        """
+        super().__init__(daemon=True)
+        self.ser = ser
+        self.binary = binary
+        self.queue = queue.Queue()
+        self.decoder = bulk_parse.FrameChunker(axis) if binary else bulk_parse.CsvChunker()
+        self.stopping = threading.Event()
+        
+        # Latest timing histogram for each (axis, kind)
+        self.histograms = {}
+        
+        # Commands to the board, and the answers received
+        self.commands = BoardCommands(ser)
+        self.replies = []
+        
+        # LivePlot taking samples from the queue, if one is running
+        self.plot = None
+
+    def run(self):
+        """!
+        Reads the serial port until stop() is called.
+        """
+        while not self.stopping.is_set():
+            # Waits for at most the serial timeout when nothing is coming in
+            data = self.ser.read(max(1, self.ser.in_waiting))
+            if not data:
+                continue
+            
+            # Everything which has arrived is decoded in one go. A block
+            # which cannot be decoded is skipped, so the thread keeps going
+            try:
+                for item in self.decoder.feed(data):
+                    self.queue.put(item)
+                self.collect_histograms()
+                self.collect_replies()
+            except Exception as err:
+                print(f"Skipped data which could not be read: {err}")
+
+    def collect_replies(self):
+        """!
+        Keeps any answers to commands found by the decoder, printing errors.
+        """
+        lines = getattr(self.decoder, 'replies', None)
+        while lines:
+            reply = lines.pop(0)
+            if reply.startswith('err'):
+                print(f"Board: {reply}")
+            self.replies.append(reply)
+
+    def collect_histograms(self):
+        """!
+        Keeps any timing histograms found by the decoder.
+        """
+        lines = getattr(self.decoder, 'histograms', None)
+        while lines:
+            hist = parse_histogram_line(lines.pop(0))
+            if hist is not None:
+                self.histograms[(hist.axis, hist.kind)] = hist
+
+    def query_timing(self):
+        """!
+        Asks the board to print its timing histograms; they show up in
+        the histograms dictionary once they arrive.
+        """
+        self.commands.query_stats()
+
+    def stop(self):
+        """!
+        Asks the thread to finish, which it does within the serial timeout.
+        """
+        self.stopping.set()
+
+    def discard(self):
+        """!
+        Throws away anything queued but not yet plotted.
+        """
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class LivePlot:
     """!
-    Makes two plots, the experimental and theoretical output
+    This class draws a step response while it is still coming in. A Tk timer
+    takes whatever the SerialReader has queued at a fixed frame rate and adds
+    it to the line, so the drawing cost does not depend on how fast data
+    arrives. Only the line is redrawn (blitted) unless the axes need to grow.
+    The line only holds the points which can be seen at the width of the
+    plot (see decimate.py), so long runs stay quick to draw.
+    """
+
+    def __init__(self, plot_axes, plot_canvas, reader, x_values, y_values,
+                 label=None, setpoint=None):
+        """!
+        Initializes the plot with an empty dashed line.
+        @param plot_axes The plot axes supplied by Matplotlib
+        @param plot_canvas The plot canvas supplied by Matplotlib
+        @param reader SerialReader supplying the samples
+        @param x_values list which receives the time of each sample
+        @param y_values list which receives the position of each sample
+        @param label name of the run shown in the legend, or None for no legend
+        @param setpoint setpoint of the run, used for the step response
+               numbers shown after the name; the final position if None
+        """
+        self.label = label
+        self.setpoint = setpoint
+        self.axes = plot_axes
+        self.canvas = plot_canvas
+        self.reader = reader
+        self.x_values = x_values
+        self.y_values = y_values
+        self.line, = plot_axes.plot([], [], linestyle='dashed', animated=True)
+        self.trace = decimate.DecimatedLine(plot_axes, line=self.line)
+        self.background = None
+        self.fitted = False
+        self.done = False
+        self.cancelled = False
+
+    def start(self):
+        """!
+        Draws everything but the line and starts the frame timer.
+        """
+        self.redraw()
+        self.canvas.get_tk_widget().after(FRAME_MS, self.update)
+
+    def cancel(self):
+        """!
+        Stops taking samples, such as when the axes are cleared before the
+        run has ended.
+        """
+        self.cancelled = True
+
+    def redraw(self):
+        """!
+        Draws the whole figure and keeps a copy of it without the line, so
+        later frames only need to draw the line on top.
+        """
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.axes.draw_artist(self.line)
+        self.canvas.blit(self.axes.bbox)
+
+    def grow_limits(self, x_max, y_min, y_max):
+        """!
+        Makes the axes bigger if the data no longer fits, leaving room to
+        spare so that this happens rarely.
+        @param x_max latest time in the new samples
+        @param y_min smallest position in the new samples
+        @param y_max largest position in the new samples
+        @returns True if the limits were changed
+        """
+        x_low, x_high = self.axes.get_xlim()
+        y_low, y_high = self.axes.get_ylim()
+        
+        # The first samples set the limits, later ones only widen them
+        if not self.fitted:
+            x_high = y_high = float('-inf')
+            y_low = float('inf')
+            self.fitted = True
+        
+        changed = False
+        if x_max > x_high:
+            self.axes.set_xlim(0, max(x_max * 1.5, 1))
+            changed = True
+        if y_min < y_low or y_max > y_high:
+            y_low = min(y_min, y_low)
+            y_high = max(y_max, y_high)
+            span = max(y_high - y_low, 1)
+            self.axes.set_ylim(y_low - 0.1 * span, y_high + 0.1 * span)
+            changed = True
+        return changed
+
+    def update(self):
+        """!
+        Adds the queued samples to the line and draws it; runs once per frame.
+        """
+        if self.cancelled:
+            return
+        fresh = False
+        x_max = y_max = float('-inf')
+        y_min = float('inf')
+        while True:
+            try:
+                item = self.reader.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is END_OF_RUN:
+                self.done = True
+                break
+            times, positions = item
+            self.x_values.extend(times.tolist())
+            self.y_values.extend(positions.tolist())
+            x_max = max(x_max, times[-1])
+            y_min = min(y_min, positions.min())
+            y_max = max(y_max, positions.max())
+            fresh = True
+
+        if fresh:
+            self.trace.set_data(self.x_values, self.y_values)
+            if self.grow_limits(x_max, y_min, y_max):
+                self.redraw()
+            else:
+                self.canvas.restore_region(self.background)
+                self.axes.draw_artist(self.line)
+                self.canvas.blit(self.axes.bbox)
+
+        if self.done:
+            # The finished line becomes part of the figure like any other
+            self.line.set_animated(False)
+            if self.label is not None and self.y_values:
+                metrics = step_metrics.compute(self.x_values, [self.y_values], self.setpoint)
+                self.line.set_label(f"{self.label}: {step_metrics.summary(metrics)}")
+                self.axes.legend(fontsize='small')
+            self.trace.refresh(whole=True)
+            self.axes.relim()
+            self.axes.autoscale_view()
+            self.trace.refresh()
+            self.canvas.draw()
+        else:
+            self.canvas.get_tk_widget().after(FRAME_MS, self.update)
+
+
+def plot_example(plot_axes, plot_canvas, xlabel, ylabel, reader, x_values, y_values, title,
+                 gain):
+    """!
+    Sends the gain to the board and starts plotting the step response as it
+    comes in. This returns right away; the plot is filled in by a LivePlot.
+    Nothing is done while the last run is still being plotted, since both
+    plots would take samples from the same queue.
     @param plot_axes The plot axes supplied by Matplotlib
     @param plot_canvas The plot canvas supplied by Matplotlib
     @param xlabel The label for the plot's horizontal axis
     @param ylabel The label for the plot's vertical axis
-    @param ser The data read from the serial object
+    @param reader The SerialReader receiving data from the serial port
     @param x_values The x-values for the step response output
     @param y_values The y-values for the step response output
     @param title The title for the graph
+    @param gain The gain typed in by the user, as a string
     """
     
-    # Clears lists for data collection after run is pressed
-    x_values.clear()
-    y_values.clear()
+    if reader.plot is not None and not reader.plot.done and not reader.plot.cancelled:
+        print("The last run is still coming in. Wait for it, or press Clear to give up on it.")
+        return
     
-    # Clears values grabbed by the serial
-    x_value = 0
-    y_value = 0
+    # Checks the gain typed in by the user
+    try:
+        gain = float(gain)
+    except ValueError:
+        print("Invalid input. Please enter a valid float value.")
+        return
     
-    # Takes/sends input from user and sends carriage return for input in main
-    while True:
-        try:
-            inp = float(input("Set ur gain: ")) 
-            inp = str(inp) + '\r\n'
-            ser.reset_output_buffer()
-            ser.write(inp.encode())
-            break
-        
-        # In case the input is invalid
-        except ValueError:
-            print("Invalid input. Please enter a valid float value.") 
-
-    # Add delay to step response
-    time.sleep(2)
+    # Clears lists for data collection after run is pressed, along with
+    # anything left over from an earlier run
+    x_values.clear()
+    y_values.clear()
+    reader.discard()
     
-    while True:
-        # Converts the printed statements of the output to float and puts them in lists 
-        try:
-            response = ser.readline().decode('utf-8').strip()
-            
-            # Breaks loop if 'end' is printed in main
-            if response == 'end':
-                break
-            
-            values = response.split(',')
-            
-            x_value = int(values[0])
-            y_value = float(values[1])
-            
-            x_values.append(x_value)
-            y_values.append(y_value)
-            
-        except ValueError:
-            continue
-        
-        except IndexError:
-            print('index')
-            continue
+    # Sends the gain to the command task and starts the run
+    reader.ser.reset_output_buffer()
+    reader.commands.set_kp(0, gain)
+    reader.commands.start_run(0)
 
-    # Drawing the plot when Run is hit
-    
-    plot_axes.plot(x_values, y_values, linestyle='dashed')
+    # Drawing the plot while the run goes on
     plot_axes.set_xlabel(xlabel)
     plot_axes.set_ylabel(ylabel)
     plot_axes.set_title(title)
     plot_axes.grid(True)
+    reader.plot = LivePlot(plot_axes, plot_canvas, reader, x_values, y_values,
+                           label=f"Kp {gain:g}", setpoint=SETPOINT)
+    reader.plot.start()
+
+def clear_plot(plot_axes, plot_canvas, reader):
+    """!
+    Clears the plot, giving up on a run still being plotted.
+    @param plot_axes The plot axes supplied by Matplotlib
+    @param plot_canvas The plot canvas supplied by Matplotlib
+    @param reader The SerialReader receiving data from the serial port
+    """
+    if reader.plot is not None:
+        reader.plot.cancel()
+    plot_axes.clear()
     plot_canvas.draw()
 
-def tk_matplot(plot_function, xlabel, ylabel, title):
+def save_run(archive, x_values, y_values, gain):
+    """!
+    Saves the run on the plot to the archive.
+    @param archive run_archive.RunArchive receiving the run
+    @param x_values The x-values for the step response output
+    @param y_values The y-values for the step response output
+    @param gain The gain typed in by the user, as a string
+    """
+    if not y_values:
+        print("No run to save.")
+        return
+    try:
+        gain = float(gain)
+    except ValueError:
+        gain = None
+    run_id = archive.save(x_values, y_values, gain, SETPOINT, PERIOD_MS)
+    print(f"Saved run {run_id}")
+
+def overlay_runs(plot_axes, plot_canvas, archive, text):
+    """!
+    Draws archived runs on the plot, newest first.
+    @param plot_axes The plot axes supplied by Matplotlib
+    @param plot_canvas The plot canvas supplied by Matplotlib
+    @param archive run_archive.RunArchive holding the runs
+    @param text which runs to draw: blank for the latest ones, a gain such as
+           0.03, or a range of gains such as 0.02-0.05
+    """
+    text = text.strip()
+    try:
+        if not text:
+            runs = archive.find(limit=OVERLAY_LIMIT)
+        elif '-' in text[1:]:
+            low, high = text.split('-', 1)
+            runs = archive.find(gain_range=(float(low), float(high)), limit=OVERLAY_LIMIT)
+        else:
+            runs = archive.find(gain=float(text), limit=OVERLAY_LIMIT)
+    except ValueError:
+        print("Invalid filter. Enter a gain, a range of gains like 0.02-0.05, or nothing.")
+        return
+    
+    for run in runs:
+        times, positions = archive.load(run)
+        decimate.DecimatedLine(plot_axes, times, positions, linewidth=0.8, alpha=0.6,
+                               label=(f"#{run.id} Kp {run.gain:g}" if run.gain is not None
+                                      else f"#{run.id}"))
+    if runs:
+        plot_axes.legend(fontsize='small')
+    plot_canvas.draw()
+
+def tk_matplot(plot_function, xlabel, ylabel, title, binary=False, ser=None, record=None):
     """!
     This function receives the output from the serial port using the serial class.
     It then places the output in corresponding lists, used later for plotting. This
@@ -100,19 +507,31 @@ def tk_matplot(plot_function, xlabel, ylabel, title):
     @param xlabel The label for the plot's horizontal axis
     @param ylabel The label for the plot's vertical axis
     @param title A title for the plot
+    @param binary True if the board sends binary frames instead of .CSV lines
+    @param ser serial port object to use instead of opening COM3, such as a
+           serial_replay.ReplaySerial to play back a recorded session
+    @param record name of a file to record the session to, or None
     """
     
     # Parameters for serial port
     serial_port = 'COM3' 
     baud_rate = 115200
     
-    # Opens serial port
-    ser = serial.Serial(serial_port, baud_rate, timeout=0.5)
+    # Opens serial port and starts reading it in the background
+    if ser is None:
+        ser = serial.Serial(serial_port, baud_rate, timeout=0.5)
+    if record is not None:
+        ser = serial_replay.RecordingSerial(ser, record)
+    reader = SerialReader(ser, binary)
+    reader.start()
     
     # Initializes the lists used for plotting
     x_values = []
     y_values = []
     
+    # Runs saved from earlier sessions
+    archive = run_archive.RunArchive()
+    
     
     # Create the main program window and give it a title
     tk_root = tkinter.Tk()
@@ -126,27 +545,58 @@ def tk_matplot(plot_function, xlabel, ylabel, title):
     canvas = FigureCanvasTkAgg(fig, master=tk_root)
     toolbar = NavigationToolbar2Tk(canvas, tk_root, pack_toolbar=False)
     toolbar.update()
+    
+    # Box in which the user types the gain for the next run
+    gain_label = tkinter.Label(master=tk_root, text="Gain")
+    gain_entry = tkinter.Entry(master=tk_root, width=10)
+    
+    # Box in which the user picks archived runs to draw
+    filter_label = tkinter.Label(master=tk_root, text="History")
+    filter_entry = tkinter.Entry(master=tk_root, width=10)
 
     # Create the buttons that run tests, clear the screen, and exit the program
+    # Stops reading before closing the port, so a recording is complete
+    def quit_gui():
+        reader.stop()
+        reader.join()
+        archive.close()
+        ser.close()
+        tk_root.destroy()
+
     button_quit = tkinter.Button(master=tk_root,
                                  text="Quit",
-                                 command=tk_root.destroy)
+                                 command=quit_gui)
     button_clear = tkinter.Button(master=tk_root,
                                   text="Clear",
-                                  command=lambda: axes.clear() or canvas.draw())
+                                  command=lambda: clear_plot(axes, canvas, reader))
     button_run = tkinter.Button(master=tk_root,
                                 text="Run Test",
                                 command=lambda: plot_function(axes, canvas,
-                                                              xlabel, ylabel, ser, x_values, y_values, title))
+                                                              xlabel, ylabel, reader, x_values, y_values, title,
+                                                              gain_entry.get()))
+    button_save = tkinter.Button(master=tk_root,
+                                 text="Save Run",
+                                 command=lambda: save_run(archive, x_values, y_values,
+                                                          gain_entry.get()))
+    button_overlay = tkinter.Button(master=tk_root,
+                                    text="Overlay",
+                                    command=lambda: overlay_runs(axes, canvas, archive,
+                                                                 filter_entry.get()))
 
                                 
 
     # Arrange things in a grid because "pack" is weird
-    canvas.get_tk_widget().grid(row=0, column=0, columnspan=3)
-    toolbar.grid(row=1, column=0, columnspan=3)
-    button_run.grid(row=2, column=0)
-    button_clear.grid(row=2, column=1)
-    button_quit.grid(row=2, column=2)
+    canvas.get_tk_widget().grid(row=0, column=0, columnspan=5)
+    toolbar.grid(row=1, column=0, columnspan=5)
+    gain_label.grid(row=2, column=0)
+    gain_entry.grid(row=2, column=1)
+    button_run.grid(row=2, column=2)
+    button_clear.grid(row=2, column=3)
+    button_quit.grid(row=2, column=4)
+    filter_label.grid(row=3, column=0)
+    filter_entry.grid(row=3, column=1)
+    button_overlay.grid(row=3, column=2)
+    button_save.grid(row=3, column=3)
 
     # This function runs the program until the user decides to quit
     tkinter.mainloop()
@@ -154,12 +604,25 @@ def tk_matplot(plot_function, xlabel, ylabel, title):
 
 # This main code is run if this file is the main program but won't run if this
 # file is imported as a module by some other main program
+# Giving the name of a capture file plays it back instead of using the board
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Plot step responses from the board")
+    parser.add_argument('capture', nargs='?', default=None,
+                        help="serial_replay capture to play back instead of the board")
+    parser.add_argument('--binary', action='store_true',
+                        help="the board sends binary frames (TELEMETRY or STREAMING "
+                             "in main.py) instead of .CSV lines")
+    args = parser.parse_args()
     
+    replay = serial_replay.ReplaySerial(args.capture) if args.capture else None
     tk_matplot(plot_example,
                xlabel="Time (ms)",
                ylabel="Position (Encoder Count)",
-               title="Step Response of Motor Control")
+               title="Step Response of Motor Control",
+               binary=args.binary,
+               ser=replay)
 
 
 
@@ -0,0 +1,147 @@
+"""!
+@file step_metrics.py
+This file contains code that works out the usual numbers describing a step
+response (rise time, overshoot, settling time, steady-state error, and the
+integrals of the absolute and squared error) for any number of runs at once.
+Runs are held as rows of a 2-D NumPy array and every number is worked out
+for all rows together, so hundreds of saved runs can be compared and ranked
+without plotting each one.
+
+Runs of different lengths are padded at the end with NaN by pad_runs().
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+from collections import namedtuple
+import numpy as np
+
+## Numbers describing a set of step responses, each an array with one entry
+## per run. Times are in the units of the times given (ms from the board),
+## overshoot is a fraction of the step, error is in encoder counts and the
+## error integrals are in counts (squared) times seconds. NaN marks a number
+## that could not be worked out, such as the rise time of a run which never
+## got to 90% of the way.
+StepMetrics = namedtuple('StepMetrics', 'rise overshoot settling error iae ise')
+
+
+def pad_runs(runs):
+    """!
+    Puts runs of different lengths into 2-D arrays, padding with NaN.
+    @param runs list of (times, positions) pairs of sequences
+    @returns a (times, positions) pair of 2-D float arrays, one row per run
+    """
+    length = max((len(positions) for _, positions in runs), default=0)
+    times = np.full((len(runs), length), np.nan)
+    positions = np.full((len(runs), length), np.nan)
+    for row, (t, y) in enumerate(runs):
+        times[row, :len(t)] = t
+        positions[row, :len(y)] = y
+    return times, positions
+
+
+def _first(mask):
+    # Index of the first True in each row, and whether there was one
+    return mask.argmax(axis=1), mask.any(axis=1)
+
+
+def compute(times, positions, setpoints=None, band=0.02, time_scale=1e-3):
+    """!
+    Works out the step response numbers of every run.
+    @param times time of each sample, either one row shared by every run or
+           one row per run, as from pad_runs()
+    @param positions 2-D array of positions, one row per run
+    @param setpoints position each run was sent to, either one number or one
+           per run; if None the last position of each run is used, which
+           makes the steady-state error zero
+    @param band settling band as a fraction of the step
+    @param time_scale seconds per unit of @c times, used for the error integrals
+    @returns a StepMetrics of arrays, one entry per run
+    """
+    y = np.atleast_2d(np.asarray(positions, dtype=float))
+    t = np.broadcast_to(np.asarray(times, dtype=float), y.shape)
+    rows = np.arange(y.shape[0])
+
+    valid = ~np.isnan(y)
+    last = valid.sum(axis=1) - 1
+    start = y[:, 0]
+    final = y[rows, last]
+    ref = final if setpoints is None else np.broadcast_to(
+        np.asarray(setpoints, dtype=float), final.shape)
+
+    # Fraction of the step covered by each sample
+    step = ref - start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norm = (y - start[:, None]) / step[:, None]
+
+    # Time from 10% to 90% of the step
+    low, has_low = _first(norm >= 0.1)
+    high, has_high = _first(norm >= 0.9)
+    rise = np.where(has_low & has_high, t[rows, high] - t[rows, low], np.nan)
+
+    # Largest distance past the setpoint
+    overshoot = np.maximum(np.nanmax(norm, axis=1) - 1.0, 0.0)
+
+    # First sample after the last one outside the band
+    outside = np.abs(norm - 1.0) > band
+    from_end, has_outside = _first(outside[:, ::-1])
+    settle = y.shape[1] - from_end
+    settled = ~has_outside | (settle <= last)
+    settle_time = t[rows, np.minimum(settle, y.shape[1] - 1)] - t[:, 0]
+    settling = np.where(~has_outside, 0.0, np.where(settled, settle_time, np.nan))
+
+    # Error integrals by the trapezoid rule, skipping padding
+    error = ref[:, None] - y
+    dt = np.diff(t, axis=1) * time_scale
+    pair = valid[:, 1:] & valid[:, :-1]
+    dt = np.where(pair, dt, 0.0)
+    abs_error = np.nan_to_num(np.abs(error))
+    sq_error = np.nan_to_num(error * error)
+    iae = np.sum((abs_error[:, 1:] + abs_error[:, :-1]) * 0.5 * dt, axis=1)
+    ise = np.sum((sq_error[:, 1:] + sq_error[:, :-1]) * 0.5 * dt, axis=1)
+
+    return StepMetrics(rise, overshoot, settling, ref - final, iae, ise)
+
+
+def rank(metrics, key='iae'):
+    """!
+    Orders runs from best to worst by one of the numbers. Runs for which it
+    could not be worked out come last.
+    @param metrics StepMetrics from compute()
+    @param key name of the number to sort by, such as 'iae' or 'settling'
+    @returns an array of run indices, best first
+    """
+    values = np.abs(getattr(metrics, key))
+    return np.argsort(np.where(np.isnan(values), np.inf, values), kind='stable')
+
+
+def summary(metrics, index=0):
+    """!
+    Describes one run in a line short enough for a plot legend.
+    @param metrics StepMetrics from compute()
+    @param index which run to describe
+    @returns the description as a string
+    """
+    def show(value, fmt):
+        return '--' if np.isnan(value) else format(value, fmt)
+    return (f"rise {show(metrics.rise[index], '.0f')} ms, "
+            f"OS {show(metrics.overshoot[index] * 100, '.1f')}%, "
+            f"settle {show(metrics.settling[index], '.0f')} ms, "
+            f"err {show(metrics.error[index], '.0f')}, "
+            f"IAE {show(metrics.iae[index], '.0f')}")
+
+
+# This code scores a batch simulated gain sweep and prints the best runs
+if __name__ == "__main__":
+    import time
+    import batch_sim
+
+    gains, periods, positions = batch_sim.sweep(np.linspace(0.005, 0.2, 1000),
+                                                [10, 20, 50, 100], duration_ms=3000)
+    times = np.arange(positions.shape[1]) * 10
+    start = time.perf_counter()
+    metrics = compute(times, positions, 10000)
+    elapsed = time.perf_counter() - start
+    print(f'Scored {positions.shape[0]} runs in {elapsed * 1000:.1f} ms')
+    for i in rank(metrics, 'iae')[:5]:
+        print(f'Kp {gains[i]:.4f}, {periods[i]} ms: {summary(metrics, i)}')
@@ -0,0 +1,275 @@
+"""!
+@file telemetry.py
+This file contains code that sends recorded step-response samples from the
+board in compact binary frames instead of one line of text per sample.
+Each frame carries a block of samples, so a whole response is sent in a few
+scheduler runs instead of one run per sample.
+
+A frame is laid out as follows, with all numbers little-endian:
+
+| Bytes | Contents                                                  |
+|-------|-----------------------------------------------------------|
+| 2     | Sync bytes 0xA5 0x5A                                      |
+| 2     | Length of the body in bytes                               |
+| 1     | Frame type, SAMPLES or END                                |
+| 1     | Axis (motor) number                                       |
+| 2     | Sequence number, counting up from zero for each run of each axis |
+| 4     | Time of the first sample in the block, in ms from the start of the run |
+| 4     | Time between samples, in microseconds                     |
+| 2     | Number of samples in the block                            |
+| 4 × n | Samples as signed 32-bit integers                         |
+| 2     | Fletcher-16 checksum of the body                          |
+
+The body is everything between the length and the checksum. In STREAM
+frames, sent while the motor is still moving, the samples alternate between
+the time of a sample (in ms from the start of the run) and its value, and
+the sample count includes both. The decoder for these frames is in
+bulk_parse.py (FrameChunker).
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import sys
+import struct
+import sample_buffer
+from array import array
+
+## Bytes which start every frame
+SYNC = b'\xa5\x5a'
+## Frame holding a block of samples
+SAMPLES = 1
+## Frame marking the end of a run
+END = 2
+## Frame holding timestamped samples streamed during a run
+STREAM = 3
+
+## Layout of the body length, which follows the sync bytes
+LENGTH_FORMAT = '<H'
+## Layout of the fixed part of the body
+HEADER_FORMAT = '<BBHIIH'
+PREFIX_SIZE = len(SYNC) + struct.calcsize(LENGTH_FORMAT)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+## Size of the checksum at the end of a frame
+CHECK_SIZE = 2
+## Number of axes which have their own sequence numbers
+MAX_AXES = 16
+
+
+def fletcher16(data, start=0, end=None):
+    """!
+    Computes the Fletcher-16 checksum of some bytes.
+    @param data bytes, bytearray or memoryview to check
+    @param start index of the first byte to include
+    @param end index after the last byte to include, or None for the end
+    @returns the checksum as an integer from 0 to 65535
+    """
+    if end is None:
+        end = len(data)
+    sum1 = 0
+    sum2 = 0
+    for i in range(start, end):
+        sum1 = (sum1 + data[i]) % 255
+        sum2 = (sum2 + sum1) % 255
+    return (sum2 << 8) | sum1
+
+
+def _default_write(data):
+    # The serial port is the raw side of standard output on the board
+    out = sys.stdout
+    out = getattr(out, 'buffer', out)
+    out.write(data)
+
+
+class FrameWriter:
+    """!
+    This class implements the sending side of the binary telemetry. The
+    memory for a full frame is set aside once, and each frame is packed into
+    it in place.
+    """
+
+    def __init__(self, write=None, block=64):
+        """!
+        Initializes the writer.
+        @param write function which sends bytes to the host; if None the
+               raw side of standard output is used
+        @param block largest number of samples sent in one frame
+        """
+        self.write = write
+        self.block = block
+        self.frame = bytearray(PREFIX_SIZE + HEADER_SIZE + 4 * block + CHECK_SIZE)
+        self.view = memoryview(self.frame)
+        
+        # Next sequence number of each axis, so the runs of one axis do not
+        # upset the numbering of another
+        self.seqs = array('H', [0] * MAX_AXES)
+
+    def send(self, kind, axis, t0_ms, dt_us, samples=None, start=0, count=0):
+        """!
+        Packs and sends one frame.
+        @param kind type of frame, SAMPLES or END
+        @param axis axis (motor) number
+        @param t0_ms time of the first sample, in ms from the start of the run
+        @param dt_us time between samples, in microseconds
+        @param samples indexable object holding the samples, such as a
+               SampleBuffer
+        @param start index of the first sample to send
+        @param count number of samples to send, at most the block size
+        """
+        self.start_frame(kind, axis, t0_ms, dt_us, count)
+        pos = PREFIX_SIZE + HEADER_SIZE
+        for i in range(start, start + count):
+            struct.pack_into('<i', self.frame, pos, samples[i])
+            pos += 4
+        self.finish_frame(pos)
+
+    def send_stream(self, axis, times, values, count):
+        """!
+        Packs and sends one STREAM frame holding the oldest samples of a pair
+        of buffers.
+        @param axis axis (motor) number
+        @param times indexable object holding the time of each sample, in ms
+        @param values indexable object holding the value of each sample
+        @param count number of samples to send, at most half the block size
+        """
+        self.start_frame(STREAM, axis, times[0], 0, 2 * count)
+        frame = self.frame
+        pos = PREFIX_SIZE + HEADER_SIZE
+        for i in range(count):
+            struct.pack_into('<ii', frame, pos, times[i], values[i])
+            pos += 8
+        self.finish_frame(pos)
+
+    def start_frame(self, kind, axis, t0_ms, dt_us, count):
+        """!
+        Packs the sync bytes, length and header of a frame.
+        @param kind type of frame
+        @param axis axis (motor) number, less than MAX_AXES
+        @param t0_ms time of the first sample
+        @param dt_us time between samples
+        @param count number of 32-bit values which will follow the header
+        """
+        frame = self.frame
+        body = HEADER_SIZE + 4 * count
+        seq = self.seqs[axis]
+        frame[0] = SYNC[0]
+        frame[1] = SYNC[1]
+        struct.pack_into(LENGTH_FORMAT, frame, 2, body)
+        struct.pack_into(HEADER_FORMAT, frame, PREFIX_SIZE, kind, axis,
+                         seq, t0_ms, dt_us, count)
+        self.seqs[axis] = (seq + 1) & 0xFFFF
+
+    def finish_frame(self, pos):
+        """!
+        Adds the checksum to a packed frame and sends it.
+        @param pos index just past the last value in the frame
+        """
+        frame = self.frame
+        struct.pack_into('<H', frame, pos,
+                         fletcher16(frame, PREFIX_SIZE, pos))
+        pos += CHECK_SIZE
+
+        write = self.write if self.write is not None else _default_write
+        write(self.view[:pos])
+
+    def send_block(self, axis, samples, start, dt_us):
+        """!
+        Sends the next block of recorded samples.
+        @param axis axis (motor) number
+        @param samples indexable object holding the samples
+        @param start index of the first sample to send
+        @param dt_us time between samples, in microseconds
+        @returns the number of samples sent; zero once all have been sent
+        """
+        count = min(self.block, len(samples) - start)
+        if count <= 0:
+            return 0
+        self.send(SAMPLES, axis, start * dt_us // 1000, dt_us,
+                  samples, start, count)
+        return count
+
+    def send_end(self, axis):
+        """!
+        Sends the frame that marks the end of a run, and starts the sequence
+        numbers of that axis over for the next run.
+        @param axis axis (motor) number, less than MAX_AXES
+        """
+        self.send(END, axis, 0, 0)
+        self.seqs[axis] = 0
+
+
+class Streamer:
+    """!
+    This class implements sending samples while a step response is still
+    running. The control task records samples into a bounded buffer for each
+    axis, which never blocks, and a low priority task sends them in frames.
+    If the host falls too far behind, new samples are dropped and counted
+    rather than making the control task wait.
+    """
+
+    def __init__(self, axes=2, depth=256, writer=None, ready=None):
+        """!
+        Initializes the streamer and sets aside the memory for its buffers.
+        @param axes number of axes (motors) which send samples
+        @param depth number of samples each axis can hold while waiting to
+               be sent
+        @param writer FrameWriter used to send the frames, a new one using
+               standard output if None
+        @param ready function which returns False when the host cannot take
+               more data right now, or None to always send
+        """
+        self.writer = writer if writer is not None else FrameWriter()
+        self.ready = ready
+        self.times = [sample_buffer.SampleBuffer(depth) for _ in range(axes)]
+        self.values = [sample_buffer.SampleBuffer(depth) for _ in range(axes)]
+        self.ending = [False] * axes
+        self.dropped = [0] * axes
+
+    def record(self, axis, t_ms, value):
+        """!
+        Queues one sample to be sent. This is meant to be called by the
+        control task and never waits.
+        @param axis axis (motor) number
+        @param t_ms time of the sample, in ms from the start of the run
+        @param value value of the sample
+        """
+        if self.times[axis].full():
+            self.dropped[axis] += 1
+            return
+        self.times[axis].append(t_ms)
+        self.values[axis].append(value)
+
+    def end(self, axis):
+        """!
+        Marks the end of a run; an END frame is sent once every sample
+        recorded before it has been sent.
+        @param axis axis (motor) number
+        """
+        self.ending[axis] = True
+
+    def service(self):
+        """!
+        Sends at most one frame for each axis.
+        """
+        if self.ready is not None and not self.ready():
+            return
+        half = self.writer.block // 2
+        for axis in range(len(self.times)):
+            times = self.times[axis]
+            count = min(len(times), half)
+            if count:
+                self.writer.send_stream(axis, times, self.values[axis], count)
+                times.discard(count)
+                self.values[axis].discard(count)
+            elif self.ending[axis]:
+                self.writer.send_end(axis)
+                self.ending[axis] = False
+
+    def run(self):
+        """!
+        Generator which sends the queued samples, meant to be run as a low
+        priority cotask task.
+        """
+        while True:
+            self.service()
+            yield 0
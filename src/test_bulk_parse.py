@@ -0,0 +1,57 @@
+"""!
+@file test_bulk_parse.py
+Tests of bulk_parse.py. Run them with pytest, or with
+@c python test_bulk_parse.py.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import bulk_parse
+import telemetry
+
+
+def test_cut_off_lines_are_skipped():
+    """!
+    Lines cut short, as printed when the board is reset, are skipped
+    instead of making the whole block fail.
+    """
+    times, positions = bulk_parse.parse_csv(b'1,\n4,5\n')
+    assert times.tolist() == [4.0] and positions.tolist() == [5.0]
+    times, positions = bulk_parse.parse_csv(b'1,2\n3,-\n')
+    assert times.tolist() == [1.0] and positions.tolist() == [2.0]
+
+
+def test_chunker_keeps_going_after_bad_line():
+    """!
+    A bad line in one block does not stop later blocks from being read.
+    """
+    chunker = bulk_parse.CsvChunker()
+    first = chunker.feed(b'1,2\n3,-\n')
+    second = chunker.feed(b'4,5\nend\n')
+    assert [item[1].tolist() for item in first] == [[2.0]]
+    assert second[0][1].tolist() == [5.0] and second[1] is bulk_parse.END_OF_RUN
+
+
+def test_frames_keep_text_between_them():
+    """!
+    Answers to commands and timing histograms printed between binary frames
+    are set aside, even when they arrive a byte at a time.
+    """
+    frame = bytearray()
+    telemetry.FrameWriter(write=frame.extend).send_block(0, [1, 2, 3], 0, 1000)
+    data = b'ok\nH,0,L,50,0,1\n' + bytes(frame) + b'err no axis\n'
+    chunker = bulk_parse.FrameChunker(0)
+    items = []
+    for i in range(len(data)):
+        items.extend(chunker.feed(data[i:i + 1]))
+    assert sum(len(item[0]) for item in items) == 3
+    assert chunker.replies == ['ok', 'err no axis']
+    assert chunker.histograms == ['H,0,L,50,0,1']
+
+
+if __name__ == "__main__":
+    test_cut_off_lines_are_skipped()
+    test_chunker_keeps_going_after_bad_line()
+    test_frames_keep_text_between_them()
+    print('ok')
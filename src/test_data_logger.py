@@ -0,0 +1,88 @@
+"""!
+@file test_data_logger.py
+Tests of data_logger.py, writing to files kept in memory. Run them with
+pytest, or with @c python test_data_logger.py.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import io
+
+import bulk_parse
+import data_logger
+
+
+class _MemoryFile(io.BytesIO):
+    # A file whose bytes can still be read after it is closed
+
+    def close(self):
+        pass
+
+
+def _make_logger(files, **settings):
+    # Makes a logger writing to the files dictionary
+    def opener(name, mode):
+        files[name] = _MemoryFile()
+        return files[name]
+    return data_logger.FlashLogger('log', opener=opener, **settings)
+
+
+def _runs(files):
+    # Decodes every file, in order, into a list of items tagged by axis
+    decoder = bulk_parse.FrameChunker()
+    items = []
+    for name in sorted(files):
+        items.extend(decoder.feed(files[name].getvalue()))
+    return items
+
+
+def test_back_to_back_runs():
+    """!
+    A run which ends while the other buffer is still being written reaches
+    the file without waiting for its buffer to fill, or for close().
+    """
+    files = {}
+    logger = _make_logger(files)
+    for t in range(10):
+        logger.record(0, t, t)
+    logger.end(0)
+    for t in range(50):
+        logger.record(1, t, 100 + t)
+    logger.end(1)
+    for _ in range(20):
+        logger.service()
+
+    items = _runs(files)
+    ends = [item[0] for item in items if item[1] is bulk_parse.END_OF_RUN]
+    assert ends == [0, 1]
+    samples = [item for item in items if item[1] is not bulk_parse.END_OF_RUN]
+    assert sum(len(item[1]) for item in samples if item[0] == 1) == 50
+    assert logger.dropped == 0
+
+
+def test_end_fits_when_full():
+    """!
+    A run which ends while both buffers are full of samples still gets its
+    end record; only samples are dropped.
+    """
+    files = {}
+    logger = _make_logger(files, depth=4)
+    for t in range(10):
+        logger.record(0, t, t)
+    logger.end(0)
+    for _ in range(20):
+        logger.service()
+
+    items = _runs(files)
+    ends = [item[0] for item in items if item[1] is bulk_parse.END_OF_RUN]
+    assert ends == [0]
+    samples = [item for item in items if item[1] is not bulk_parse.END_OF_RUN]
+    assert sum(len(item[1]) for item in samples) == 6
+    assert logger.dropped == 4
+
+
+if __name__ == "__main__":
+    test_back_to_back_runs()
+    test_end_fits_when_full()
+    print('ok')
@@ -0,0 +1,53 @@
+"""!
+@file test_decimate.py
+Tests of decimate.py which need no window, using Matplotlib's Agg backend.
+Run them with pytest, or with @c python test_decimate.py.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import gc
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+import decimate
+
+
+def test_line_follows_zoom_without_reference():
+    """!
+    A line which nobody keeps, as drawn by step_control.overlay_runs(),
+    still picks its points again when the view is zoomed.
+    """
+    figure, axes = plt.subplots()
+    x = np.arange(200000, dtype=float)
+    y = np.sin(x / 1000)
+    line = decimate.DecimatedLine(axes, x, y).line
+    gc.collect()
+
+    axes.set_xlim(1000, 2000)
+    shown = line.get_xdata()
+    inside = shown[(shown >= 1000) & (shown <= 2000)]
+    assert len(inside) > 500
+    plt.close(figure)
+
+
+def test_remove_stops_following():
+    """!
+    A removed line no longer answers changes of the view.
+    """
+    figure, axes = plt.subplots()
+    trace = decimate.DecimatedLine(axes, np.arange(10.0), np.arange(10.0))
+    trace.remove()
+    axes.set_xlim(2, 3)
+    assert trace.line not in axes.lines
+    plt.close(figure)
+
+
+if __name__ == "__main__":
+    test_line_follows_zoom_without_reference()
+    test_remove_stops_following()
+    print('ok')
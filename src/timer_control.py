@@ -0,0 +1,209 @@
+"""!
+@file timer_control.py
+This file contains code that runs the read encoder, run controller, set
+duty cycle step for one motor either from a hardware timer interrupt, at a
+fixed rate no matter what other tasks are doing, or as an ordinary cotask
+task. Both ways keep the same jitter statistics so they can be compared and
+the better one chosen for each motor.
+
+Code run from an interrupt must not allocate memory, so in timer mode the
+controller has to be one which only uses integers, such as
+closed_loop_controller.fixed_pid. The encoder and motor driver already work
+with integers.
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import pyb
+import utime
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+
+class JitterStats:
+    """!
+    This class keeps statistics of the time between runs of a loop: the
+    shortest, longest and average time, and how far each run was from the
+    intended period. Marking a run only updates a few integers, so it can be
+    done from an interrupt.
+
+    The statistics cover a window of at most @c window runs. Once a window
+    is full the next run starts a new one, so the sums stay small integers
+    and never need memory from the heap, however long the loop runs.
+    """
+
+    def __init__(self, period_us, window=1000):
+        """!
+        Initializes the statistics with no runs recorded.
+        @param period_us intended time between runs, in microseconds
+        @param window largest number of runs counted before starting over
+        """
+        self.period_us = period_us
+        self.window = window
+        self.windows = 0
+        self.reset()
+
+    def reset(self):
+        """!
+        Forgets every run recorded so far.
+        """
+        self.count = 0
+        self.first_us = 0
+        self.last_us = 0
+        self.min_us = 0
+        self.max_us = 0
+        self.jitter_sum = 0
+        self.jitter_max = 0
+
+    def mark(self, now):
+        """!
+        Records one run of the loop.
+        @param now time of the run from utime.ticks_us()
+        """
+        # A full window starts over from this run
+        if self.count >= self.window:
+            self.reset()
+            self.windows += 1
+        if self.count == 0:
+            self.first_us = now
+        else:
+            interval = utime.ticks_diff(now, self.last_us)
+            if self.count == 1 or interval < self.min_us:
+                self.min_us = interval
+            if interval > self.max_us:
+                self.max_us = interval
+            jitter = interval - self.period_us
+            if jitter < 0:
+                jitter = -jitter
+            self.jitter_sum += jitter
+            if jitter > self.jitter_max:
+                self.jitter_max = jitter
+        self.last_us = now
+        self.count += 1
+
+    def mean_us(self):
+        """!
+        @returns the average time between runs, in microseconds
+        """
+        if self.count < 2:
+            return 0
+        return utime.ticks_diff(self.last_us, self.first_us) / (self.count - 1)
+
+    def mean_jitter_us(self):
+        """!
+        @returns the average distance of each run from the intended period,
+                 in microseconds
+        """
+        if self.count < 2:
+            return 0
+        return self.jitter_sum / (self.count - 1)
+
+    def report(self):
+        """!
+        Makes a summary of the statistics and starts a new window, for
+        printing now and then from a task. Not meant for an interrupt.
+        @returns the summary as a string
+        """
+        summary = str(self)
+        # The interrupt must not mark a run while the figures are cleared
+        state = pyb.disable_irq()
+        self.reset()
+        pyb.enable_irq(state)
+        return summary
+
+    def __str__(self):
+        """!
+        Makes a one line summary of the statistics.
+        @returns the summary as a string
+        """
+        return (f"runs {self.count}, period {self.mean_us():.1f} us "
+                f"(min {self.min_us}, max {self.max_us}), "
+                f"jitter mean {self.mean_jitter_us():.1f} us, max {self.jitter_max} us")
+
+
+class AxisLoop:
+    """!
+    This class runs the control loop of one motor, either from a hardware
+    timer interrupt or as a cotask task.
+    """
+
+    def __init__(self, motor, encoder, controller, period_ms, record=None):
+        """!
+        Initializes the loop.
+        @param motor motor driver object running the motor
+        @param encoder encoder object returning the position of the motor
+        @param controller controller object with a run(position) method
+        @param period_ms intended time between runs, in ms
+        @param record optional sample_buffer.SampleBuffer which receives
+               the position at each run
+        """
+        self.motor = motor
+        self.encoder = encoder
+        self.controller = controller
+        self.record = record
+        self.period_ms = period_ms
+        self.stats = JitterStats(period_ms * 1000)
+        self.timer = None
+
+        # Bound methods are made once here, since making one in an
+        # interrupt would allocate memory
+        self._read = encoder.read
+        self._run = controller.run
+        self._set = motor.set_duty_cycle
+        self._callback = self.interrupt
+
+    def step(self):
+        """!
+        Runs the loop once: reads the encoder, runs the controller and sets
+        the duty cycle.
+        @returns the duty cycle which was set
+        """
+        self.stats.mark(utime.ticks_us())
+        actual = self._read()
+        duty = self._run(actual)
+        self._set(duty)
+        if self.record is not None:
+            self.record.append(actual)
+        return duty
+
+    def interrupt(self, timer):
+        """!
+        Timer callback which runs the loop once.
+        @param timer timer which caused the interrupt
+        """
+        self.step()
+
+    def start_timer(self, timer_num):
+        """!
+        Starts running the loop from a hardware timer interrupt.
+        @param timer_num number of a timer not used for anything else
+        """
+        if micropython is not None:
+            # Lets errors inside the interrupt be reported
+            micropython.alloc_emergency_exception_buf(100)
+        self.stats.reset()
+        self.timer = pyb.Timer(timer_num, freq=1000 / self.period_ms)
+        self.timer.callback(self._callback)
+
+    def stop(self):
+        """!
+        Stops the timer interrupt, if running, and turns the motor off.
+        """
+        if self.timer is not None:
+            self.timer.callback(None)
+            self.timer = None
+        self._set(0)
+
+    def task(self):
+        """!
+        Generator which runs the loop once each time it is run, for use as
+        a cotask task instead of the timer.
+        """
+        while True:
+            self.step()
+            yield 0
+
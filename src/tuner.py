@@ -0,0 +1,188 @@
+"""!
+@file tuner.py
+This file contains a tool that searches for good task periods, proportional
+gains and task priorities using the motor simulation, instead of trying each
+one on the motors by hand. Every combination is run as a step response in
+lockstep with the virtual clock, next to a second motor task like the one in
+main.py, and scored on overshoot, settling time and processor load. The
+combinations which no other combination beats on all three (the Pareto
+front) are reported. Combinations are run in parallel on a pool of processes.
+
+Run it from the command line, for example
+@code
+python tuner.py --plant plant.json --periods 10,20,50,100 --gains 0.01:0.1:10
+@endcode
+
+@author mecha02
+@date   18-Oct-2026
+"""
+
+import json
+import argparse
+import functools
+import itertools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import sim_pyb
+import lockstep
+import step_metrics
+
+## Settings tried for one run
+Candidate = namedtuple('Candidate', 'period_ms kp priority')
+
+## Scores of one run. Settling time is None if the motor never settled.
+Result = namedtuple('Result', 'candidate overshoot settling_ms cpu final')
+
+
+def evaluate(candidate, plant=None, setpoint=10000, duration_ms=5000,
+             cost_us=1500, other_period_ms=50, other_priority=2):
+    """!
+    Runs one step response in the simulation and scores it.
+    @param candidate Candidate holding the settings to try
+    @param plant dictionary of sim_pyb.MotorPlant settings, or None for the
+           default motor
+    @param setpoint position the motor is sent to, in encoder counts
+    @param duration_ms length of the simulated run, in ms
+    @param cost_us simulated processor time used by each run of either task
+    @param other_period_ms period of the second motor's task, in ms
+    @param other_priority priority of the second motor's task; a tested
+           task with the same priority runs first when both are due
+    @returns a Result
+    """
+    plant = plant or {}
+    rigs = [sim_pyb.Rig(3, 8, sim_pyb.MotorPlant(**plant), 'PA10'),
+            sim_pyb.Rig(5, 4, sim_pyb.MotorPlant(**plant), 'PC1')]
+    sched = lockstep.Lockstep(sim_pyb.World(sim_pyb.VirtualClock(), rigs))
+
+    import pyb
+    import utime
+    import main
+    import closed_loop_controller as closed
+
+    times = []
+    positions = []
+
+    def tested():
+        motor = main.make_motor(pyb.Pin.board.PA10, pyb.Pin.board.PB4, pyb.Pin.board.PB5, 3)
+        encoder = main.make_encoder(8)
+        controller = closed.control()
+        controller.set_setpoint(setpoint)
+        controller.set_Kp(candidate.kp)
+        start = utime.ticks_ms()
+        while True:
+            actual = encoder.read()
+            motor.set_duty_cycle(controller.run(actual))
+            times.append(utime.ticks_diff(utime.ticks_ms(), start))
+            positions.append(actual)
+            yield 0
+
+    sched.add(tested, "Tested", candidate.priority, candidate.period_ms, cost_us)
+    sched.add(main.task2_fun, "Other", other_priority, other_period_ms, cost_us)
+    sched.run(duration_ms)
+
+    metrics = step_metrics.compute(times, [positions], setpoint)
+    overshoot = float(metrics.overshoot[0])
+    settling = None if np.isnan(metrics.settling[0]) else float(metrics.settling[0])
+    cpu = cost_us / (candidate.period_ms * 1000) + cost_us / (other_period_ms * 1000)
+    return Result(candidate, overshoot, settling, cpu, positions[-1])
+
+
+def sweep(periods, gains, priorities, plant=None, workers=None, **kwargs):
+    """!
+    Runs every combination of the given settings, in parallel.
+    @param periods task periods to try, in ms
+    @param gains proportional gains to try
+    @param priorities task priorities to try
+    @param plant dictionary of sim_pyb.MotorPlant settings, or None
+    @param workers number of processes to use, or None for one per processor
+    @param kwargs further settings passed to evaluate()
+    @returns a list of Result, one per combination
+    """
+    candidates = [Candidate(*combo) for combo in itertools.product(periods, gains, priorities)]
+    job = functools.partial(evaluate, plant=plant, **kwargs)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(job, candidates, chunksize=max(1, len(candidates) // 64)))
+
+
+def _scores(result):
+    # Scores to be made as small as possible; never settling is worst
+    settling = result.settling_ms if result.settling_ms is not None else float('inf')
+    return (result.overshoot, settling, result.cpu)
+
+
+def pareto_front(results):
+    """!
+    Finds the results which no other result beats, that is, no other result
+    is at least as good on overshoot, settling time and processor load and
+    better on at least one of them. Results which never settled are left out,
+    unless none of them settled.
+    @param results list of Result
+    @returns the list of unbeaten Result, sorted by settling time
+    """
+    settled = [r for r in results if r.settling_ms is not None]
+    if settled:
+        results = settled
+    scored = [(_scores(r), r) for r in results]
+    front = []
+    for score, result in scored:
+        beaten = False
+        for other, _ in scored:
+            if all(o <= s for o, s in zip(other, score)) and other != score:
+                beaten = True
+                break
+        if not beaten:
+            front.append(result)
+    front.sort(key=lambda r: _scores(r)[1])
+    return front
+
+
+def _parse_list(text, kind):
+    # Reads '1,2,3' as a list, or 'start:stop:count' as evenly spaced values
+    if ':' in text:
+        start, stop, count = text.split(':')
+        start = float(start)
+        stop = float(stop)
+        count = int(count)
+        step = (stop - start) / max(1, count - 1)
+        return [kind(start + i * step) for i in range(count)]
+    return [kind(value) for value in text.split(',')]
+
+
+# This code runs a sweep from the command line and prints the Pareto front
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Search task periods and gains in simulation")
+    parser.add_argument('--plant', help="JSON file of motor model settings")
+    parser.add_argument('--periods', default='10,20,30,50,75,100',
+                        help="task periods in ms, as a,b,c or start:stop:count")
+    parser.add_argument('--gains', default='0.01:0.1:10',
+                        help="proportional gains, as a,b,c or start:stop:count")
+    parser.add_argument('--priorities', default='1,2',
+                        help="task priorities; the other motor's task has priority 2")
+    parser.add_argument('--setpoint', type=int, default=10000)
+    parser.add_argument('--duration', type=int, default=5000, help="run length in ms")
+    parser.add_argument('--cost', type=int, default=1500,
+                        help="processor time of each task run in us")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    plant = None
+    if args.plant:
+        with open(args.plant) as file:
+            plant = json.load(file)
+
+    start = time.perf_counter()
+    results = sweep(_parse_list(args.periods, int), _parse_list(args.gains, float),
+                    _parse_list(args.priorities, int), plant, args.workers,
+                    setpoint=args.setpoint, duration_ms=args.duration, cost_us=args.cost)
+    elapsed = time.perf_counter() - start
+
+    print(f"Ran {len(results)} combinations in {elapsed:.2f} s")
+    print("Period  Kp       Pri  Overshoot  Settling   CPU")
+    for r in pareto_front(results):
+        settling = f"{r.settling_ms:>6.0f} ms" if r.settling_ms is not None else "  never  "
+        print(f"{r.candidate.period_ms:>4} ms {r.candidate.kp:<8.4f} {r.candidate.priority:>3}"
+              f" {r.overshoot * 100:>8.1f}%  {settling} {r.cpu * 100:>5.1f}%")